@@ -0,0 +1,200 @@
+import os
+from abc import ABC, abstractmethod
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+# Per-customer query of every table: the rows are grouped by key (renamed customer_id) into the aggregates
+# (alias, function, column, SQL type of the result), or read as the given columns when the table holds whole
+# rows per customer, with the order columns giving the order they were written in (the latest is kept).
+# The results are cast to the types Hive returns, so every backend returns the same dtypes
+# (DuckDB sums integers as HUGEINT, which pandas only holds as Decimal objects)
+QUERIES = {
+    'customer_profiles': {
+        'key': 'customer_id',
+        'columns': ['name', 'gender', 'age', 'city', 'account_open_date', 'product_type', 'customer_tier',
+                    'tenure', 'customer_segment'],
+        'order': ['partition_date', 'partition_hour', 'processing_time']
+    },
+    'transactions': {
+        'key': 'sender',
+        'aggregates': [('last_transaction_date', 'max', 'transaction_date', None),
+                       ('total_spending', 'sum', 'transaction_amount', 'DOUBLE')]
+    },
+    'credit_cards_billing': {
+        'key': 'customer_id',
+        'aggregates': [('late_days_sum', 'sum', 'late_days', 'BIGINT'),
+                       ('late_days_count', 'count', 'late_days', 'BIGINT')]
+    }
+}
+
+# Arrow types of the SQL types of the aggregates
+ARROW_TYPES = {'BIGINT': pa.int64(), 'DOUBLE': pa.float64()}
+
+# Date columns of the results, returned as strings, dates or timestamps by the backends
+DATE_COLUMNS = ['account_open_date', 'last_transaction_date']
+
+# Partition columns of the local copies of the tables (<table>/partition_date=YYYY-MM-DD/partition_hour=H/)
+PARTITIONING = ds.partitioning(pa.schema([('partition_date', pa.string()), ('partition_hour', pa.int32())]),
+                               flavor='hive')
+
+
+def get_partition_filter(since: str, until: str) -> str:
+    """
+    SQL condition selecting the partitions after since (None for all) up to until, both 'YYYY-MM-DD HH'.
+    """
+    until_date, until_hour = until.split(' ')
+    conditions = [f"(partition_date < '{until_date}' "
+                  f"OR (partition_date = '{until_date}' AND partition_hour <= {int(until_hour)}))"]
+    if since:
+        since_date, since_hour = since.split(' ')
+        conditions.append(f"(partition_date > '{since_date}' "
+                          f"OR (partition_date = '{since_date}' AND partition_hour > {int(since_hour)}))")
+    return ' AND '.join(conditions)
+
+
+def get_query(table: str, since: str, until: str) -> str:
+    """
+    SQL of the per-customer query of a table over the partitions after since up to until:
+    only the columns used are read and the rows are grouped where the data is.
+    """
+    spec = QUERIES[table]
+    where = get_partition_filter(since, until)
+    if 'columns' in spec:
+        return f"SELECT {', '.join([spec['key']] + spec['columns'] + spec['order'])} FROM {table} WHERE {where}"
+    aggregates = []
+    for alias, function, column, sql_type in spec['aggregates']:
+        expression = f"{function.upper()}({column})"
+        aggregates.append(f"CAST({expression} AS {sql_type}) AS {alias}" if sql_type else f"{expression} AS {alias}")
+    return (f"SELECT {spec['key']} AS customer_id, {', '.join(aggregates)} FROM {table} "
+            f"WHERE {where} GROUP BY {spec['key']}")
+
+
+def get_latest(df: pd.DataFrame, key: str, order: list) -> pd.DataFrame:
+    """
+    Keep the last row of every key in the order of the order columns (rows missing them come first).
+    """
+    df = df.sort_values(order, kind='stable', na_position='first')
+    return df.drop_duplicates(key, keep='last').reset_index(drop=True)
+
+
+class ChurnBackend(ABC):
+    """
+    Runs the per-customer queries of the churn analysis (see QUERIES) and returns one row per customer.
+    """
+
+    def aggregate(self, table: str, since: str, until: str) -> pd.DataFrame:
+        """
+        Per-customer rows of the partitions of a table after since (None for all) up to until.
+        The rows of a customer read as columns are reduced to the latest one, whatever the order of the results.
+        """
+        df = self.query(table, since, until)
+        spec = QUERIES[table]
+        if 'columns' in spec:
+            df = get_latest(df, spec['key'], spec['order'])
+        for column in DATE_COLUMNS:
+            if column in df.columns:
+                df[column] = pd.to_datetime(df[column])
+        return df
+
+    @abstractmethod
+    def query(self, table: str, since: str, until: str) -> pd.DataFrame:
+        """
+        Run the query of a table (see get_query) and return its result.
+        """
+
+
+class HiveBackend(ChurnBackend):
+    def __init__(self, conn, fetch_size: int = 10000):
+        """
+        Runs the queries on Hive and streams the results in fetchmany batches of fetch_size rows.
+
+        :param conn: PyHive connection, using the database of the tables.
+        """
+        self.conn = conn
+        self.fetch_size = fetch_size
+
+    def query(self, table: str, since: str, until: str) -> pd.DataFrame:
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute(get_query(table, since, until))
+            # Hive may prefix the column names with the table name
+            columns = [description[0].split('.')[-1] for description in cursor.description]
+            chunks = []
+            while True:
+                rows = cursor.fetchmany(self.fetch_size)
+                if not rows:
+                    break
+                chunks.append(pd.DataFrame.from_records(rows, columns=columns))
+        finally:
+            cursor.close()
+        return pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame(columns=columns)
+
+
+class DuckDBBackend(ChurnBackend):
+    def __init__(self, directory: str, fetch_size: int = 10000):
+        """
+        Runs the same SQL queries as Hive with DuckDB on local parquet copies of the tables, for offline runs.
+
+        :param directory: Directory of the tables, laid out like /stage (<table>/partition_date=.../partition_hour=.../).
+        """
+        import duckdb  # optional, only needed by this backend
+
+        self.directory = directory
+        self.fetch_size = fetch_size
+        self.conn = duckdb.connect()
+        for table in QUERIES:
+            path = os.path.join(directory, table, '**', '*.parquet')
+            self.conn.execute(f"CREATE VIEW {table} AS SELECT * FROM read_parquet('{path}', hive_partitioning = true, "
+                              f"hive_types = {{'partition_date': VARCHAR, 'partition_hour': INTEGER}})")
+
+    def query(self, table: str, since: str, until: str) -> pd.DataFrame:
+        reader = self.conn.execute(get_query(table, since, until)).to_arrow_reader(self.fetch_size)
+        return reader.read_all().to_pandas()
+
+
+class DatasetBackend(ChurnBackend):
+    def __init__(self, directory: str):
+        """
+        Runs the queries with pyarrow.dataset and Arrow group-by on local parquet copies of the tables,
+        for offline runs without DuckDB.
+
+        :param directory: Directory of the tables, laid out like /stage (<table>/partition_date=.../partition_hour=.../).
+        """
+        self.directory = directory
+
+    def query(self, table: str, since: str, until: str) -> pd.DataFrame:
+        spec = QUERIES[table]
+        dataset = ds.dataset(os.path.join(self.directory, table), format='parquet', partitioning=PARTITIONING)
+        if 'columns' in spec:
+            columns = spec['columns'] + spec['order']
+        else:
+            columns = [column for _, _, column, _ in spec['aggregates']]
+        data = dataset.to_table(columns=list(dict.fromkeys([spec['key']] + columns)),
+                                filter=self.get_partition_expression(since, until))
+        if 'columns' in spec:
+            return data.to_pandas()
+
+        grouped = data.group_by(spec['key']).aggregate([(column, function) for _, function, column, _ in spec['aggregates']])
+        names = {f'{column}_{function}': alias for alias, function, column, _ in spec['aggregates']}
+        names[spec['key']] = 'customer_id'
+        grouped = grouped.rename_columns([names[name] for name in grouped.column_names])
+        for alias, _, _, sql_type in spec['aggregates']:
+            if sql_type:
+                index = grouped.schema.get_field_index(alias)
+                grouped = grouped.set_column(index, alias, grouped.column(index).cast(ARROW_TYPES[sql_type]))
+        return grouped.select(['customer_id'] + [alias for alias, _, _, _ in spec['aggregates']]).to_pandas()
+
+    @staticmethod
+    def get_partition_expression(since: str, until: str) -> ds.Expression:
+        """
+        Dataset filter selecting the partitions after since (None for all) up to until, like get_partition_filter.
+        """
+        date, hour = ds.field('partition_date'), ds.field('partition_hour')
+        until_date, until_hour = until.split(' ')
+        expression = (date < until_date) | ((date == until_date) & (hour <= int(until_hour)))
+        if since:
+            since_date, since_hour = since.split(' ')
+            expression &= (date > since_date) | ((date == since_date) & (hour > int(since_hour)))
+        return expression
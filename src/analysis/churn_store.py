@@ -0,0 +1,84 @@
+import os
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from analysis.churn_backends import QUERIES, get_latest
+
+# Per-customer aggregates of the tables and how the aggregates of new slices are merged into them
+AGGREGATES = {
+    'transactions': {'last_transaction_date': 'max', 'total_spending': 'sum'},
+    'credit_cards_billing': {'late_days_sum': 'sum', 'late_days_count': 'sum'}
+}
+
+# Tables kept as their latest row per customer
+PROFILE_TABLES = ['customer_profiles']
+
+
+class ChurnStore:
+    def __init__(self, directory: str):
+        """
+        Local store of the per-customer inputs of the churn analysis: one parquet file per table
+        holding one row per customer and, in its metadata, the watermark of the last partition merged
+        ('YYYY-MM-DD HH'), so every run only reads the partitions added since the previous one.
+        A table and its watermark are replaced together by an atomic rename.
+
+        :param directory: Directory of the store.
+        """
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def get_path(self, table: str) -> str:
+        return os.path.join(self.directory, f'{table}.parquet')
+
+    def load(self, table: str) -> tuple:
+        """
+        Load the rows and watermark of a table.
+
+        :return: (DataFrame, watermark), (None, None) when the table was never merged.
+        """
+        path = self.get_path(table)
+        if not os.path.exists(path):
+            return None, None
+        data = pq.read_table(path)
+        metadata = data.schema.metadata or {}
+        watermark = metadata.get(b'watermark', b'').decode() or None
+        return data.to_pandas(), watermark
+
+    def save(self, table: str, df: pd.DataFrame, watermark: str) -> None:
+        """
+        Replace the rows and watermark of a table.
+        """
+        data = pa.Table.from_pandas(df, preserve_index=False)
+        data = data.replace_schema_metadata({**(data.schema.metadata or {}), b'watermark': watermark.encode()})
+
+        path = self.get_path(table)
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'wb') as file:
+            pq.write_table(data, file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, path)
+
+    def merge(self, table: str, new: pd.DataFrame, watermark: str, replace: bool = False) -> pd.DataFrame:
+        """
+        Merge the per-customer rows of the new partitions of a table into the store, up to the watermark.
+        The stored table is only replaced once the new one is written (see save).
+
+        :param new: One row per customer (customer_id and the aggregates of AGGREGATES, or the profile columns
+                    with their order columns, which decide the row kept).
+        :param replace: Replace the stored rows with new (rebuild from all the partitions) instead of merging.
+        :return: The merged rows of the table.
+        """
+        df = None if replace else self.load(table)[0]
+        if df is None:
+            df = new
+        elif not new.empty:
+            df = pd.concat([df, new], ignore_index=True)
+            if table in PROFILE_TABLES:
+                df = get_latest(df, 'customer_id', QUERIES[table]['order'])
+            else:
+                df = df.groupby('customer_id', as_index=False).agg(AGGREGATES[table])
+
+        self.save(table, df, watermark)
+        return df
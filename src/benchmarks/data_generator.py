@@ -0,0 +1,61 @@
+import os
+import numpy as np
+
+from synthetic.columns import TABLE_FORMATS
+from synthetic.tables import GENERATORS, table_seeds, generate_table
+
+
+def generate_tables(rows: int, seed: int = 42, reference_date: str = '2025-06-30') -> dict:
+    """
+    Generate the five tables of the bank with the generator of src/data_generator.py (synthetic.tables),
+    every table with the same number of rows: one bill per customer, and names and loan reasons combined
+    from word pools (no Faker, which the image does not install). The same seed gives the same data.
+
+    Identifiers wrap around past the width of their pattern (e.g. CUST999999 is followed by CUST000000),
+    so tables bigger than 10^6 rows stay valid for the data-quality rules.
+
+    :param rows: Number of rows of every table.
+    :param seed: Seed of the random generator.
+    :param reference_date: 'today' of the generated dates, fixed so the data does not depend on the day it is made.
+    :return: Mapping of table name to DataFrame.
+    """
+    settings = {
+        'customers': rows,
+        'tickets': rows,
+        'months': 1,
+        'transactions': rows,
+        'loans': rows,
+        'billing_start': '2023-01',
+        'id_offset': 0,
+        'today': np.datetime64(reference_date, 'D')
+    }
+    seeds = table_seeds(seed)
+    return {table: generate_table(table, seeds[table], settings) for table in GENERATORS}
+
+
+def write_tables(tables: dict, directory: str, timestamp: str = '20250630000000', txt: bool = True) -> dict:
+    """
+    Write the tables as incoming files named like the bank exports (<table>_<timestamp>.<ext>).
+
+    :param tables: Mapping of table name to DataFrame (see generate_tables).
+    :param directory: Directory of the files, created if missing.
+    :param timestamp: Timestamp suffix of the file names.
+    :param txt: Also write customer_profiles as a '|' delimited TXT file, for the TXT extractor.
+    :return: Mapping of table name to file path, with the TXT file under 'customer_profiles.txt'.
+    """
+    os.makedirs(directory, exist_ok=True)
+    paths = {}
+    for table, df in tables.items():
+        extension = TABLE_FORMATS[table]
+        path = os.path.join(directory, f"{table}_{timestamp}.{extension}")
+        if extension == 'json':
+            df.to_json(path, orient='records')
+        else:
+            df.to_csv(path, index=False)
+        paths[table] = path
+
+    if txt:
+        path = os.path.join(directory, f"customer_profiles_{timestamp}.txt")
+        tables['customer_profiles'].to_csv(path, sep='|', index=False)
+        paths['customer_profiles.txt'] = path
+    return paths
@@ -0,0 +1,277 @@
+import gc
+import os
+import json
+import time
+import shutil
+import tracemalloc
+import pandas as pd
+
+from pipeline.pipeline import Pipeline, PARTITION_COLUMNS
+from pipeline.logger.metrics import Metrics, get_peak_rss
+from pipeline.loaders.hdfs_loader import HDFSLoader
+from pipeline.loaders.parquet_loader import ParquetLoader
+from pipeline.notifier.email_notifier import EmailNotifier
+from pipeline.state_store.state import StateStore
+
+from benchmarks.data_generator import generate_tables, write_tables
+
+# Initial state of every table, like the bootstrap of src/test.py: an empty key list or the lowest watermark
+INITIAL_STATES = {
+    "credit_cards_billing": ("bill_id", ["", ""]),
+    "customer_profiles": ("customer_id", ["", ""]),
+    "support_tickets": ("ticket_id", ["", ""]),
+    "transactions": ("transaction_date", ["0000-00-00"]),
+    "loans": ("utilization_date", ["0000-00-00"])
+}
+
+
+class Benchmark:
+    def __init__(self, logger, work_dir: str, repeat: int = 3, batch_size: int = None, arrow: bool = False,
+                 memory: bool = True, transform_workers: int = None):
+        """
+        Runs every stage of the pipeline in isolation and end to end on generated data and measures
+        the best time of `repeat` runs, the throughput and the memory allocated.
+
+        The pipeline is the production one, with its state, quarantine and outputs redirected under
+        work_dir and the HDFS writes going to a local stand-in (file://<work_dir>/hdfs).
+
+        :param logger: Logger instance to log messages.
+        :param work_dir: Directory of the generated files, state and outputs, emptied between sizes.
+        :param repeat: Number of timed runs of every measure, the best one is kept.
+        :param batch_size: Stream the files in batches of batch_size rows in the end-to-end runs.
+        :param arrow: Run the pipeline in arrow mode.
+        :param memory: Also run every measure once under tracemalloc for the peak of allocated memory.
+        :param transform_workers: Transform the DataFrames in chunks across that many processes.
+        """
+        self.logger = logger
+        self.work_dir = work_dir
+        self.repeat = repeat
+        self.batch_size = batch_size
+        self.arrow = arrow
+        self.memory = memory
+        self.transform_workers = transform_workers
+        self.mode = (('arrow' if arrow else 'pandas') + (f'-batch{batch_size}' if batch_size else '')
+                     + (f'-workers{transform_workers}' if transform_workers else ''))
+        self.pipeline = None
+
+    def run(self, sizes, seed: int = 42, stages=None) -> list:
+        """
+        Generate the tables at every size and benchmark them.
+
+        :param sizes: Numbers of rows per table (e.g. [1000, 100000, 10000000]).
+        :param seed: Seed of the generated data.
+        :param stages: Stages to run (see run_size), None for every stage.
+        :return: The results of every measure (see measure).
+        """
+        results = []
+        for rows in sizes:
+            if os.path.exists(self.work_dir):
+                shutil.rmtree(self.work_dir)
+            started = time.perf_counter()
+            paths = write_tables(generate_tables(rows, seed), os.path.join(self.work_dir, 'incoming'))
+            self.logger.log('info', f"Benchmark data of {rows} rows generated in {time.perf_counter() - started:.1f}s")
+            results.extend(self.run_size(rows, paths, stages))
+        return results
+
+    def run_size(self, rows: int, paths: dict, stages=None) -> list:
+        """
+        Benchmark the stages on the files of one size. Every stage gets the output of the previous one,
+        computed once outside the measures.
+
+        Stages: extract, quality, validate, state_filter, plan (the derived columns of the transform plan alone),
+        transform, parquet_write, hdfs_write, end_to_end.
+        """
+        self.pipeline = self.make_pipeline()
+        try:
+            return self.measure_stages(rows, paths, stages)
+        finally:
+            self.pipeline.close()
+
+    def measure_stages(self, rows: int, paths: dict, stages=None) -> list:
+        """
+        Benchmark the stages on the files of one size with the pipeline of run_size.
+        """
+        pipeline = self.pipeline
+        results = []
+
+        def wanted(stage):
+            return stages is None or stage in stages
+
+        for key, path in paths.items():
+            table = key.split('.')[0]
+            size = os.path.getsize(path)
+
+            if wanted('extract'):
+                results.append(self.measure('extract', key, rows, size, lambda: pipeline.extract(path, table)))
+
+            if table != key:
+                continue  # the TXT copy only benchmarks its extractor
+
+            df = pipeline.extract(path, table)
+            if wanted('quality'):
+                results.append(self.measure('quality', table, rows, 0,
+                                            lambda: pipeline.quality_checker.split(df, table)))
+            df, _ = pipeline.quality_checker.split(df, table)
+
+            if wanted('validate'):
+                results.append(self.measure('validate', table, rows, 0, lambda: pipeline.validator.validate(df, table)))
+
+            # the state is reloaded by every filter, which discards the values added by the previous run
+            column_name = pipeline.states[table]
+            if wanted('state_filter'):
+                results.append(self.measure('state_filter', table, rows, 0,
+                                            lambda: pipeline.state_store.filter(df, table, column_name)))
+            df = pipeline.state_store.filter(df, table, column_name)
+
+            # transformers add columns to the frame they get, so every run gets its own copy
+            transformer = pipeline.transformers[table]
+            if wanted('plan'):
+                results.append(self.measure('plan', table, rows, 0,
+                                            lambda df: transformer.plan.evaluate(df, transformer),
+                                            setup=lambda: df.copy()))
+            if wanted('transform'):
+                results.append(self.measure('transform', table, rows, 0,
+                                            lambda df: pipeline.parallel_transformer.transform(df, table),
+                                            setup=lambda: df.copy()))
+            df = pipeline.parallel_transformer.transform(df.copy(), table).drop(columns=PARTITION_COLUMNS)
+
+            name = os.path.basename(path).split('.')[0]
+            if wanted('parquet_write'):
+                result = self.measure('parquet_write', table, rows, 0, lambda: pipeline.parquet_loader.load(df, name))
+                result['bytes'] = os.path.getsize(os.path.join(pipeline.parquet_loader.output_dir, f'{name}.parquet'))
+                results.append(result)
+
+            if wanted('hdfs_write'):
+                hdfspath = f'/stage/{table}'
+                results.append(self.measure('hdfs_write', table, rows, 0,
+                                            lambda: pipeline.hdfs_loader.load_batches([df], hdfspath, name)))
+
+            if wanted('end_to_end'):
+                results.append(self.measure('end_to_end', table, rows, size,
+                                            lambda state_store: self.process(state_store, path, table),
+                                            setup=self.make_state_store))
+        return results
+
+    def make_pipeline(self) -> Pipeline:
+        """
+        Build the production pipeline with its state, quarantine and outputs under the work directory.
+        The production state, notifier and metrics textfile are never opened.
+        """
+        output_dir = os.path.join(self.work_dir, 'tmp')
+        os.makedirs(output_dir, exist_ok=True)
+        return Pipeline(self.logger, batch_size=self.batch_size, arrow=self.arrow,
+                        transform_workers=self.transform_workers,
+                        state_store=self.make_state_store(),
+                        # never sends: the benchmark runs Pipeline.process, which raises instead of reporting
+                        notifier=EmailNotifier(None, None, None, None, self.logger),
+                        parquet_loader=ParquetLoader(self.logger, output_dir),
+                        hdfs_loader=HDFSLoader(self.logger, uri=f"file://{os.path.abspath(self.work_dir)}/hdfs"),
+                        metrics=Metrics(self.logger),
+                        quarantine_dir=os.path.join(self.work_dir, 'quarantine'))
+
+    def make_state_store(self) -> StateStore:
+        """
+        Create a state store in a new directory holding the initial state of every table.
+        """
+        directory = os.path.join(self.work_dir, 'state', str(time.time_ns()))
+        os.makedirs(directory)
+        for table, (column_name, values) in INITIAL_STATES.items():
+            pd.DataFrame({column_name: values}).to_parquet(os.path.join(directory, f'{table}.parquet'), index=False)
+        return StateStore(self.logger, directory)
+
+    def process(self, state_store, path, table) -> None:
+        """
+        Run the whole pipeline on a file, with a fresh state so every run processes all the rows.
+        """
+        self.pipeline.state_store = state_store
+        self.pipeline.process([path], table)
+
+    def measure(self, stage: str, table: str, rows: int, size: int, function, setup=None) -> dict:
+        """
+        Time function over `repeat` runs and keep the best one, then run it once under tracemalloc.
+
+        :param size: Bytes read by the stage, for the MB/s throughput (0 when not relevant).
+        :param setup: Function called before every run, outside the measure, whose result is passed to function.
+        :return: Dict of the stage, table, mode, rows, seconds, rows_per_second, mb_per_second,
+                 peak_alloc_bytes (None without memory) and peak_rss_bytes.
+        """
+        best = None
+        for _ in range(self.repeat):
+            arguments = (setup(),) if setup else ()
+            gc.collect()
+            started = time.perf_counter()
+            function(*arguments)
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+
+        peak_alloc = None
+        if self.memory:
+            arguments = (setup(),) if setup else ()
+            gc.collect()
+            tracemalloc.start()
+            try:
+                function(*arguments)
+                peak_alloc = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+        result = {
+            'stage': stage,
+            'table': table,
+            'mode': self.mode,
+            'rows': rows,
+            'seconds': round(best, 6),
+            'rows_per_second': round(rows / best, 1) if best else None,
+            'mb_per_second': round(size / best / 1024 / 1024, 2) if size and best else None,
+            'peak_alloc_bytes': peak_alloc,
+            'peak_rss_bytes': get_peak_rss()
+        }
+        self.logger.log('info', f"Benchmark: {json.dumps(result)}")
+        return result
+
+
+def get_key(result: dict) -> str:
+    """
+    Key of a result in the baseline: mode/stage/table/rows.
+    """
+    return f"{result['mode']}/{result['stage']}/{result['table']}/{result['rows']}"
+
+
+def save_baseline(results: list, path: str) -> None:
+    """
+    Store the throughput of the results as the baseline, keeping the entries of the other measures.
+    """
+    baseline = load_baseline(path)
+    for result in results:
+        baseline[get_key(result)] = result['rows_per_second']
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w') as file:
+        json.dump(baseline, file, indent=4, sort_keys=True)
+
+
+def load_baseline(path: str) -> dict:
+    """
+    Load the baseline (key -> rows per second), empty when there is none yet.
+    """
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r') as file:
+        return json.load(file)
+
+
+def compare(results: list, baseline: dict, tolerance: float = 0.2) -> list:
+    """
+    Compare the throughput of the results with the baseline.
+
+    :param tolerance: Fraction of the baseline throughput that may be lost before a result is a regression.
+    :return: The regressions, as messages.
+    """
+    regressions = []
+    for result in results:
+        expected = baseline.get(get_key(result))
+        if expected and result['rows_per_second'] is not None:
+            result['baseline_change'] = round(result['rows_per_second'] / expected - 1, 3)
+            if result['rows_per_second'] < expected * (1 - tolerance):
+                regressions.append(f"{get_key(result)}: {result['rows_per_second']:.0f} rows/s, "
+                                   f"baseline {expected:.0f} rows/s ({result['baseline_change']:+.0%})")
+    return regressions
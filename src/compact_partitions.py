@@ -0,0 +1,40 @@
+import os
+import argparse
+from datetime import date
+
+from dotenv import load_dotenv
+
+from pipeline.logger.logger import Logger
+from pipeline.loaders.hdfs_loader import DEFAULT_URI, connect_filesystem
+from pipeline.loaders.partition_compactor import PartitionCompactor
+
+TABLES = ["credit_cards_billing", "customer_profiles", "support_tickets", "loans", "transactions"]
+
+def main():
+    """
+    Merge the small hourly parquet files of the staged tables into files of about --target-size-mb.
+    Only the days before --before (default: today) are compacted.
+    Without --uri nor HDFS_URI, the cluster of the Hadoop configuration is used (hdfs://default).
+
+    Usage: python src/compact_partitions.py --uri hdfs://namenode:9000 --target-size-mb 128
+    """
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description="Compact the Hive partitions of the staged tables.")
+    parser.add_argument('--uri', default=os.getenv('HDFS_URI') or DEFAULT_URI,
+                        help=f"URI of the filesystem (default: HDFS_URI, else {DEFAULT_URI}).")
+    parser.add_argument('--stage-dir', default='/stage', help="Directory of the tables.")
+    parser.add_argument('--target-size-mb', type=int, default=128, help="Size of the merged files.")
+    parser.add_argument('--before', default=date.today().isoformat(), help="Only compact the days before this date.")
+    parser.add_argument('--table', action='append', help="Table to compact (default: every table).")
+    args = parser.parse_args()
+
+    logger = Logger('./logs/etl.log')
+    compactor = PartitionCompactor(logger, connect_filesystem(args.uri), args.target_size_mb * 1024 * 1024)
+
+    for table in args.table or TABLES:
+        removed = compactor.compact_table(f"{args.stage_dir.rstrip('/')}/{table}", args.before)
+        print(f"Compacted {table}: {removed} files removed")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+import os
+import argparse
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+
+from synthetic.columns import TABLE_FORMATS, ID_WIDTHS
+from synthetic.tables import GENERATORS, table_seeds, generate_table as generate_dataframe
+
+try:
+    import faker
+except ImportError:  # the names and loan reasons are then combined from word pools
+    faker = None
+
+# Number of distinct names and loan reasons drawn from Faker, then sampled for every row
+POOL_SIZE = 5000
+
+
+def get_faker_pools(table: str, settings: dict) -> dict:
+    """
+    Draw the names or loan reasons of a table from Faker, seeded from the seed of the data.
+
+    :param table: Name of the table.
+    :param settings: Settings of the data (see main).
+    :return: The pools to add to the settings of the table, empty without Faker or for the other tables.
+    """
+    if faker is None or table not in ('customer_profiles', 'loans'):
+        return {}
+    fake = faker.Faker()
+    if table == 'customer_profiles':
+        fake.seed_instance(settings['seed'])
+        return {'names': [fake.name() for _ in range(min(settings['customers'], POOL_SIZE))]}
+    fake.seed_instance(settings['seed'] + 1)
+    return {'loan_reasons': [fake.sentence() for _ in range(min(settings['loans'], POOL_SIZE))]}
+
+
+def write_table(df: pd.DataFrame, path: str) -> None:
+    """
+    Write the table in the format of the file extension (csv, txt with '|' or json records).
+    The file is written in a staging directory next to the partitions and moved in once complete,
+    so the file monitor never picks up a partial file.
+    """
+    staging_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(path))), '.staging')
+    os.makedirs(staging_dir, exist_ok=True)
+    staging_path = os.path.join(staging_dir, os.path.basename(path))
+
+    extension = path.rsplit('.', 1)[-1]
+    if extension == 'json':
+        df.to_json(staging_path, orient='records', indent=4)
+    elif extension == 'txt':
+        df.to_csv(staging_path, sep='|', index=False)
+    else:
+        df.to_csv(staging_path, index=False)
+    os.replace(staging_path, path)
+
+
+def generate_table(table: str, seed, settings: dict) -> tuple:
+    """
+    Generate one table with the shared generator of synthetic.tables and write it as the incoming file
+    of the partition. Runs in a worker process when --workers > 1.
+
+    :param table: Name of the table.
+    :param seed: Seed of the random generator of the table (see synthetic.tables.table_seeds).
+    :param settings: Settings of the data (see main), with the formats, base_dir and timestamp_suffix of the files.
+    :return: (table, path of the written file, number of rows)
+    """
+    df = generate_dataframe(table, seed, dict(settings, **get_faker_pools(table, settings)))
+    path = os.path.join(settings['base_dir'], f"{table}_{settings['timestamp_suffix']}.{settings['formats'][table]}")
+    write_table(df, path)
+    return table, path, df.shape[0]
+
+
+def main():
+    """
+    Generate the incoming files of the five tables in data/incomming_data/<YYYY-MM-DD>/<HH>.
+
+    Usage: python src/data_generator.py --customers 1000000 --transactions 5000000 --workers 5
+    """
+    parser = argparse.ArgumentParser(description="Generate synthetic bank data.")
+    parser.add_argument('--customers', type=int, default=200, help="Customer profiles.")
+    parser.add_argument('--tickets', type=int, default=200, help="Support tickets.")
+    parser.add_argument('--months', type=int, default=2, help="Billing months per customer.")
+    parser.add_argument('--transactions', type=int, default=200, help="Money transfers.")
+    parser.add_argument('--loans', type=int, default=200, help="Loan requests.")
+    parser.add_argument('--billing-start', default='2023-01', help="First billing month (YYYY-MM).")
+    parser.add_argument('--id-offset', type=int, default=0,
+                        help="Number the tickets and bills after this value, to keep them unique across runs.")
+    parser.add_argument('--format', action='append', default=[], metavar='TABLE=EXT',
+                        help="File format of a table: csv, txt or json (e.g. transactions=csv).")
+    parser.add_argument('--partition-time', help="Partition of the files, 'YYYY-MM-DD HH' (default: now).")
+    parser.add_argument('--output-dir', default='data/incomming_data', help="Base directory of the partitions.")
+    parser.add_argument('--seed', type=int, help="Seed of the random data (default: random).")
+    parser.add_argument('--workers', type=int, default=1, help="Tables generated in parallel processes.")
+    parser.add_argument('--tables', nargs='+', choices=list(GENERATORS), default=list(GENERATORS),
+                        help="Tables to generate (default: every table).")
+    args = parser.parse_args()
+
+    formats = dict(TABLE_FORMATS)
+    for option in args.format:
+        table, _, extension = option.partition('=')
+        if table not in formats or extension not in ('csv', 'txt', 'json'):
+            parser.error(f"invalid --format {option}")
+        formats[table] = extension
+
+    if args.customers < 1 or args.customers >= 10 ** ID_WIDTHS['customer']:
+        parser.error(f"--customers must be between 1 and {10 ** ID_WIDTHS['customer'] - 1}")
+    if args.id_offset + args.tickets >= 10 ** ID_WIDTHS['ticket']:
+        parser.error("--tickets and --id-offset exceed the ticket identifiers")
+    if args.id_offset + args.customers * args.months >= 10 ** ID_WIDTHS['bill']:
+        parser.error("--customers * --months and --id-offset exceed the bill identifiers")
+
+    # Get the partition date & hour of the files
+    now = datetime.now()
+    partition_time = datetime.strptime(args.partition_time, '%Y-%m-%d %H') if args.partition_time else now
+    partition_time = partition_time.replace(minute=now.minute, second=now.second)
+
+    settings = {
+        'customers': args.customers,
+        'tickets': args.tickets,
+        'months': args.months,
+        'transactions': args.transactions,
+        'loans': args.loans,
+        'billing_start': args.billing_start,
+        'id_offset': args.id_offset,
+        'formats': formats,
+        'seed': args.seed if args.seed is not None else int(np.random.SeedSequence().entropy % 2 ** 32),
+        'today': np.datetime64(partition_time.date(), 'D'),
+        'timestamp_suffix': partition_time.strftime('%Y%m%d%H%M%S'),
+        'base_dir': os.path.join(args.output_dir, partition_time.strftime('%Y-%m-%d'), partition_time.strftime('%H'))
+    }
+    os.makedirs(settings['base_dir'], exist_ok=True)
+
+    # Independent random streams per table, so the data of a seed does not depend on the number of workers
+    seeds = table_seeds(settings['seed'])
+
+    if args.workers > 1:
+        with ProcessPoolExecutor(max_workers=args.workers) as executor:
+            futures = [executor.submit(generate_table, table, seeds[table], settings) for table in args.tables]
+            results = [future.result() for future in futures]
+    else:
+        results = [generate_table(table, seeds[table], settings) for table in args.tables]
+
+    for table, path, rows in results:
+        print(f"Generated {rows} rows of {table} in {path}")
+
+if __name__ == "__main__":
+    main()
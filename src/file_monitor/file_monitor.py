@@ -1,17 +1,36 @@
 import os
+import sys
 import time
+import signal
 import threading
-from datetime import datetime
-from queue import Queue
+import multiprocessing
+from datetime import datetime, timedelta
+from queue import Queue, Empty
+
+from file_monitor.inotify import Inotify, IN_CLOSE_WRITE, IN_MOVED_TO, IN_CREATE, IN_Q_OVERFLOW, IN_ISDIR
 
 class FileMonitor:
-    def __init__(self, pipeline, base_dir, clear_interval=3600):
+    def __init__(self, pipeline, base_dir, clear_interval=3600, workers=1, executor='thread', watcher='auto',
+                 coalesce_window=0, coalesce_max_bytes=64 * 1024 * 1024):
         """
         Initialize the FileMonitor with a pipeline and the base directory to monitor.
         :param pipeline: The pipeline to process files.
         :param base_dir: The directory to monitor for new files.
         :param clear_interval: The time interval (in seconds) to clear the processed files set (default is 1 hour).
+        :param workers: Number of workers processing files in parallel (default is 1).
+        :param executor: 'thread' or 'process', the kind of worker used to run the pipeline.
+        :param watcher: 'inotify', 'polling' or 'auto' (inotify when available, polling otherwise).
+        :param coalesce_window: Seconds a worker waits for more files of a table after the first one, to process
+                                them together as one batch (0 processes every file on its own).
+        :param coalesce_max_bytes: Size of the files of a table that triggers the batch before the window ends.
         """
+        if executor not in ('thread', 'process'):
+            raise ValueError(f"Unsupported executor: {executor}")
+        if watcher not in ('auto', 'inotify', 'polling'):
+            raise ValueError(f"Unsupported watcher: {watcher}")
+        if watcher == 'auto':
+            watcher = 'inotify' if Inotify.available() else 'polling'
+
         self.pipeline = pipeline
         self.base_dir = base_dir
         self.file_queue = Queue()  # Queue to hold the file paths for processing
@@ -19,12 +38,21 @@ class FileMonitor:
         self.clear_interval = clear_interval  # Interval to clear the processed files set
         self.last_clear_time = time.time()  # Keep track of when the set was last cleared
         self.next_target_hour = -1  
+        self.workers = max(1, int(workers))
+        self.executor = executor
+        self.worker_queues = []  # One queue per worker, files of a table always go to the same worker
+        self.table_workers = {}  # Table name -> index of the worker that owns it
+        self.watcher = watcher
+        self.coalesce_window = coalesce_window
+        self.coalesce_max_bytes = coalesce_max_bytes
 
     def start(self):
         """
         Start monitoring the file system. Once a new file is detected in the partitioned hourly folder,
         run the pipeline with the file.
         """
+        self.start_workers()
+
         monitor_thread = threading.Thread(target=self.monitor_files)
         pipeline_thread = threading.Thread(target=self.process_files)
 
@@ -39,50 +67,207 @@ class FileMonitor:
 
     def monitor_files(self):
         """
-        Continuously monitor the directory for new files and add them to the file queue.
+        Continuously monitor the directory for new files and add them to the file queue,
+        using inotify events when available and polling otherwise.
+        """
+        if self.watcher == 'inotify':
+            self.watch_files()
+        else:
+            self.poll_files()
+
+    def poll_files(self):
+        """
+        Poll the current and previous hourly partitions every second and enqueue every new file.
         """
         while True:
             self.check_and_clear_processed_files()  
-            file = self.detect_new_file()
-        
-            if file and file not in self.processed_files:
-                self.file_queue.put(file)  
-                self.processed_files.add(file)  
+            for file in self.detect_new_files():
+                self.enqueue_file(file)
+            time.sleep(1)  
+
+    def watch_files(self, timeout=1):
+        """
+        Watch the current and previous hourly partitions with inotify and enqueue every file
+        as soon as it is closed after writing (or moved into the partition).
+
+        :param timeout: Seconds to wait for events before re-checking the watched partitions.
+        """
+        inotify = Inotify()
+        try:
+            while True:
+                self.check_and_clear_processed_files()
+                self.refresh_watches(inotify)
+
+                for directory, name, mask in inotify.read_events(timeout):
+                    if mask & IN_Q_OVERFLOW:
+                        # Events were dropped, fall back to listing the watched partitions
+                        for file in self.detect_new_files():
+                            self.enqueue_file(file)
+                    elif not mask & IN_ISDIR and mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                        if directory in self.get_partition_dirs():
+                            self.enqueue_file(os.path.join(directory, name))
+        finally:
+            inotify.close()
+
+    def refresh_watches(self, inotify):
+        """
+        Watch the base directory, the day directories and the hourly partitions that may receive files,
+        and drop the watches of older partitions. Files already in a newly watched partition are enqueued.
+        """
+        partitions = self.get_partition_dirs()
+        wanted = [self.base_dir] + sorted({os.path.dirname(d) for d in partitions}) + partitions
+
+        for directory in inotify.watched_paths() - set(wanted):
+            inotify.remove_watch(directory)
+
+        watched = inotify.watched_paths()
+        for directory in wanted:
+            if directory in watched or not os.path.isdir(directory):
+                continue
+            if directory in partitions:
+                inotify.add_watch(directory, IN_CLOSE_WRITE | IN_MOVED_TO)
+                # Files closed before the watch was added would never raise an event
+                for file in self.list_files(directory):
+                    self.enqueue_file(file)
             else:
-                time.sleep(1)  
+                inotify.add_watch(directory, IN_CREATE)
+
+    def enqueue_file(self, file):
+        """
+        Add the file to the file queue unless it was already queued.
+        """
+        if file not in self.processed_files:
+            self.file_queue.put(file)  
+            self.processed_files.add(file)  
+
     def process_files(self):
         """
-        Continuously retrieve file paths from the queue, process the file with the pipeline,
-        and remove it from the queue after processing.
+        Continuously retrieve file paths from the queue and dispatch each one to the worker
+        that owns its table, so files of the same table are processed in arrival order
+        while different tables run in parallel.
         """
         while True:
-            if not self.file_queue.empty():
-                file = self.file_queue.get()  # Retrieve the next file from the queue
-                self.pipeline.run(file)  # Process the file using the pipeline
-                self.file_queue.task_done()  # Mark the task as done
-                self.remove_file(file)  # Remove the file after processing
+            file = self.file_queue.get()  # Block until the next file is available
+            worker = self.get_worker(self.get_table(file))
+            self.worker_queues[worker].put(file)
+            self.file_queue.task_done()  # Mark the task as done
 
+    def start_workers(self):
+        """
+        Start the pool of workers (threads or processes), each one consuming its own queue.
+        """
+        if self.executor == 'process':
+            # the failures of the forked workers are sent by the notifier of this process
+            self.pipeline.notifier.start()
+            self.pipeline.metrics.remove_worker_textfiles()
+        for index in range(self.workers):
+            if self.executor == 'process':
+                # Fork so the workers inherit the pipeline instead of pickling it
+                context = multiprocessing.get_context('fork')
+                queue = context.Queue()
+                worker = context.Process(target=self.run_process_worker, args=(queue, index))
             else:
-                time.sleep(1)  
+                queue = Queue()
+                worker = threading.Thread(target=self.run_worker, args=(queue,))
+            worker.daemon = True
+            worker.start()
+            self.worker_queues.append(queue)
 
-    def detect_new_file(self):
+    def run_process_worker(self, queue, index):
         """
-        Detect new files in the partitioned directory structure based on modification time.
-        Returns the new file path if a new file is detected.
+        Run a forked worker: its metrics are exported under its index and removed when it exits.
         """
-        current_time = datetime.now()
-        day = current_time.day
-        month = current_time.month
-        year = current_time.year
-        hour = current_time.hour
+        self.pipeline.metrics.set_worker(index)
+        # the parent terminates the workers when it exits, run the cleanup then too
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        try:
+            self.run_worker(queue)
+        finally:
+            self.pipeline.metrics.remove_textfile()
+
+    def run_worker(self, queue):
+        """
+        Process the files of a worker queue one at a time with the pipeline,
+        and remove each file after processing.
+        With a coalesce window, the files of a table are gathered and processed together.
+        """
+        if self.coalesce_window:
+            self.run_coalescing_worker(queue)
+            return
 
-        dir_path = os.path.join(self.base_dir, f"{year}-{month:02d}-{day:02d}", f"{hour:02d}")
+        while True:
+            file = queue.get()  # Retrieve the next file from the queue
+            self.pipeline.run(file)  # Process the file using the pipeline
+            self.remove_file(file)  # Remove the file after processing
+
+    def run_coalescing_worker(self, queue):
+        """
+        Gather the files of each table from the worker queue and process them as one batch with the pipeline
+        once coalesce_window seconds passed since the first one, or once they reach coalesce_max_bytes.
+        """
+        pending = {}  # Table name -> (deadline, total size, files)
+        while True:
+            timeout = None
+            if pending:
+                timeout = max(0, min(deadline for deadline, _, _ in pending.values()) - time.time())
+            try:
+                file = queue.get(timeout=timeout)
+                table = self.get_table(file)
+                deadline, size, files = pending.get(table, (time.time() + self.coalesce_window, 0, []))
+                files.append(file)
+                size += os.path.getsize(file) if os.path.exists(file) else 0
+                pending[table] = (deadline, size, files)
+                if size >= self.coalesce_max_bytes:
+                    self.run_batch(pending.pop(table)[2])
+            except Empty:
+                pass
+
+            now = time.time()
+            for table in [table for table, (deadline, _, _) in pending.items() if deadline <= now]:
+                self.run_batch(pending.pop(table)[2])
+
+    def run_batch(self, files):
+        """
+        Process files of the same table as one batch with the pipeline, and remove them after processing.
+        """
+        self.pipeline.run_many(files)
+        for file in files:
+            self.remove_file(file)
 
-        if os.path.exists(dir_path):
-            files = self.list_files(dir_path)
-            for file in files:
-                return file
-        return None
+    def get_table(self, file):
+        """
+        Extract the table name from the file name (e.g. transactions_20250519120000.json -> transactions).
+        """
+        return os.path.basename(file).rsplit('_', 1)[0]
+
+    def get_worker(self, table):
+        """
+        Return the index of the worker owning the table, assigning tables to workers round-robin
+        the first time they are seen.
+        """
+        if table not in self.table_workers:
+            self.table_workers[table] = len(self.table_workers) % self.workers
+        return self.table_workers[table]
+
+    def detect_new_files(self):
+        """
+        Detect files in the current and previous hourly partitions,
+        so files landing late in the previous hour are still picked up.
+        Returns the list of file paths that were not queued yet.
+        """
+        files = []
+        for dir_path in self.get_partition_dirs():
+            if os.path.exists(dir_path):
+                files.extend(file for file in self.list_files(dir_path) if file not in self.processed_files)
+        return files
+
+    def get_partition_dirs(self):
+        """
+        Return the previous and current hourly partition directories (YYYY-MM-DD/HH).
+        """
+        current_time = datetime.now()
+        return [os.path.join(self.base_dir, partition_time.strftime('%Y-%m-%d'), partition_time.strftime('%H'))
+                for partition_time in (current_time - timedelta(hours=1), current_time)]
 
     def list_files(self, dir_path):
         """
@@ -116,12 +301,14 @@ class FileMonitor:
     def check_and_clear_processed_files(self):
         """
         Check if the time has reached the next full hour to clear the processed files set.
-        Clears the set when the current time hits the next full hour (e.g., 5:00, 6:00, etc.).
+        Clears the set when the current time hits the next full hour (e.g., 5:00, 6:00, etc.),
+        keeping the files of the partitions that are still monitored.
         """
         current_hour = datetime.now().hour  
         current_minute = datetime.now().minute  
         if current_hour == self.next_target_hour:  
-            self.processed_files.clear()  
+            partitions = self.get_partition_dirs()
+            self.processed_files = {file for file in self.processed_files if os.path.dirname(file) in partitions}
         if current_minute == 0:
             self.next_target_hour = current_hour + 1 if current_hour < 23 else 0 
         else:
@@ -0,0 +1,123 @@
+import os
+import ctypes
+import ctypes.util
+import select
+import struct
+
+# Event masks from <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+EVENT_HEADER = struct.Struct('iIII')  # wd, mask, cookie, len
+
+
+class Inotify:
+    """
+    Minimal ctypes binding to the Linux inotify API, used to watch the incoming
+    partitions without re-listing them.
+    """
+
+    def __init__(self):
+        """
+        Create the inotify instance.
+
+        :raises OSError: If inotify is not available on this platform.
+        """
+        libc_name = ctypes.util.find_library('c')
+        if not libc_name:
+            raise OSError("libc not found, inotify is not available")
+        self.libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(self.libc, 'inotify_init1'):
+            raise OSError("inotify is not available on this platform")
+
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        self.watches = {}  # watch descriptor -> watched directory
+
+    @staticmethod
+    def available() -> bool:
+        """
+        Check whether inotify can be used on this platform.
+        """
+        try:
+            Inotify().close()
+            return True
+        except (OSError, AttributeError):
+            return False
+
+    def add_watch(self, path, mask) -> int:
+        """
+        Watch a directory for the given events.
+
+        :param path: Directory to watch.
+        :param mask: Bitmask of the events to report.
+        :return: The watch descriptor.
+        """
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno), path)
+        self.watches[wd] = path
+        return wd
+
+    def remove_watch(self, path) -> None:
+        """
+        Stop watching a directory.
+        """
+        for wd, watched in list(self.watches.items()):
+            if watched == path:
+                self.libc.inotify_rm_watch(self.fd, wd)
+                del self.watches[wd]
+
+    def watched_paths(self) -> set:
+        """
+        Return the set of watched directories.
+        """
+        return set(self.watches.values())
+
+    def read_events(self, timeout=None) -> list:
+        """
+        Wait up to timeout seconds for events and return them.
+
+        :param timeout: Seconds to wait, None blocks until an event arrives.
+        :return: List of (directory, name, mask) tuples.
+        """
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+
+            if mask & IN_IGNORED:
+                # The watched directory was removed
+                self.watches.pop(wd, None)
+                continue
+            events.append((self.watches.get(wd), name, mask))
+        return events
+
+    def close(self) -> None:
+        """
+        Close the inotify file descriptor.
+        """
+        os.close(self.fd)
+        self.watches.clear()
@@ -11,11 +11,15 @@ if [[ -z "$INPUT_LOG" || -z "$OUTPUT_PATH" ]]; then
     exit 1
 fi
 
+# Read the last rotated log first, the last 24 hours may start in it
+INPUT_LOGS=("$INPUT_LOG")
+[[ -f "$INPUT_LOG.1" ]] && INPUT_LOGS=("$INPUT_LOG.1" "$INPUT_LOG")
+
 log_segment=$(awk -v start="$START_TIME" -v end="$END_TIME" '
 {
     ts = substr($0, 1, 19)
     if (ts >= start && ts <= end) print $0
-}' "$INPUT_LOG")
+}' "${INPUT_LOGS[@]}")
 
 IFS=$'\n' read -rd '' -a lines <<< "$log_segment"
 
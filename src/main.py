@@ -1,25 +1,55 @@
 from file_monitor.file_monitor import FileMonitor
 from pipeline.pipeline import Pipeline
 from pipeline.logger.logger import Logger 
+from dotenv import load_dotenv
 
+import os
 import warnings
 
 # Suppress all warnings globally
 warnings.filterwarnings("ignore")
 
 def main():
+    load_dotenv()  # Load the ETL_* settings from .env
+
     # Initialize logger
-    logger = Logger('./logs/etl.log')  # Ensure you have a log file to capture logs
+    # Records are written by a background thread to etl.log and, as JSON lines with their file, table
+    # and stage, to LOG_JSON_FILE; the logs rotate at LOG_MAX_MB and every LOG_ROTATE_WHEN ('H', 'D' or 'W')
+    logger = Logger('./logs/etl.log', json_file=os.getenv('LOG_JSON_FILE', './logs/etl.jsonl') or None,
+                    max_bytes=int(os.getenv('LOG_MAX_MB', 100)) * 1024 * 1024,
+                    backup_count=int(os.getenv('LOG_BACKUPS', 10)),
+                    when=os.getenv('LOG_ROTATE_WHEN') or None,
+                    level=os.getenv('LOG_LEVEL', 'DEBUG'))
 
     # Instantiate the pipeline with the logger
-    pipeline = Pipeline(logger)
+    # ETL_BATCH_SIZE streams each file through the pipeline in batches of that many rows
+    # and ETL_ARROW=1 keeps the data Arrow-backed from the readers to the parquet files
+    # ETL_TRANSFORM_WORKERS transforms the DataFrames of at least ETL_TRANSFORM_MIN_ROWS rows in chunks
+    # across that many processes (with the thread workers of the file monitor, best with ETL_ARROW=1)
+    pipeline = Pipeline(logger, batch_size=int(os.getenv('ETL_BATCH_SIZE', 0)) or None,
+                        arrow=os.getenv('ETL_ARROW', '0') == '1',
+                        transform_workers=int(os.getenv('ETL_TRANSFORM_WORKERS', 0)) or None,
+                        transform_min_rows=int(os.getenv('ETL_TRANSFORM_MIN_ROWS', 100000)))
 
     # Create an instance of the FileMonitor with the pipeline and the directory path to monitor
-    file_monitor = FileMonitor(pipeline, base_dir="data/incomming_data")
+    # One worker per table by default, ETL_EXECUTOR selects 'thread' or 'process' workers
+    # and ETL_WATCHER selects 'inotify' or 'polling' (default: inotify when available)
+    # ETL_COALESCE_WINDOW gathers the files of a table arriving within that many seconds into one batch
+    # (one state update and one output file), ETL_COALESCE_MAX_MB processes the batch early once that big
+    file_monitor = FileMonitor(pipeline, base_dir="data/incomming_data",
+                               workers=int(os.getenv('ETL_WORKERS', 5)),
+                               executor=os.getenv('ETL_EXECUTOR', 'thread'),
+                               watcher=os.getenv('ETL_WATCHER', 'auto'),
+                               coalesce_window=float(os.getenv('ETL_COALESCE_WINDOW', 0)),
+                               coalesce_max_bytes=int(os.getenv('ETL_COALESCE_MAX_MB', 64)) * 1024 * 1024)
 
     print("Starting file monitor...")
     # Start the file monitor to continuously check for new files and process them
-    file_monitor.start()
+    try:
+        file_monitor.start()
+    finally:
+        # Stop the transform pool, e.g. on Ctrl+C
+        pipeline.close()
 
 if __name__ == "__main__":
     main()
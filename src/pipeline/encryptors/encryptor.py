@@ -1,61 +1,141 @@
 import pandas as pd
 import random
+import string
+import threading
+from collections import Counter
+
+# Translation tables of the Caesar cipher for every shift (0-25) of the ASCII letters
+SHIFT_TABLES = [
+    str.maketrans(string.ascii_lowercase + string.ascii_uppercase,
+                  string.ascii_lowercase[shift:] + string.ascii_lowercase[:shift] +
+                  string.ascii_uppercase[shift:] + string.ascii_uppercase[:shift])
+    for shift in range(26)
+]
+
+# Relative frequency (%) of the letters a-z in English text, used when no dictionary word is found
+ENGLISH_LETTER_FREQUENCIES = [8.2, 1.5, 2.8, 4.3, 12.7, 2.2, 2.0, 6.1, 7.0, 0.15, 0.77, 4.0, 2.4,
+                              6.7, 7.5, 1.9, 0.095, 6.0, 6.3, 9.1, 2.8, 0.98, 2.4, 0.15, 2.0, 0.074]
+
+# Dictionary path -> frozenset of English words, loaded once and shared by every Encryptor
+ENGLISH_WORDS = {}
+ENGLISH_WORDS_LOCK = threading.Lock()
+
+
+def load_english_words(english_path: str) -> frozenset:
+    """
+    Load the English words of the dictionary file once and return the cached frozenset.
+    """
+    with ENGLISH_WORDS_LOCK:
+        if english_path not in ENGLISH_WORDS:
+            with open(english_path, 'r') as file:
+                ENGLISH_WORDS[english_path] = frozenset(file.read().lower().split())
+        return ENGLISH_WORDS[english_path]
+
 
 class Encryptor:
-    def __init__(self, english_path: dict):
+    def __init__(self, english_path: str, sample_size: int = 100):
         """
         Initialize the Encryptor with a dictionary (dictionary) for validation.
+        The dictionary is preloaded so forked workers share it.
+
+        :param english_path: Path to the English words file.
+        :param sample_size: Number of messages scored to detect the shift when decrypting.
         """
         self.english_path = english_path
-        self.english_dict = {} 
+        self.sample_size = sample_size
+        self.english_words = load_english_words(english_path)
 
-    def encrypt(self, df, column) -> pd.DataFrame:
+    def encrypt(self, df, column, key: int = None) -> pd.DataFrame:
         """
-        Encrypt the specified column in the DataFrame using a Caesar cipher with a random key.
+        Encrypt the specified column in the DataFrame using a Caesar cipher with a random key,
+        or with the given key to encrypt several batches of the same file consistently.
         """
-        self.encryption_key = self.generate_random_key()
+        self.encryption_key = key if key is not None else self.generate_random_key()
 
-        df[column] = df[column].apply(lambda x: self.caesar_cipher(x, self.encryption_key))
+        df[column] = self.shift_column(df[column], self.encryption_key)
 
         return df
     
     def decrypt(self, df, column) -> pd.DataFrame:
         """
         Brute force decrypt the specified column in the DataFrame using Caesar cipher and dictionary validation.
-        Decrypt only the first message, get the best shift key, and use it to decrypt the entire column.
+        Score a sample of the messages together, get the best shift key, and use it to decrypt the entire column.
         """
-        first_message = df[column].iloc[0] 
-        best_shift = self.get_best_shift(first_message) 
+        sample = df[column].dropna().head(self.sample_size)
+        best_shift = self.get_best_shift(' '.join(sample)) 
        
 
-        df[column] = df[column].apply(lambda x: self.caesar_cipher(x, -best_shift))  
+        df[column] = self.shift_column(df[column], -best_shift)  
 
         return df
 
     def get_best_shift(self, encrypted_text: str) -> int:
         """
-        Try all shifts (1-25) on the first message and find the shift that results in the most valid English words.
-        Sum the values of the valid words in the dictionary and select the shift with the highest score.
+        Try all shifts (1-25) on the text and find the shift that results in the most valid English words.
+        If no shift gives any dictionary word, select the shift whose letter frequencies are closest to English.
         """
         best_shift = 0
         max_score = 0
-        self.english_dict = self.get_english_dict(self.english_path)
+        encrypted_text = encrypted_text.lower()
 
-        for shift in range(1, 25): 
-            decrypted_text = self.caesar_cipher(encrypted_text, -shift) 
+        for shift in range(1, 26): 
+            decrypted_text = encrypted_text.translate(SHIFT_TABLES[-shift % 26]) 
 
             words = decrypted_text.split() 
-            score = sum(self.english_dict.get(word.lower(), 0) for word in words)
+            score = sum(word.strip(string.punctuation) in self.english_words for word in words)
 
             if score > max_score:
                 best_shift = shift
                 max_score = score
+
+        if max_score == 0:
+            best_shift = self.get_frequency_shift(encrypted_text)
         return best_shift
 
+    def get_frequency_shift(self, encrypted_text: str) -> int:
+        """
+        Find the shift (0-25) whose decrypted letter frequencies have the lowest chi-squared distance to English.
+        """
+        counts = Counter(char for char in encrypted_text.lower() if 'a' <= char <= 'z')
+        total = sum(counts.values())
+        if total == 0:
+            return 0
+
+        letters = [counts.get(chr(97 + index), 0) for index in range(26)]
+        best_shift = 0
+        min_distance = None
+        for shift in range(26):
+            distance = 0.0
+            for index, frequency in enumerate(ENGLISH_LETTER_FREQUENCIES):
+                expected = total * frequency / 100
+                # The encrypted letter for plain letter index is (index + shift) % 26
+                distance += (letters[(index + shift) % 26] - expected) ** 2 / expected
+            if min_distance is None or distance < min_distance:
+                best_shift = shift
+                min_distance = distance
+        return best_shift
+
+    def shift_column(self, column: pd.Series, key: int) -> pd.Series:
+        """
+        Encrypts or decrypts a whole column using Caesar cipher with a given key (shift).
+        ASCII values are shifted at once with the precomputed translation table, the rare
+        values holding non-ASCII letters go through caesar_cipher to keep the exact same output.
+        """
+        shifted = column.str.translate(SHIFT_TABLES[key % 26])
+
+        non_ascii = column.str.contains(r'[^\x00-\x7f]', regex=True, na=False)
+        if non_ascii.any():
+            shifted[non_ascii] = column[non_ascii].apply(lambda x: self.caesar_cipher(x, key))
+        return shifted
+
     def caesar_cipher(self, text: str, key: int) -> str:
         """
         Encrypts or decrypts the text using Caesar cipher with a given key (shift).
         """
+        if text.isascii():
+            return text.translate(SHIFT_TABLES[key % 26])
+
+        # Non-ASCII letters are shifted into the ASCII range like the ASCII ones
         encrypted_text = []
         for char in text:
             if char.isalpha():
@@ -71,12 +151,3 @@ class Encryptor:
         Generates a random key (shift value) for encryption (between 1 and 25).
         """
         return random.randint(1, 25)
-    
-    def get_english_dict(self, english_path):
-        english_dict = {}
-        with open(english_path, 'r') as file:
-            for line in file:
-                words = line.strip().split(' ') 
-                for word in words:
-                    english_dict[word.lower()] = 1  
-        return english_dict
\ No newline at end of file
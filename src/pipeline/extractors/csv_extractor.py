@@ -1,22 +1,83 @@
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
+
+
+def read_arrow_csv(file_path: str, sep: str = ',', column_types: dict = None) -> pd.DataFrame:
+    """
+    Read a delimited file with the multithreaded pyarrow CSV reader into an Arrow-backed DataFrame.
+
+    :param column_types: Mapping of column name to pyarrow type, overriding the inferred types
+                         (e.g. keeps ISO dates as strings when the schema expects a string).
+    """
+    table = pacsv.read_csv(file_path, parse_options=pacsv.ParseOptions(delimiter=sep),
+                           convert_options=pacsv.ConvertOptions(column_types=column_types or {}))
+    return table.to_pandas(types_mapper=pd.ArrowDtype)
+
+
+def read_arrow_csv_batches(file_path: str, batch_size: int, sep: str = ',', column_types: dict = None):
+    """
+    Stream a delimited file with the pyarrow CSV reader as Arrow-backed DataFrames of exactly
+    batch_size rows (the last one may be smaller), whatever the size of the blocks read.
+    """
+    reader = pacsv.open_csv(file_path, parse_options=pacsv.ParseOptions(delimiter=sep),
+                            convert_options=pacsv.ConvertOptions(column_types=column_types or {}))
+    pending, rows = [], 0
+    for batch in reader:
+        pending.append(batch)
+        rows += batch.num_rows
+        while rows >= batch_size:
+            table = pa.Table.from_batches(pending, reader.schema)
+            yield table.slice(0, batch_size).to_pandas(types_mapper=pd.ArrowDtype)
+            rest = table.slice(batch_size)
+            pending, rows = rest.to_batches(), rest.num_rows
+    if rows:
+        yield pa.Table.from_batches(pending, reader.schema).to_pandas(types_mapper=pd.ArrowDtype)
+
 
 class CSVExtractor:
-    def __init__(self, logger):
+    def __init__(self, logger, arrow: bool = False):
 
         """
         Initializes the CSVExtractor with the path to the CSV file.
 
         :param file_path: Path to the CSV file.
+        :param arrow: Read with the pyarrow CSV reader into Arrow-backed DataFrames.
         """
         self.logger = logger
-    def extract(self, file_path: str) -> pd.DataFrame:
+        self.arrow = arrow
+
+    def extract(self, file_path: str, column_types: dict = None, dtype: dict = None,
+                parse_dates: list = None) -> pd.DataFrame:
         """
         Extracts data from a CSV file and returns it as a pandas DataFrame.
+
+        :param column_types: In arrow mode, pyarrow types of the columns whose type must not be inferred.
+        :param dtype: Otherwise, dtypes of the columns whose type must not be inferred.
+        :param parse_dates: Otherwise, columns parsed as datetimes while reading.
         """
         # Read the CSV file into a DataFrame
         try:
-            df = pd.read_csv(file_path) 
+            if self.arrow:
+                return read_arrow_csv(file_path, column_types=column_types)
+            df = pd.read_csv(file_path, dtype=dtype, parse_dates=parse_dates) 
             return df
         except:
             self.logger.log('error', f'Wrong file path {file_path}')
             raise Exception(f"PipeLine Failed with {file_path}")
+
+    def extract_batches(self, file_path: str, batch_size: int, column_types: dict = None, dtype: dict = None,
+                        parse_dates: list = None):
+        """
+        Extracts data from a CSV file as a stream of DataFrames of at most batch_size rows,
+        so the whole file is never held in memory.
+        """
+        try:
+            if self.arrow:
+                yield from read_arrow_csv_batches(file_path, batch_size, column_types=column_types)
+                return
+            for df in pd.read_csv(file_path, chunksize=batch_size, dtype=dtype, parse_dates=parse_dates):
+                yield df
+        except Exception:
+            self.logger.log('error', f'Wrong file path {file_path}')
+            raise Exception(f"PipeLine Failed with {file_path}")
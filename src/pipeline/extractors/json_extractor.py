@@ -1,23 +1,133 @@
 import pandas as pd
+import pyarrow as pa
 import json
 
 class JSONExtractor:
-    def __init__(self, logger):
+    def __init__(self, logger, arrow: bool = False):
         """
         Initializes the JSONExtractor with the path to the JSON file.
 
         :param file_path: Path to the JSON file.
+        :param arrow: Build Arrow-backed DataFrames from the records.
         """
         self.logger = logger
+        self.arrow = arrow
 
-    def extract(self, file_path: str) -> pd.DataFrame:
+    def extract(self, file_path: str, column_types: dict = None, dtype: dict = None,
+                parse_dates: list = None) -> pd.DataFrame:
         """
         Extracts data from a JSON file and returns it as a pandas DataFrame.
+
+        :param column_types: In arrow mode, pyarrow types the columns are cast to.
+        :param dtype: Otherwise, dtypes of the columns whose type must not be inferred.
+        :param parse_dates: Otherwise, columns parsed as datetimes while reading.
         """
         try:
-            df = pd.read_json(file_path)
+            if self.arrow:
+                # pyarrow.json only reads line-delimited files, the records of the array are converted at once
+                with open(file_path, 'r') as file:
+                    return self.to_arrow_frame(json.load(file), column_types)
+            df = pd.read_json(file_path, dtype=dtype or True, convert_dates=parse_dates or True)
             return df
         except:
             self.logger.log('error', f'Wrong file path {file_path}')
             raise Exception(f"PipeLine Failed with {file_path}")
 
+    def extract_batches(self, file_path: str, batch_size: int, column_types: dict = None, dtype: dict = None,
+                        parse_dates: list = None, read_size: int = 1024 * 1024):
+        """
+        Extracts data from a JSON file holding an array of records as a stream of DataFrames
+        of at most batch_size rows, so the whole file is never held in memory.
+        """
+        try:
+            records = []
+            for record in self.iter_records(file_path, read_size):
+                records.append(record)
+                if len(records) >= batch_size:
+                    yield self.to_frame(records, column_types, dtype, parse_dates)
+                    records = []
+            if records:
+                yield self.to_frame(records, column_types, dtype, parse_dates)
+        except Exception:
+            self.logger.log('error', f'Wrong file path {file_path}')
+            raise Exception(f"PipeLine Failed with {file_path}")
+
+    def to_frame(self, records: list, column_types: dict = None, dtype: dict = None,
+                 parse_dates: list = None) -> pd.DataFrame:
+        """
+        Build a DataFrame from a list of records, Arrow-backed in arrow mode,
+        with the column types given like for extract.
+        """
+        if self.arrow:
+            return self.to_arrow_frame(records, column_types)
+
+        df = pd.DataFrame.from_records(records)
+        if dtype:
+            df = df.astype({column: column_dtype for column, column_dtype in dtype.items() if column in df.columns})
+        for column in parse_dates or []:
+            if column in df.columns:
+                try:
+                    df[column] = pd.to_datetime(df[column])
+                except (ValueError, TypeError):
+                    pass  # left unparsed, the schema validation reports it
+        return df
+
+    def to_arrow_frame(self, records: list, column_types: dict = None) -> pd.DataFrame:
+        """
+        Convert a list of records to an Arrow table, cast the columns of column_types,
+        and return it as an Arrow-backed DataFrame. A column of mixed types (e.g. a stray string
+        among numbers) is read as strings, left to the quality checks.
+        """
+        try:
+            table = pa.Table.from_pylist(records)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            columns = dict.fromkeys(column for record in records for column in record)
+            table = pa.table({column: self.to_arrow_array([record.get(column) for record in records])
+                              for column in columns})
+        for column, column_type in (column_types or {}).items():
+            index = table.schema.get_field_index(column)
+            if index >= 0 and table.schema.field(index).type != column_type:
+                table = table.set_column(index, column, table.column(index).cast(column_type))
+        return table.to_pandas(types_mapper=pd.ArrowDtype)
+
+    @staticmethod
+    def to_arrow_array(values: list) -> pa.Array:
+        """
+        Convert the values of a column to an Arrow array, as strings when they are of mixed types.
+        """
+        try:
+            return pa.array(values)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            return pa.array([None if value is None else str(value) for value in values], pa.string())
+
+    def iter_records(self, file_path: str, read_size: int):
+        """
+        Incrementally decode the records of a top-level JSON array, reading the file
+        read_size characters at a time.
+        """
+        decoder = json.JSONDecoder()
+        with open(file_path, 'r') as file:
+            buffer, pos, eof = '', 0, False
+            while True:
+                # Skip whitespace, the opening bracket and the separators between records
+                while pos < len(buffer) and buffer[pos] in ' \t\r\n,[':
+                    pos += 1
+                if pos < len(buffer) and buffer[pos] == ']':
+                    return
+
+                if pos < len(buffer):
+                    try:
+                        record, pos = decoder.raw_decode(buffer, pos)
+                        yield record
+                        continue
+                    except json.JSONDecodeError:
+                        if eof:
+                            raise
+                elif eof:
+                    return
+
+                # The next record is incomplete, read more of the file
+                chunk = file.read(read_size)
+                eof = not chunk
+                buffer = buffer[pos:] + chunk
+                pos = 0
@@ -1,21 +1,48 @@
 import pandas as pd
 
+from pipeline.extractors.csv_extractor import read_arrow_csv, read_arrow_csv_batches
+
 class TXTExtractor:
-    def __init__(self, logger):
+    def __init__(self, logger, arrow: bool = False):
         """
         Initializes the TXTExtractor with the path to the TXT file.
 
         :param file_path: Path to the TXT file.
+        :param arrow: Read with the pyarrow CSV reader into Arrow-backed DataFrames.
         """
         self.logger = logger
+        self.arrow = arrow
 
-    def extract(self, file_path: str, sep: str) -> pd.DataFrame:
+    def extract(self, file_path: str, sep: str, column_types: dict = None, dtype: dict = None,
+                parse_dates: list = None) -> pd.DataFrame:
         """
         Extracts data from a TXT file and returns it as a pandas DataFrame.
+
+        :param column_types: In arrow mode, pyarrow types of the columns whose type must not be inferred.
+        :param dtype: Otherwise, dtypes of the columns whose type must not be inferred.
+        :param parse_dates: Otherwise, columns parsed as datetimes while reading.
         """
         try:
-            df = pd.read_csv(file_path, sep=sep)
+            if self.arrow:
+                return read_arrow_csv(file_path, sep, column_types)
+            df = pd.read_csv(file_path, sep=sep, dtype=dtype, parse_dates=parse_dates)
             return df
         except:
             self.logger.log('error', f'Wrong file path {file_path}')
             raise Exception(f"PipeLine Failed with {file_path}")
+
+    def extract_batches(self, file_path: str, sep: str, batch_size: int, column_types: dict = None,
+                        dtype: dict = None, parse_dates: list = None):
+        """
+        Extracts data from a TXT file as a stream of DataFrames of at most batch_size rows,
+        so the whole file is never held in memory.
+        """
+        try:
+            if self.arrow:
+                yield from read_arrow_csv_batches(file_path, batch_size, sep, column_types)
+                return
+            for df in pd.read_csv(file_path, sep=sep, chunksize=batch_size, dtype=dtype, parse_dates=parse_dates):
+                yield df
+        except Exception:
+            self.logger.log('error', f'Wrong file path {file_path}')
+            raise Exception(f"PipeLine Failed with {file_path}")
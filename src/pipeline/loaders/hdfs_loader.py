@@ -1,14 +1,67 @@
 import subprocess
 import os
+import shutil
+
+import pyarrow.fs as pafs
+
+from pipeline.loaders.parquet_loader import write_parquet_batches
+
+# URI of the HDFS cluster of the Hadoop configuration (fs.defaultFS of core-site.xml), like the hdfs CLI
+DEFAULT_URI = 'hdfs://default'
+
+
+def set_hadoop_classpath() -> None:
+    """
+    Set the CLASSPATH libhdfs needs to the jars of the Hadoop install (`hdfs classpath --glob`) when it is
+    not set, e.g. in cron jobs, which do not get the environment of the login shell.
+    """
+    if os.environ.get('CLASSPATH'):
+        return
+    hdfs = os.path.join(os.environ['HADOOP_HOME'], 'bin', 'hdfs') if os.environ.get('HADOOP_HOME') else 'hdfs'
+    result = subprocess.run([hdfs, 'classpath', '--glob'], check=True, stdout=subprocess.PIPE, text=True)
+    os.environ['CLASSPATH'] = result.stdout.strip()
+
+
+def connect_filesystem(uri):
+    """
+    Open a filesystem from a URI and keep it for all the uploads.
+
+    - hdfs://<namenode>:<port> connects to HDFS through libhdfs (pyarrow.fs.HadoopFileSystem).
+    - hdfs://default connects to the cluster of the Hadoop configuration (see DEFAULT_URI).
+    - file:///<directory> is a local stand-in rooted at the directory, used for tests.
+
+    :param uri: URI of the filesystem, optionally with a root path.
+    :return: A pyarrow FileSystem where '/stage/...' paths are resolved under the root path.
+    """
+    if uri.startswith('hdfs://'):
+        set_hadoop_classpath()
+    if uri.rstrip('/') == DEFAULT_URI:
+        return pafs.HadoopFileSystem('default')
+
+    filesystem, root = pafs.FileSystem.from_uri(uri)
+    if root not in ('', '/'):
+        filesystem.create_dir(root, recursive=True)
+        filesystem = pafs.SubTreeFileSystem(root, filesystem)
+    return filesystem
+
 
 class HDFSLoader:
-    def __init__(self, logger):
+    def __init__(self, logger, uri=None, filesystem=None):
         """
         Initializes the HDFSLoader with the logger and HDFS path.
+        Without uri nor filesystem, files are uploaded with the `hdfs dfs -put` CLI.
+        The loader is shared by the worker threads of the file monitor, which upload in parallel over one connection.
 
         :param logger: Logger instance to log messages.
+        :param uri: URI of the filesystem the files are streamed to (see connect_filesystem). The connection
+                    is opened on first use in each process and reused for every upload.
+        :param filesystem: pyarrow FileSystem to stream the files to, e.g. a local stand-in for tests.
         """
         self.logger = logger
+        self.uri = uri
+        self.filesystem = filesystem
+        self._filesystem_pid = os.getpid() if filesystem is not None else None
+        self.created_dirs = set()  # HDFS directories created by the CLI uploads
 
     def load(self, hdfspath, local_path, timeout = 5) -> None:
         """
@@ -16,15 +69,23 @@ class HDFSLoader:
 
         :param hdfspath: HDFS destination path.
         :param local_path: The local path where the Parquet file will be saved before uploading to HDFS.
+        :param timeout: Timeout (in seconds) of the `hdfs dfs -put` command.
         """
         try:
-            # Command to upload the file to HDFS
-            cmd = ["hdfs", "dfs", "-put", local_path, hdfspath]
+            if self.is_direct():
+                self.upload(hdfspath, local_path)
+            else:
+                if hdfspath not in self.created_dirs:
+                    # Create the partition directory, -put does not create missing parents.
+                    # Done once per directory: the next files of the partition only pay the -put
+                    cmd = ["hdfs", "dfs", "-mkdir", "-p", hdfspath]
+                    subprocess.run(cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=timeout)
+                    self.created_dirs.add(hdfspath)
 
-            subprocess.run(cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=timeout)
+                # Command to upload the file to HDFS
+                cmd = ["hdfs", "dfs", "-put", local_path, hdfspath]
 
-            # Run the HDFS upload command
-            # subprocess.run(cmd, check=True)
+                subprocess.run(cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=timeout)
 
             # Log success message
             self.logger.log('info', f"File successfully uploaded to HDFS at {hdfspath}")
@@ -32,13 +93,100 @@ class HDFSLoader:
         except Exception as e:
             # Log the error message
             self.logger.log('error', f"Failed to upload file to HDFS: {e}")
-            
+
             if os.path.exists(local_path):
                 os.remove(local_path)
                 self.logger.log('error', f"Local file {local_path} removed after failed upload.")
             raise Exception(f"Failed to upload file to HDFS: {e}")
-        
+
         finally:
             if os.path.exists(local_path):
                 os.remove(local_path)
                 self.logger.log('info', f"Local file {local_path} removed after upload.")
+
+    def is_direct(self) -> bool:
+        """
+        Check whether files can be written straight to the filesystem (a URI or filesystem is configured).
+        """
+        return bool(self.uri) or self.filesystem is not None
+
+    def load_batches(self, batches, hdfspath, file_name) -> int:
+        """
+        Serialize a stream of DataFrames as one Parquet file directly into the hdfspath directory,
+        without an intermediate local file. The file is written under a hidden temporary name
+        (ignored by Hive) and renamed once complete, so readers never see a partial file.
+
+        :param batches: Iterable of DataFrames sharing the same columns.
+        :param hdfspath: HDFS destination directory.
+        :param file_name: Name of the Parquet file (without extension).
+        :return: The number of rows written.
+        """
+        filesystem = self.get_filesystem()
+        directory = hdfspath.rstrip('/')
+        destination = f"{directory}/{file_name}.parquet"
+        tmp_path = f"{directory}/.{file_name}.parquet.tmp"
+
+        try:
+            filesystem.create_dir(directory, recursive=True)
+            with filesystem.open_output_stream(tmp_path) as stream:
+                rows = write_parquet_batches(batches, stream)
+            if rows == 0:
+                filesystem.delete_file(tmp_path)
+                return rows
+            filesystem.move(tmp_path, destination)
+
+            self.logger.log('info', f"Data successfully written to {destination}")
+            return rows
+
+        except Exception as e:
+            self.logger.log('error', f"Failed to write Parquet file to HDFS: {e}")
+            if filesystem.get_file_info(tmp_path).type != pafs.FileType.NotFound:
+                filesystem.delete_file(tmp_path)
+            raise Exception(f"Failed to write Parquet file {destination} to HDFS: {e}")
+
+    def remove(self, hdfspath, file_name, timeout = 5) -> None:
+        """
+        Remove the Parquet file of a failed run from the hdfspath directory, if it was loaded.
+        A failure to remove it is logged, not raised, so the error of the run is the one reported.
+
+        :param hdfspath: HDFS directory of the file.
+        :param file_name: Name of the Parquet file (without extension).
+        :param timeout: Timeout (in seconds) of the `hdfs dfs -rm` command.
+        """
+        path = f"{hdfspath.rstrip('/')}/{file_name}.parquet"
+        try:
+            if self.is_direct():
+                filesystem = self.get_filesystem()
+                if filesystem.get_file_info(path).type == pafs.FileType.NotFound:
+                    return
+                filesystem.delete_file(path)
+            else:
+                cmd = ["hdfs", "dfs", "-rm", "-f", path]
+                subprocess.run(cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=timeout)
+            self.logger.log('warning', f"Removed {path} of the failed run")
+        except Exception as e:
+            self.logger.log('error', f"Failed to remove {path} of the failed run: {e}")
+
+    def get_filesystem(self):
+        """
+        Return the filesystem, connecting to the URI on first use in the current process
+        (a libhdfs connection does not survive a fork into a worker process).
+        """
+        if self.uri and self._filesystem_pid != os.getpid():
+            self.filesystem = connect_filesystem(self.uri)
+            self._filesystem_pid = os.getpid()
+        return self.filesystem
+
+    def upload(self, hdfspath, local_path) -> None:
+        """
+        Stream the local file into the hdfspath directory of the filesystem, like `hdfs dfs -put`.
+
+        :param hdfspath: HDFS destination directory.
+        :param local_path: The local file to upload.
+        """
+        filesystem = self.get_filesystem()
+        destination = f"{hdfspath.rstrip('/')}/{os.path.basename(local_path)}"
+        filesystem.create_dir(hdfspath, recursive=True)
+
+        with open(local_path, 'rb') as source, filesystem.open_output_stream(destination) as target:
+            shutil.copyfileobj(source, target, 1024 * 1024)
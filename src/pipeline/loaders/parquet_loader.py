@@ -1,5 +1,7 @@
 import os
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 
 class ParquetLoader:
     def __init__(self, logger, output_dir):
@@ -32,3 +34,53 @@ class ParquetLoader:
             # Log the error message
             self.logger.log('error', f"Error writing to Parquet: {e}")
             raise Exception(f"Failed to write DataFrame to Parquet file {file_path}: {e}")
+
+    def load_batches(self, batches, file_name) -> int:
+        """
+        Writes a stream of DataFrames to a single Parquet file, one row group per batch,
+        so only one batch is held in memory at a time.
+
+        :param batches: Iterable of DataFrames sharing the same columns.
+        :param file_name: Name of the Parquet file (without extension).
+        :return: The number of rows written.
+        """
+        file_path = os.path.join(self.output_dir, f"{file_name}.parquet")
+
+        try:
+            rows = write_parquet_batches(batches, file_path)
+            if rows:
+                self.logger.log('info', f"Data successfully written to {file_path}")
+            return rows
+        except Exception as e:
+            # Do not leave a truncated file behind when a batch fails
+            if os.path.exists(file_path):
+                os.remove(file_path)
+            self.logger.log('error', f"Error writing to Parquet: {e}")
+            raise Exception(f"Failed to write DataFrame to Parquet file {file_path}: {e}")
+
+
+def write_parquet_batches(batches, where) -> int:
+    """
+    Write a stream of DataFrames as one Parquet file, one row group per batch.
+    Nothing is written when there is no batch.
+
+    :param batches: Iterable of DataFrames sharing the same columns.
+    :param where: Path or writable stream (e.g. a pyarrow output stream on HDFS).
+    :return: The number of rows written.
+    """
+    writer = None
+    rows = 0
+    try:
+        for df in batches:
+            if writer is None:
+                table = pa.Table.from_pandas(df, preserve_index=False)
+                writer = pq.ParquetWriter(where, table.schema)
+            else:
+                # Later batches must match the schema of the first one
+                table = pa.Table.from_pandas(df, schema=writer.schema, preserve_index=False)
+            writer.write_table(table)
+            rows += table.num_rows
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows
@@ -0,0 +1,189 @@
+import json
+import time
+import pyarrow as pa
+import pyarrow.fs as pafs
+import pyarrow.parquet as pq
+
+
+# Prefix of the hidden directory of a merge in progress (Hive skips names starting with '_'),
+# holding its merged file, its manifest and its source files once they are replaced
+STAGING_PREFIX = '_compacting-'
+MANIFEST_FILE = '_manifest.json'
+
+
+class PartitionCompactor:
+    def __init__(self, logger, filesystem, target_size=128 * 1024 * 1024):
+        """
+        Merges the small parquet files of the Hive partitions of a table into files of about target_size bytes.
+
+        :param logger: Logger instance to log messages.
+        :param filesystem: pyarrow FileSystem holding the tables (see connect_filesystem).
+        :param target_size: Size in bytes of the merged files, files already this big are left as is.
+        """
+        self.logger = logger
+        self.filesystem = filesystem
+        self.target_size = target_size
+
+    def compact_table(self, table_dir, before_date=None) -> int:
+        """
+        Compact every partition of a table, day by day.
+
+        :param table_dir: Directory of the table (e.g. /stage/transactions).
+        :param before_date: Only compact the days before this date ('YYYY-MM-DD'), so the partitions
+                            still being written are left alone.
+        :return: The number of files removed by the compaction.
+        """
+        removed = 0
+        for date_dir in self.list_dirs(table_dir, 'partition_date='):
+            partition_date = date_dir.rsplit('=', 1)[-1]
+            if before_date and partition_date >= before_date:
+                continue
+            for hour_dir in self.list_dirs(date_dir, 'partition_hour='):
+                removed += self.compact_partition(hour_dir)
+        return removed
+
+    def compact_partition(self, partition_dir) -> int:
+        """
+        Merge the small files of a partition, in name order, into files of about target_size bytes,
+        after finishing the merges a previous run left unfinished (see recover).
+
+        :param partition_dir: Directory of the partition.
+        :return: The number of files removed by the compaction.
+        """
+        if not self.recover(partition_dir):
+            return 0
+        files = [info for info in self.list_files(partition_dir) if info.size < self.target_size]
+
+        # Group the files into bins of about target_size bytes
+        bins, current, size = [], [], 0
+        for info in files:
+            current.append(info)
+            size += info.size
+            if size >= self.target_size:
+                bins.append(current)
+                current, size = [], 0
+        bins.append(current)
+
+        removed = 0
+        for sources in bins:
+            if len(sources) < 2:
+                continue
+            try:
+                self.merge(partition_dir, [info.path for info in sources])
+                removed += len(sources) - 1
+            except Exception as e:
+                self.logger.log('error', f"Failed to compact {len(sources)} files of {partition_dir}: {e}")
+        return removed
+
+    def merge(self, partition_dir, paths) -> str:
+        """
+        Merge parquet files into a single file of the partition and delete them.
+        The files are cast to the schema of the first one.
+
+        The swap can be finished after a crash: the merged file is written in a hidden staging directory
+        (_compacting-<ns>/) with a manifest of the sources, written last. Then the sources are moved into
+        the staging directory, the merged file is moved into the partition and the staging directory is
+        deleted. A staging directory left behind is rolled back without a manifest, forward with one,
+        so the partition never keeps both the merged file and some of its sources (until a merge
+        interrupted after moving sources is recovered, their rows are missing rather than counted twice).
+
+        :return: The path of the merged file.
+        """
+        tables = [pq.read_table(paths[0], filesystem=self.filesystem)]
+        schema = tables[0].schema
+        for path in paths[1:]:
+            table = pq.read_table(path, filesystem=self.filesystem)
+            if not table.schema.equals(schema, check_metadata=False):
+                table = table.cast(schema)
+            tables.append(table)
+        table = pa.concat_tables(tables)
+
+        ns = time.time_ns()
+        name = f"compacted-{ns}.parquet"
+        staging_dir = f"{partition_dir}/{STAGING_PREFIX}{ns}"
+        try:
+            self.filesystem.create_dir(staging_dir, recursive=True)
+            with self.filesystem.open_output_stream(f"{staging_dir}/{name}") as stream:
+                pq.write_table(table, stream)
+            manifest = {'merged': name, 'sources': [path.rsplit('/', 1)[-1] for path in paths]}
+            self.write_manifest(staging_dir, manifest)
+        except Exception:
+            # nothing was replaced yet
+            self.filesystem.delete_dir(staging_dir)
+            raise
+
+        destination = self.finish(partition_dir, staging_dir, manifest)
+        self.logger.log('info', f"Compacted {len(paths)} files ({table.num_rows} rows) into {destination}")
+        return destination
+
+    def write_manifest(self, staging_dir, manifest) -> None:
+        """
+        Write the manifest of a merge under a temporary name renamed once complete: once it exists,
+        the merged file is complete and the merge is finished instead of rolled back.
+        """
+        tmp_path = f"{staging_dir}/.{MANIFEST_FILE}.tmp"
+        with self.filesystem.open_output_stream(tmp_path) as stream:
+            stream.write(json.dumps(manifest).encode())
+        self.filesystem.move(tmp_path, f"{staging_dir}/{MANIFEST_FILE}")
+
+    def finish(self, partition_dir, staging_dir, manifest) -> str:
+        """
+        Replace the sources of a merge by its merged file, skipping the steps already done,
+        and delete the staging directory.
+
+        :return: The path of the merged file.
+        """
+        for source in manifest['sources']:
+            path = f"{partition_dir}/{source}"
+            if self.filesystem.get_file_info(path).type != pafs.FileType.NotFound:
+                self.filesystem.move(path, f"{staging_dir}/{source}")
+
+        destination = f"{partition_dir}/{manifest['merged']}"
+        staged = f"{staging_dir}/{manifest['merged']}"
+        if self.filesystem.get_file_info(staged).type != pafs.FileType.NotFound:
+            self.filesystem.move(staged, destination)
+        self.filesystem.delete_dir(staging_dir)
+        return destination
+
+    def recover(self, partition_dir) -> bool:
+        """
+        Finish or roll back the merges of the partition interrupted by a crash or a failure:
+        a staging directory with a manifest is finished, one without is deleted (its sources are untouched).
+
+        :return: Whether every interrupted merge was recovered, the partition is not compacted otherwise.
+        """
+        recovered = True
+        for staging_dir in self.list_dirs(partition_dir, STAGING_PREFIX):
+            manifest_path = f"{staging_dir}/{MANIFEST_FILE}"
+            try:
+                if self.filesystem.get_file_info(manifest_path).type == pafs.FileType.NotFound:
+                    self.filesystem.delete_dir(staging_dir)
+                    self.logger.log('warning', f"Rolled back the unfinished compaction {staging_dir}")
+                    continue
+                with self.filesystem.open_input_stream(manifest_path) as stream:
+                    manifest = json.loads(stream.read())
+                self.finish(partition_dir, staging_dir, manifest)
+                self.logger.log('warning', f"Finished the interrupted compaction {staging_dir}")
+            except Exception as e:
+                self.logger.log('error', f"Failed to recover the compaction {staging_dir}: {e}")
+                recovered = False
+        return recovered
+
+    def list_dirs(self, directory, prefix) -> list:
+        """
+        Return the sub-directories of a directory whose name starts with prefix, sorted by name.
+        """
+        infos = self.filesystem.get_file_info(pafs.FileSelector(directory, allow_not_found=True))
+        return sorted(info.path for info in infos
+                      if info.type == pafs.FileType.Directory and info.base_name.startswith(prefix))
+
+    def list_files(self, directory) -> list:
+        """
+        Return the FileInfo of the parquet files of a directory, sorted by name.
+        Hidden files (temporary files being written) are skipped like Hive does.
+        """
+        infos = self.filesystem.get_file_info(pafs.FileSelector(directory, allow_not_found=True))
+        return sorted((info for info in infos
+                       if info.type == pafs.FileType.File and info.base_name.endswith('.parquet')
+                       and not info.base_name.startswith(('.', '_'))),
+                      key=lambda info: info.path)
@@ -1,30 +1,225 @@
+import os
+import json
+import time
+import queue
+import atexit
 import logging
+import threading
+import contextvars
+import multiprocessing
+from contextlib import contextmanager
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+# Fields of the current file, table and stage, added to every record logged in the context
+LOG_CONTEXT = contextvars.ContextVar('log_context', default={})
+
+# Loggers per log file: path -> (logging.Logger, QueueListeners, process id, queue of the forked workers).
+# The process creating the Logger writes the files, its forked workers send their records to it
+LISTENERS = {}
+LISTENERS_LOCK = threading.Lock()
+
+
+def reset_listeners_lock() -> None:
+    """
+    Give a forked process its own listeners lock, the one inherited may be held by a thread of the parent.
+    """
+    global LISTENERS_LOCK
+    LISTENERS_LOCK = threading.Lock()
+
+
+os.register_at_fork(after_in_child=reset_listeners_lock)
+
+TEXT_FORMAT = '%(asctime)s [%(levelname)s] %(message)s'
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Seconds of the rotation intervals of the 'when' option
+ROTATION_INTERVALS = {'H': 3600, 'D': 86400, 'W': 7 * 86400}
+
+
+class SizeAndTimeRotatingFileHandler(RotatingFileHandler):
+    """
+    RotatingFileHandler that also rolls the file over at a fixed interval, whichever comes first.
+    Backups are numbered like RotatingFileHandler (<file>.1 is the most recent).
+    """
+
+    def __init__(self, filename, max_bytes=0, backup_count=0, when=None):
+        """
+        :param max_bytes: Size of the file that triggers a rollover, 0 disables it.
+        :param backup_count: Number of backups kept.
+        :param when: 'H', 'D' or 'W' for a rollover every hour, day (at midnight) or week, None disables it.
+        """
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8', delay=True)
+        self.interval = ROTATION_INTERVALS[when.upper()] if when else None
+        self.rollover_at = self.compute_rollover(time.time()) if self.interval else None
+
+    def compute_rollover(self, now) -> float:
+        """
+        Start of the next interval, in local time.
+        """
+        offset = -time.timezone if not time.localtime(now).tm_isdst else -time.altzone
+        return ((now + offset) // self.interval + 1) * self.interval - offset
+
+    def shouldRollover(self, record) -> bool:
+        if self.rollover_at and time.time() >= self.rollover_at:
+            return True
+        return bool(super().shouldRollover(record))
+
+    def doRollover(self) -> None:
+        super().doRollover()
+        if self.interval:
+            self.rollover_at = self.compute_rollover(time.time())
+
+
+class JSONFormatter(logging.Formatter):
+    """
+    Formats a record as one JSON object per line with its file, table and stage fields.
+    """
+
+    def format(self, record) -> str:
+        entry = {
+            'time': self.formatTime(record, DATE_FORMAT),
+            'level': record.levelname,
+            'message': record.getMessage(),
+            'process': record.process,
+            'thread': record.threadName
+        }
+        entry.update(getattr(record, 'context', {}))
+        return json.dumps(entry, default=str)
+
+
+class ContextQueueHandler(QueueHandler):
+    """
+    QueueHandler that leaves the formatting to the listener thread: the record is queued with its
+    unformatted message and arguments and the log context of the calling thread.
+    """
+
+    def prepare(self, record):
+        record.context = LOG_CONTEXT.get()
+        return record
+
+
+class ProcessQueueHandler(QueueHandler):
+    """
+    QueueHandler of a forked worker: the records are formatted and sent with the log context of the
+    calling thread to the listener of the process writing the log files, over a multiprocessing queue,
+    so they always go to the current file, however often it rotates.
+    """
+
+    def prepare(self, record):
+        record = super().prepare(record)  # formats the message so the record pickles
+        record.context = LOG_CONTEXT.get()
+        return record
+
 
 class Logger:
-    def __init__(self, log_file: str) -> None:
+    def __init__(self, log_file: str, json_file: str = None, max_bytes: int = 0,
+                 backup_count: int = 10, when: str = None, level: str = 'DEBUG') -> None:
         """
-        Initializes the logger.
+        Initializes the logger. Records are put on a queue and written to the files by a background
+        listener thread, so logging never waits for the disk. The forked workers (process executor of
+        the file monitor, transform pool) send their records to the same listener.
 
         :param log_file: Path to the log file where logs will be saved.
+        :param json_file: Path to a file receiving every record as a JSON line with its file, table and stage.
+        :param max_bytes: Size of a log file that triggers a rotation, 0 disables it. Only one process
+                          (the ETL service) should rotate a file the other scripts also write to.
+        :param backup_count: Number of rotated files kept.
+        :param when: 'H', 'D' or 'W' to also rotate every hour, day or week.
+        :param level: Lowest level logged.
         """
         self.log_file = log_file
+        self.json_file = json_file
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.when = when
+        self.level = getattr(logging, level.upper())
+        self.logger = self.get_logger()
+
+    def get_logger(self) -> logging.Logger:
+        """
+        Return the logging.Logger of the log file, starting its listener threads in the current process once:
+        one for the records of the process and one for the records of its forked workers.
+        A forked worker sends its records to the listener of its parent instead of writing to the files,
+        which the parent may rotate at any time.
+        """
+        with LISTENERS_LOCK:
+            entry = LISTENERS.get(self.log_file)
+            if entry and entry[2] == os.getpid():
+                return entry[0]
+
+            logger = logging.getLogger(f'etl.{os.path.abspath(self.log_file)}')
+            logger.setLevel(self.level)
+            logger.propagate = False
+            for handler in list(logger.handlers):
+                logger.removeHandler(handler)
+
+            if entry is not None:
+                # forked worker, the handlers and the queue of the parent are inherited
+                process_records = entry[3]
+                logger.addHandler(ProcessQueueHandler(process_records))
+                LISTENERS[self.log_file] = (logger, [], os.getpid(), process_records)
+                return logger
 
-        # Set up logging configuration
-        logging.basicConfig(filename=self.log_file, 
-                            level=logging.DEBUG, 
-                            format='%(asctime)s [%(levelname)s] %(message)s',
-                            datefmt='%Y-%m-%d %H:%M:%S')
+            handlers = [self.make_handler(self.log_file, logging.Formatter(TEXT_FORMAT, DATE_FORMAT))]
+            if self.json_file:
+                handlers.append(self.make_handler(self.json_file, JSONFormatter()))
 
-    def log(self, level: str, msg: str) -> None:
+            records = queue.SimpleQueue()
+            process_records = multiprocessing.Queue()
+            listeners = [QueueListener(records, *handlers, respect_handler_level=False),
+                         QueueListener(process_records, *handlers, respect_handler_level=False)]
+            for listener in listeners:
+                listener.start()
+            atexit.register(stop_listeners)
+            logger.addHandler(ContextQueueHandler(records))
+
+            LISTENERS[self.log_file] = (logger, listeners, os.getpid(), process_records)
+            return logger
+
+    def make_handler(self, path, formatter) -> logging.Handler:
+        """
+        Create the rotating file handler of a log file.
+        """
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        handler = SizeAndTimeRotatingFileHandler(path, self.max_bytes, self.backup_count, self.when)
+        handler.setFormatter(formatter)
+        return handler
+
+    def log(self, level: str, msg: str, *args) -> None:
         """
         Log a message with the given level.
 
         :param level: The level of the log ('info', 'error', 'warning')
-        :param msg: The message to log.
-        """
-        if level.lower() == 'error':
-            logging.error(msg)
-        elif level.lower() == 'info':
-            logging.info(msg)
-        elif level.lower() == 'warning':
-            logging.warning(msg)
+        :param msg: The message to log, a %-format string when args are given.
+        :param args: Arguments of the message, formatted by the listener thread.
+        """
+        if LISTENERS.get(self.log_file, (None, None, None, None))[2] != os.getpid():
+            self.logger = self.get_logger()
+        self.logger.log(getattr(logging, level.upper()), msg, *args)
+
+    @contextmanager
+    def context(self, **fields):
+        """
+        Add fields (e.g. file, table, stage) to the JSON records logged by the current thread in the block.
+        """
+        token = LOG_CONTEXT.set({**LOG_CONTEXT.get(), **fields})
+        try:
+            yield
+        finally:
+            LOG_CONTEXT.reset(token)
+
+
+def stop_listeners() -> None:
+    """
+    Write the queued records and stop the listener threads of the current process.
+    The records logged afterwards (e.g. by other exit handlers) are written synchronously.
+    """
+    with LISTENERS_LOCK:
+        for logger, listeners, pid, _ in LISTENERS.values():
+            if pid == os.getpid() and listeners and listeners[0]._thread is not None:
+                for listener in listeners:
+                    listener.stop()
+                for handler in list(logger.handlers):
+                    logger.removeHandler(handler)
+                for handler in listeners[0].handlers:
+                    logger.addHandler(handler)
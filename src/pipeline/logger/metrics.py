@@ -0,0 +1,407 @@
+import os
+import glob
+import json
+import time
+import resource
+import threading
+from contextlib import contextmanager
+
+# Prometheus metrics of the textfile: (name, stage attribute, help)
+STAGE_METRICS = [
+    ('nexabank_etl_stage_seconds_total', 'wall_seconds', 'Wall time spent in the stage.'),
+    ('nexabank_etl_stage_cpu_seconds_total', 'cpu_seconds', 'CPU time spent in the stage by the pipeline thread.'),
+    ('nexabank_etl_stage_worker_cpu_seconds_total', 'worker_cpu_seconds',
+     'CPU time spent in the stage by the worker processes (transform pool).'),
+    ('nexabank_etl_stage_rows_in_total', 'rows_in', 'Rows entering the stage.'),
+    ('nexabank_etl_stage_rows_out_total', 'rows_out', 'Rows leaving the stage.'),
+    ('nexabank_etl_stage_bytes_read_total', 'bytes_read', 'Bytes read by the stage.'),
+    ('nexabank_etl_stage_bytes_written_total', 'bytes_written', 'Bytes written by the stage.')
+]
+
+
+# Bytes of a memory page, the unit of /proc/self/statm
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+def get_peak_rss() -> int:
+    """
+    Return the peak resident set size of the process in bytes, the highest since the process started.
+    """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def get_rss() -> int:
+    """
+    Return the current resident set size of the process in bytes (0 where /proc is not available).
+    """
+    try:
+        with open('/proc/self/statm', 'rb') as file:
+            return int(file.read().split()[1]) * PAGE_SIZE
+    except OSError:
+        return 0
+
+
+def get_hwm() -> int:
+    """
+    Return the high water mark of the resident set size of the process in bytes (VmHWM),
+    the highest since the process started or since it was last reset with reset_hwm (0 where /proc is not available).
+    """
+    try:
+        with open('/proc/self/status', 'rb') as file:
+            for line in file:
+                if line.startswith(b'VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+def reset_hwm() -> bool:
+    """
+    Reset the high water mark of the resident set size to the current resident set size.
+
+    :return: False where the kernel does not allow it (no /proc/self/clear_refs).
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as file:
+            file.write('5')
+        return True
+    except OSError:
+        return False
+
+
+class PeakTracker:
+    def __init__(self):
+        """
+        Measures the peak resident set size of the process during blocks of code, which may nest or run
+        in several threads at once. The high water mark of the kernel catches the spikes between two reads:
+        it is reset when a block starts, after being added to the peaks of the blocks still running.
+        Where it cannot be reset, the peak is the highest resident set size read when a block starts or ends.
+        """
+        self.lock = threading.Lock()
+        self.watches = []       # running peaks ([bytes]) of the blocks being measured
+        self.resettable = None  # the high water mark can be reset, None until first tried
+
+    def start(self) -> list:
+        """
+        Start measuring a block.
+
+        :return: The watch of the block, to pass to stop().
+        """
+        with self.lock:
+            self.update()
+            watch = [get_rss()]
+            self.watches.append(watch)
+            if self.resettable is not False:
+                self.resettable = reset_hwm()
+            return watch
+
+    def stop(self, watch) -> int:
+        """
+        Stop measuring a block.
+
+        :param watch: The watch returned by start().
+        :return: The peak resident set size of the process in bytes during the block.
+        """
+        with self.lock:
+            self.update()
+            self.watches = [other for other in self.watches if other is not watch]
+            return watch[0]
+
+    def update(self) -> None:
+        """
+        Add the resident set size, and the high water mark when it is reset by the tracker, to the running peaks.
+        """
+        peak = max(get_rss(), get_hwm() if self.resettable else 0)
+        for watch in self.watches:
+            watch[0] = max(watch[0], peak)
+
+    def reset_after_fork(self) -> None:
+        """
+        A forked process measures none of the blocks of its parent, and may inherit the lock held.
+        """
+        self.lock = threading.Lock()
+        self.watches = []
+
+
+# Peak resident set size of the stages of the process
+PEAK_TRACKER = PeakTracker()
+
+os.register_at_fork(after_in_child=PEAK_TRACKER.reset_after_fork)
+
+
+class StageMetrics:
+    def __init__(self, name):
+        """
+        Measures of one stage of the pipeline for one file.
+        The memory measures are of the whole process, so with thread workers they include the other workers.
+
+        :param name: Name of the stage (extract, validate, state_filter, transform, parquet_write, hdfs_upload, state_flush).
+        """
+        self.name = name
+        self.wall_seconds = 0.0
+        self.cpu_seconds = 0.0          # CPU time of the thread running the stage
+        self.worker_cpu_seconds = 0.0   # CPU time of the processes the stage hands work to (transform pool)
+        self.rows_in = None
+        self.rows_out = None
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.peak_rss = 0   # highest resident set size of the process during the stage
+        self.inclusive = False  # streamed stages also measure the time spent in the stages before them
+
+    def add_rows_out(self, rows) -> None:
+        """
+        Count rows leaving the stage.
+        """
+        self.rows_out = (self.rows_out or 0) + rows
+
+    def to_dict(self) -> dict:
+        """
+        Return the measures as a JSON-serializable dict.
+        """
+        return {
+            'stage': self.name,
+            'wall_seconds': round(self.wall_seconds, 6),
+            'cpu_seconds': round(self.cpu_seconds, 6),
+            'worker_cpu_seconds': round(self.worker_cpu_seconds, 6),
+            'rows_in': self.rows_in,
+            'rows_out': self.rows_out,
+            'bytes_read': self.bytes_read,
+            'bytes_written': self.bytes_written,
+            'peak_rss_bytes': self.peak_rss
+        }
+
+
+class FileMetrics:
+    def __init__(self, metrics, table, files):
+        """
+        Measures of the stages of one pipeline run (one file, or a coalesced batch of files).
+        Created by Metrics.start.
+        """
+        self.metrics = metrics
+        self.table = table
+        self.files = files
+        self.stages = {}  # stage name -> StageMetrics, in execution order
+        self.started = time.perf_counter()
+
+    def get_stage(self, name) -> StageMetrics:
+        """
+        Return the measures of a stage, created on first use.
+        """
+        if name not in self.stages:
+            self.stages[name] = StageMetrics(name)
+        return self.stages[name]
+
+    @contextmanager
+    def stage(self, name, inclusive=False):
+        """
+        Measure the wall and CPU time and the peak memory of the block as part of the stage,
+        the block sets the rows and bytes.
+        A stage entered several times (e.g. once per coalesced file) adds up.
+        The records logged in the block carry the stage.
+
+        :param inclusive: The block consumes streamed stages, whose time is subtracted at the end.
+        """
+        stage = self.get_stage(name)
+        stage.inclusive = stage.inclusive or inclusive
+        wall, cpu, watch = time.perf_counter(), time.thread_time(), PEAK_TRACKER.start()
+        try:
+            with self.metrics.logger.context(stage=name):
+                yield stage
+        finally:
+            stage.wall_seconds += time.perf_counter() - wall
+            stage.cpu_seconds += time.thread_time() - cpu
+            stage.peak_rss = max(stage.peak_rss, PEAK_TRACKER.stop(watch))
+
+    def track(self, name, batches):
+        """
+        Measure a streamed stage: the time spent producing every batch and the rows yielded.
+        The time of the stages before it is included and subtracted at the end.
+        """
+        # registered now so the stages keep the order of the chain, not of the first batch
+        stage = self.get_stage(name)
+        stage.inclusive = True
+        return self.measure(stage, iter(batches))
+
+    def measure(self, stage, iterator):
+        """
+        Yield the batches of iterator, adding the time spent producing each to stage and
+        keeping the peak memory while producing them.
+        """
+        while True:
+            wall, cpu, watch = time.perf_counter(), time.thread_time(), PEAK_TRACKER.start()
+            try:
+                df = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                stage.wall_seconds += time.perf_counter() - wall
+                stage.cpu_seconds += time.thread_time() - cpu
+                stage.peak_rss = max(stage.peak_rss, PEAK_TRACKER.stop(watch))
+            stage.add_rows_out(df.shape[0])
+            yield df
+
+    def finish(self, status) -> dict:
+        """
+        Compute the exclusive time of the streamed stages and the missing input rows,
+        then log and record the measures.
+        The peak memory of a streamed stage stays inclusive, it is the peak of the process while it ran.
+
+        :param status: 'success' or 'failed'.
+        :return: The JSON record of the run.
+        """
+        upstream_wall = upstream_cpu = 0.0
+        rows = None
+        for stage in self.stages.values():
+            if stage.inclusive:
+                wall, cpu = stage.wall_seconds, stage.cpu_seconds
+                stage.wall_seconds = max(0.0, wall - upstream_wall)
+                stage.cpu_seconds = max(0.0, cpu - upstream_cpu)
+                upstream_wall, upstream_cpu = wall, cpu
+            if stage.rows_in is None:
+                stage.rows_in = rows
+            if stage.rows_out is not None:
+                rows = stage.rows_out
+
+        record = {
+            'event': 'pipeline_metrics',
+            'table': self.table,
+            'files': [os.path.basename(file) for file in self.files],
+            'status': status,
+            'wall_seconds': round(time.perf_counter() - self.started, 6),
+            'rss_bytes': get_rss(),
+            'stages': [stage.to_dict() for stage in self.stages.values()]
+        }
+        self.metrics.record(self, record)
+        return record
+
+
+class Metrics:
+    def __init__(self, logger, textfile=None):
+        """
+        Collects the per-stage measures of the pipeline runs, logs one JSON record per run and keeps
+        running totals exported in the Prometheus text format (for the node_exporter textfile collector).
+
+        :param logger: Logger instance to log messages.
+        :param textfile: Path of the Prometheus textfile, rewritten after every run (None disables it).
+                         A worker process writes its own <name>_worker<index>.prom file next to it, so a
+                         restarted worker keeps its series.
+        """
+        self.logger = logger
+        self.textfile = textfile
+        self.lock = threading.Lock()
+        self.totals = {}  # (table, stage) -> {attribute: total}
+        self.files = {}   # (table, status) -> number of files
+        self.peaks = {}   # (table, stage) -> peak resident set size during the stage in the last run
+        self.pid = os.getpid()
+        self.worker = None  # index of the worker process, None in the main process
+
+    def set_worker(self, index) -> None:
+        """
+        Export the measures of the current (forked worker) process under its worker index.
+        """
+        with self.lock:
+            self.totals, self.files, self.peaks, self.pid = {}, {}, {}, os.getpid()
+            self.worker = index
+
+    def start(self, table, files) -> FileMetrics:
+        """
+        Start measuring a pipeline run of files of a table.
+        """
+        return FileMetrics(self, table, files)
+
+    def record(self, file_metrics, record) -> None:
+        """
+        Log the JSON record of a run and add it to the running totals.
+        """
+        self.logger.log('info', f"Metrics: {json.dumps(record)}")
+
+        with self.lock:
+            if self.pid != os.getpid():
+                # Forked worker: the totals inherited from the parent are not ours
+                self.totals, self.files, self.peaks, self.pid = {}, {}, {}, os.getpid()
+
+            key = (record['table'], record['status'])
+            self.files[key] = self.files.get(key, 0) + len(record['files'])
+            for stage in file_metrics.stages.values():
+                totals = self.totals.setdefault((record['table'], stage.name), {})
+                for _, attribute, _ in STAGE_METRICS:
+                    totals[attribute] = totals.get(attribute, 0) + (getattr(stage, attribute) or 0)
+                self.peaks[(record['table'], stage.name)] = stage.peak_rss
+
+            if self.textfile:
+                try:
+                    self.write_textfile()
+                except OSError as e:
+                    self.logger.log('warning', f"Failed to write metrics to {self.textfile}: {e}")
+
+    def write_textfile(self) -> None:
+        """
+        Write the running totals to the Prometheus textfile, under a temporary name renamed once complete.
+        """
+        lines = []
+        for name, attribute, description in STAGE_METRICS:
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} counter")
+            for (table, stage), totals in sorted(self.totals.items()):
+                lines.append(f'{name}{{table="{table}",stage="{stage}",worker="{self.get_worker_label()}"}} {totals.get(attribute, 0)}')
+
+        lines.append("# HELP nexabank_etl_stage_peak_rss_bytes Peak resident set size of the process "
+                     "during the stage in the last run.")
+        lines.append("# TYPE nexabank_etl_stage_peak_rss_bytes gauge")
+        for (table, stage), peak in sorted(self.peaks.items()):
+            lines.append(f'nexabank_etl_stage_peak_rss_bytes{{table="{table}",stage="{stage}",worker="{self.get_worker_label()}"}} {peak}')
+
+        lines.append("# HELP nexabank_etl_files_total Files processed by the pipeline.")
+        lines.append("# TYPE nexabank_etl_files_total counter")
+        for (table, status), count in sorted(self.files.items()):
+            lines.append(f'nexabank_etl_files_total{{table="{table}",status="{status}",worker="{self.get_worker_label()}"}} {count}')
+
+        lines.append("# HELP nexabank_etl_rss_bytes Resident set size of the process after the last run.")
+        lines.append("# TYPE nexabank_etl_rss_bytes gauge")
+        lines.append(f'nexabank_etl_rss_bytes{{worker="{self.get_worker_label()}"}} {get_rss()}')
+
+        lines.append("# HELP nexabank_etl_peak_rss_bytes Peak resident set size of the process since it started.")
+        lines.append("# TYPE nexabank_etl_peak_rss_bytes gauge")
+        lines.append(f'nexabank_etl_peak_rss_bytes{{worker="{self.get_worker_label()}"}} {get_peak_rss()}')
+
+        path = self.get_textfile_path()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as file:
+            file.write('\n'.join(lines) + '\n')
+        os.replace(tmp_path, path)
+
+    def get_textfile_path(self) -> str:
+        """
+        Return the textfile of the current process.
+        """
+        if self.worker is None:
+            return self.textfile
+        root, extension = os.path.splitext(self.textfile)
+        return f"{root}_worker{self.worker}{extension}"
+
+    def get_worker_label(self) -> str:
+        """
+        Return the worker label of the series of the current process: its worker index, or 'main'.
+        """
+        return 'main' if self.worker is None else str(self.worker)
+
+    def remove_textfile(self) -> None:
+        """
+        Remove the textfile of the current worker process, so its series stop being exported once it exited.
+        """
+        if self.textfile and self.worker is not None:
+            try:
+                os.remove(self.get_textfile_path())
+            except FileNotFoundError:
+                pass
+
+    def remove_worker_textfiles(self) -> None:
+        """
+        Remove the textfiles left by the worker processes of a previous run (e.g. killed, or more workers).
+        """
+        if self.textfile:
+            root, extension = os.path.splitext(self.textfile)
+            for path in glob.glob(f"{glob.escape(root)}_worker*{extension}"):
+                os.remove(path)
@@ -1,29 +1,232 @@
+import os
+import time
+import queue
+import atexit
 import smtplib
+import threading
+import multiprocessing
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from datetime import datetime
 
 
+def pluralize(count, noun) -> str:
+    """
+    Format a count with its noun, in the plural unless the count is 1 (e.g. '1 failure', '3 failures').
+    """
+    return f"{count} {noun}" if count == 1 else f"{count} {noun}s"
+
+
 class EmailNotifier:
-    def __init__(self, smtp_server, smtp_port, sender_email, sender_password):
-        self.smtp_server = smtp_server  
-        self.smtp_port = smtp_port    
-        self.sender_email = sender_email  
-        self.sender_password = sender_password 
+    def __init__(self, smtp_server, smtp_port, sender_email, sender_password, logger=None, digest_window=60,
+                 use_tls=True, idle_timeout=120, max_backoff=300, max_attempts=8):
+        """
+        Sends the failure alerts of the pipeline. Failures are queued by report() and sent by a single
+        background thread, which gathers the failures of digest_window seconds into one digest email
+        and reuses one SMTP session (connection, STARTTLS and login) for every email.
+        Forked workers send their failures over a multiprocessing queue to the sender of the process
+        that created the notifier, so there is one digest per window whatever the number of workers.
+
+        :param smtp_server: Host of the SMTP server.
+        :param smtp_port: Port of the SMTP server.
+        :param sender_email: Sender address, also the login of the SMTP account.
+        :param sender_password: Password of the SMTP account, no login without it.
+        :param logger: Logger instance to log messages.
+        :param digest_window: Seconds the failures are gathered after the first one before the digest is sent.
+        :param use_tls: Require STARTTLS before logging in (disable for a local SMTP stand-in).
+        :param idle_timeout: Seconds without email after which the SMTP session is closed.
+        :param max_backoff: Longest wait in seconds between two delivery attempts of a digest.
+        :param max_attempts: Delivery attempts of a digest before it is dropped.
+        """
+        self.smtp_server = smtp_server
+        self.smtp_port = smtp_port
+        self.sender_email = sender_email
+        self.sender_password = sender_password
+        self.logger = logger
+        self.digest_window = digest_window
+        self.use_tls = use_tls
+        self.idle_timeout = idle_timeout
+        self.max_backoff = max_backoff
+        self.max_attempts = max_attempts
+
+        self.session = None        # SMTP session kept open between emails
+        self.queue = None          # failures waiting for the sender thread
+        self.sender = None         # background sender thread
+        self.relay = None          # thread moving the failures of the forked workers to the sender
+        self.process_failures = multiprocessing.SimpleQueue()  # failures of the forked workers, written unbuffered
+        self._owner_pid = os.getpid()  # process running the sender thread (workers may be forked)
+        self._lock = threading.Lock()
 
     def notify(self, recipient_email) -> None:
         """
         Send an email notification to the recipient when the ETL process fails.
 
         :param recipient_email: The recipient's email address
-        :param file_name: The name of the file that caused the ETL failure
         """
         date_now = str(datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
         subject="ALERT: ETL Process Failed"
-        
+
         body=f"An error occurred during the ETL process at {date_now}, \n Please check the logs for more details."
-        
 
+        self.send(recipient_email, subject, body)
+
+    def report(self, recipient_email, file, error) -> None:
+        """
+        Queue a failure for the next digest sent to the recipient. Never blocks nor raises.
+
+        :param recipient_email: The recipient's email address.
+        :param file: The file that failed.
+        :param error: The error (exception or message) of the failure.
+        """
+        if not recipient_email:
+            return
+        failure = (recipient_email, os.path.basename(file), str(error).strip(), datetime.now())
+        if os.getpid() != self._owner_pid:
+            # A forked worker exits without running atexit, its failures are sent by the owner process
+            # (written to the pipe before returning, nothing is left to flush when the worker exits)
+            self.process_failures.put(failure)
+            return
+        self.start()
+        self.queue.put(failure)
+
+    def start(self) -> None:
+        """
+        Start the sender thread, and the relay of the failures of the forked workers, once.
+        Must be called before forking workers, so their failures are sent even if the owner process has none.
+        """
+        with self._lock:
+            if os.getpid() != self._owner_pid or self.sender is not None:
+                return
+            self.queue = queue.Queue()
+            self.sender = threading.Thread(target=self.run_sender, args=(self.queue,), daemon=True)
+            self.sender.start()
+            self.relay = threading.Thread(target=self.run_relay, daemon=True)
+            self.relay.start()
+            atexit.register(self.close)
+
+    def close(self, timeout=10) -> None:
+        """
+        Send the failures still waiting without waiting for the end of the window and stop the sender thread.
+        """
+        if os.getpid() != self._owner_pid or self.sender is None or not self.sender.is_alive():
+            return
+        self.process_failures.put(None)
+        self.relay.join(timeout)
+        self.queue.put(None)
+        self.sender.join(timeout)
+
+    def run_relay(self) -> None:
+        """
+        Relay thread: move the failures of the forked workers to the queue of the sender thread until close().
+        """
+        while True:
+            failure = self.process_failures.get()
+            if failure is None:
+                break
+            self.queue.put(failure)
+
+    def run_sender(self, failures) -> None:
+        """
+        Sender thread: wait for a failure, gather the failures of the window into one digest per recipient
+        and send them, retrying with exponential backoff when the delivery fails.
+        """
+        stopping = False
+        while not stopping:
+            try:
+                failure = failures.get(timeout=self.idle_timeout)
+            except queue.Empty:
+                self.close_session()
+                continue
+            if failure is None:
+                break
+
+            digests = {}  # recipient -> {(file, error): [count, first time, last time]}
+            stopping = self.collect(failures, digests, failure, time.monotonic() + self.digest_window)
+
+            while digests:
+                recipient = next(iter(digests))
+                digest = digests[recipient]
+                attempt = 0
+                while True:
+                    try:
+                        self.send(recipient, *self.format_digest(digest))
+                        break
+                    except Exception as e:
+                        self.close_session()
+                        attempt += 1
+                        if attempt >= self.max_attempts or stopping:
+                            self.log('error', f"Dropped the failure digest of {pluralize(len(digest), 'failure')} "
+                                              f"after {attempt} attempts: {e}")
+                            break
+                        backoff = min(self.max_backoff, 2 ** attempt)
+                        self.log('warning', f"Failed to send the failure digest (attempt {attempt}), "
+                                            f"retrying in {backoff}s: {e}")
+                        # the failures arriving meanwhile join the digest being retried
+                        collected = {}
+                        stopping = self.collect(failures, collected, None, time.monotonic() + backoff) or stopping
+                        for other, failures_of in collected.items():
+                            self.merge(digests.setdefault(other, {}), failures_of)
+                del digests[recipient]
+        self.close_session()
+
+    def collect(self, failures, digests, failure, deadline) -> bool:
+        """
+        Add failures to the digests until the deadline, deduplicating identical failures of a file.
+
+        :param failure: First failure to add, None if there is none.
+        :return: True if close() was called meanwhile.
+        """
+        while True:
+            if failure is not None:
+                recipient, file, error, at = failure
+                entry = digests.setdefault(recipient, {}).setdefault((file, error), [0, at, at])
+                entry[0] += 1
+                entry[2] = at
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            try:
+                failure = failures.get(timeout=remaining)
+            except queue.Empty:
+                return False
+            if failure is None:
+                return True
+
+    @staticmethod
+    def merge(digest, other) -> None:
+        """
+        Merge the failures of other into digest.
+        """
+        for key, (count, first, last) in other.items():
+            entry = digest.setdefault(key, [0, first, last])
+            entry[0] += count
+            entry[1], entry[2] = min(entry[1], first), max(entry[2], last)
+
+    @staticmethod
+    def format_digest(digest) -> tuple:
+        """
+        Build the subject and body of a digest, listing every failed file with its error.
+
+        :return: (subject, body)
+        """
+        files = {file for file, _ in digest}
+        count = sum(entry[0] for entry in digest.values())
+        first = min(entry[1] for entry in digest.values()).strftime('%Y-%m-%d %H:%M:%S')
+        last = max(entry[2] for entry in digest.values()).strftime('%Y-%m-%d %H:%M:%S')
+
+        subject = f"ALERT: ETL Process Failed ({pluralize(len(files), 'file')})"
+        lines = [f"{pluralize(count, 'failure')} of the ETL process between {first} and {last}:", ""]
+        for (file, error), (times, _, at) in sorted(digest.items(), key=lambda item: item[1][1]):
+            repeated = f" (x{times})" if times > 1 else ""
+            lines.append(f"- {file}{repeated} at {at.strftime('%H:%M:%S')}:")
+            lines.extend(f"    {line}" for line in error.splitlines()[:20])
+        lines += ["", "Please check the logs for more details."]
+        return subject, "\n".join(lines)
+
+    def send(self, recipient_email, subject, body) -> None:
+        """
+        Send an email over the pooled SMTP session, reconnecting once if the session was dropped by the server.
+        """
         # Create the email message
         msg = MIMEMultipart()
         msg['From'] = self.sender_email
@@ -33,12 +236,50 @@ class EmailNotifier:
         # Attach the body with the msg instance
         msg.attach(MIMEText(body, 'plain'))
 
+        try:
+            self.get_session().sendmail(self.sender_email, recipient_email, msg.as_string())
+        except smtplib.SMTPServerDisconnected:
+            self.close_session()
+            self.get_session().sendmail(self.sender_email, recipient_email, msg.as_string())
+
+    def get_session(self) -> smtplib.SMTP:
+        """
+        Return the open SMTP session, connecting, upgrading to TLS and logging in on first use.
+        """
+        if self.session is None:
+            server = smtplib.SMTP(self.smtp_server, self.smtp_port, timeout=30)
+            try:
+                server.ehlo()
+                if self.use_tls:
+                    # Use TLS for security
+                    server.starttls()
+                    server.ehlo()
+                if self.sender_password:
+                    # Log in to the email account
+                    server.login(self.sender_email, self.sender_password)
+            except Exception:
+                server.close()
+                raise
+            self.session = server
+        return self.session
+
+    def close_session(self) -> None:
+        """
+        Close the SMTP session, if any.
+        """
+        if self.session is not None:
+            try:
+                self.session.quit()
+            except Exception:
+                self.session.close()
+            self.session = None
+
+    def log(self, level, msg) -> None:
+        """
+        Log a message with the logger of the notifier, if any.
 
-        with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
-            server.ehlo()
-            # Use TLS for security
-            server.starttls()
-            # Log in to the email account
-            server.login(self.sender_email, self.sender_password)
-            # Send the email
-            server.sendmail(self.sender_email, recipient_email, msg.as_string())
+        :param level: Level name of the message ('info', 'warning', 'error', ...).
+        :param msg: The message to log.
+        """
+        if self.logger:
+            self.logger.log(level, msg)
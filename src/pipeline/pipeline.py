@@ -1,6 +1,7 @@
 import os
 import shutil
-import threading
+import itertools
+import pandas as pd
 
 from dotenv import load_dotenv
 
@@ -13,41 +14,81 @@ from pipeline.transformers.credit_transformers import CreditTransformers
 from pipeline.transformers.support_transformers import SupportTransformers
 from pipeline.transformers.customer_transformers import CustomerTransformers
 from pipeline.transformers.money_transfers_transformers import MoneyTransformers
+from pipeline.transformers.transform_plan import TransformPlan
+from pipeline.transformers.parallel_transformer import ParallelTransformer
 
 from pipeline.loaders.hdfs_loader import HDFSLoader 
 from pipeline.loaders.parquet_loader import ParquetLoader 
 
 from pipeline.logger.logger import Logger 
+from pipeline.logger.metrics import Metrics
 from pipeline.state_store.state import StateStore
 from pipeline.notifier.email_notifier import EmailNotifier 
 from pipeline.validators.schema_validator import SchemaValidator
+from pipeline.validators.quality_checker import QualityChecker
+
+# Columns added by the transformers that become the Hive partition directories of the output
+PARTITION_COLUMNS = ['partition_date', 'partition_hour']
+
+# Line closing the logs of a file in etl.log
+SEPARATOR = '=' * 250
 
 class Pipeline:
-    def __init__(self, logger: Logger):
+    def __init__(self, logger: Logger, batch_size: int = None, arrow: bool = False, transform_workers: int = None,
+                 transform_min_rows: int = 100000, state_store: StateStore = None, notifier: EmailNotifier = None,
+                 parquet_loader: ParquetLoader = None, hdfs_loader: HDFSLoader = None, metrics: Metrics = None,
+                 quarantine_dir: str = './data/quarantine'):
+        """
+        The state store, notifier, loaders and metrics default to the production ones (the state in
+        /home/hadoop/state, the SMTP, HDFS and metrics settings of the environment); tools running the
+        pipeline outside the ETL (e.g. the benchmarks) pass their own so the production state is never opened.
+
+        :param logger: Logger instance to log messages.
+        :param batch_size: When set, files are streamed through the pipeline in batches of at most batch_size rows.
+        :param arrow: Read the files with the pyarrow readers into Arrow-backed DataFrames (Arrow strings and dates)
+                      that are transformed and written to parquet without conversion to Python objects.
+        :param transform_workers: When set, the DataFrames (or batches) of at least transform_min_rows rows are
+                                  transformed in chunks by a pool of that many processes (see ParallelTransformer).
+        :param transform_min_rows: Smallest DataFrame transformed across the pool.
+        :param state_store: State of the processed keys and watermarks.
+        :param notifier: Notifier of the failed files.
+        :param parquet_loader: Writer of the local parquet files uploaded with the hdfs CLI.
+        :param hdfs_loader: Loader of the parquet files to HDFS.
+        :param metrics: Collector of the per-stage measures.
+        :param quarantine_dir: Directory of the rows failing the data-quality rules.
+        """
         load_dotenv()  # Load environment variables from .env
         self.user = os.getenv("EMAIL_USER")
         self.password = os.getenv("EMAIL_PASSWORD")
-        self.smtp_server = 'smtp.gmail.com'
-        self.smtp_port = 587
+        self.smtp_server = os.getenv('SMTP_SERVER', 'smtp.gmail.com')
+        self.smtp_port = int(os.getenv('SMTP_PORT', 587))
 
         # Assign the logger
         self.logger = logger
+        self.batch_size = batch_size
+        self.arrow = arrow
 
         # Initialize extractors
         self.extractors = {
-            "csv": CSVExtractor(logger),
-            "txt": TXTExtractor(logger),
-            "json": JSONExtractor(logger)
+            "csv": CSVExtractor(logger, arrow),
+            "txt": TXTExtractor(logger, arrow),
+            "json": JSONExtractor(logger, arrow)
         }
 
-        # Initialize transformers
+        # Initialize transformers, the derived columns of every table are declared in its transform plan
+        plans = TransformPlan.load('/home/hadoop/src/pipeline/support/transform_plans.json')
         self.transformers = {
-            "credit_cards_billing": CreditTransformers(logger),
-            "customer_profiles": CustomerTransformers(logger),
-            "support_tickets": SupportTransformers(logger),
-            "loans": LoanTransformers(logger, '/home/hadoop/src/pipeline/support/english_words.txt'),
-            "transactions": MoneyTransformers(logger)
+            "credit_cards_billing": CreditTransformers(logger, plans["credit_cards_billing"]),
+            "customer_profiles": CustomerTransformers(logger, plans["customer_profiles"]),
+            "support_tickets": SupportTransformers(logger, plans["support_tickets"]),
+            "loans": LoanTransformers(logger, '/home/hadoop/src/pipeline/support/english_words.txt', plans["loans"]),
+            "transactions": MoneyTransformers(logger, plans["transactions"])
         }
+        self.parallel_transformer = ParallelTransformer(logger, self.transformers, transform_workers or 1,
+                                                        transform_min_rows)
+        # fork the transform pool before the notifier, the state store and the file monitor start their threads
+        # (the listener threads of the logger already run, their locks are reset in the forked processes)
+        self.parallel_transformer.start()
 
         self.states = {
             "credit_cards_billing": "bill_id",
@@ -59,78 +100,307 @@ class Pipeline:
 
         # Initialize the schema validator and email notifier
         self.validator = SchemaValidator(logger, '/home/hadoop/src/pipeline/support/schemas.json')  
-        self.notifier = EmailNotifier(self.smtp_server, self.smtp_port, self.user, self.password) 
-        self.parquet_loader = ParquetLoader(logger, './tmp')
-        self.hdfs_loader = HDFSLoader(logger) 
-        self.state_store = StateStore(logger, '/home/hadoop/state')  
+        # Rows failing the data-quality rules go to <quarantine_dir>/<table>/ instead of failing the file
+        self.quality_checker = QualityChecker(logger, '/home/hadoop/src/pipeline/support/quality_rules.json',
+                                              self.validator.schemas, quarantine_dir)
+        # Failures are sent as one digest per NOTIFY_WINDOW seconds over a reused SMTP session,
+        # SMTP_TLS=0 disables STARTTLS for a local SMTP stand-in
+        self.notifier = notifier or EmailNotifier(self.smtp_server, self.smtp_port, self.user, self.password, logger,
+                                                  digest_window=float(os.getenv('NOTIFY_WINDOW', 60)),
+                                                  use_tls=os.getenv('SMTP_TLS', '1') == '1')
+        self.parquet_loader = parquet_loader or ParquetLoader(logger, './tmp')
+        # HDFS_URI (e.g. hdfs://namenode:9000) keeps one connection for every upload instead of the hdfs CLI,
+        # and the parquet files are then written straight to HDFS without a local copy
+        self.hdfs_loader = hdfs_loader or HDFSLoader(logger, uri=os.getenv('HDFS_URI'))
+        # Per-stage measures of every file, logged as JSON and exported in the Prometheus text format
+        self.metrics = metrics or Metrics(logger, os.getenv('METRICS_TEXTFILE', './logs/etl_metrics.prom'))
+        # STATE_LOADED_SHARDS bounds the shards of every key index kept in memory
+        self.state_store = state_store or StateStore(
+            logger, '/home/hadoop/state',
+            max_loaded_shards=int(os.getenv('STATE_LOADED_SHARDS', 16)),
+            bloom_error_rate=float(os.getenv('STATE_BLOOM_ERROR_RATE', 0)) or None,
+            flush_interval=float(os.getenv('STATE_FLUSH_INTERVAL', 0)) or None)
+
+    def close(self) -> None:
+        """
+        Stop the transform pool of the pipeline. Call it once the pipeline is no longer used.
+        """
+        self.parallel_transformer.shutdown()
 
     def run(self, file):
         """
         Process the file using the appropriate extractor, transformer, validator, and loader.
         """
-        
-        # Extract file extension
-        file_extension = file.split('.')[-1].lower()
 
         # Extract file type from the file name (without extension)
         file_type = file.split('/')[-1].rsplit('_', 1)[0]
 
-        # start processing
-        self.logger.log('info', f"Processing file: {file_type}")
+        with self.logger.context(file=file.split('/')[-1], table=file_type):
+            # start processing
+            self.logger.log('info', "Processing file: %s", file_type)
+
+            try:
+                self.process([file], file_type)
+
+                # log the successful processing
+                self.logger.log('info', "Pipeline completed successfully for file: %s \n %s", file_type, SEPARATOR)
+
+
+            except Exception as e:
+                self.logger.log('error', "Pipeline failed for file: %s with error: \n%s \n %s", file_type, e, SEPARATOR)
 
+                # Move the failed file to a separate directory
+                shutil.move(file, f'./data/failed_files/{file.split("/")[-1]}')
+
+                # Queue an email notification of the failure, sent with the others of the window
+                self.notifier.report(os.getenv('TO_EMAIL_1'), file, e)
+
+    def run_many(self, files):
+        """
+        Process several files of the same table as a single batch: one state update and one output file,
+        so the fixed cost of a file (state flush, parquet write, HDFS upload) is paid once for all of them.
+        If the batch fails, its files are processed again one by one so only the faulty ones fail
+        (the output of the failed batch is removed first, see run_stages).
+        """
+        if len(files) == 1:
+            return self.run(files[0])
+
+        file_type = files[0].split('/')[-1].rsplit('_', 1)[0]
+        with self.logger.context(file=[file.split('/')[-1] for file in files], table=file_type):
+            for file in files:
+                self.logger.log('info', "Processing file: %s", file.split('/')[-1])
+
+            try:
+                self.process(files, file_type)
+
+                for file in files:
+                    self.logger.log('info', "Pipeline completed successfully for file: %s", file.split('/')[-1])
+                self.logger.log('info', "Coalesced batch of %s %s files completed \n %s", len(files), file_type, SEPARATOR)
+
+            except Exception as e:
+                self.logger.log('warning', "Coalesced batch of %s %s files failed, processing them one by one: %s",
+                                len(files), file_type, e)
+                for file in files:
+                    self.run(file)
+
+    def process(self, files, file_type) -> None:
+        """
+        Run the stages on files of the same table, recording the metrics of every stage. Any failure is raised.
+        """
+        metrics = self.metrics.start(file_type, files)
         try:
-            # Dynamically select the correct extractor based on the file extension
-            extractor = self.extractors.get(file_extension)
-            if not extractor:
-                self.logger.log('error', f"Unsupported file type: {file_extension}")
-                raise ValueError(f"Unsupported file type: {file_extension}")
-            if file_extension == 'txt':
-                # For TXT files, specify the delimiter
-                df = extractor.extract(file, '|')
-            else:
-                df = extractor.extract(file)
+            self.run_stages(files, file_type, metrics)
+        except Exception:
+            metrics.finish('failed')
+            raise
+        metrics.finish('success')
 
-            self.logger.log('info', f'Extracted {file_type}: \ncolumns => {list(df.columns)} \nrows => {df.shape[0]}')       
+    def run_stages(self, files, file_type, metrics) -> None:
+        """
+        Extract, validate, filter, transform and load files of the same table into a single output file
+        named after the first one, then save the state.
+        If a stage fails once the output file is loaded, the file is removed, so processing the files
+        again neither overwrites nor duplicates it.
+        """
+        file = files[0]
+        name = f'{file.split("/")[-1].split(".")[0]}'
 
-            # Validate the DataFrame
-            self.validator.validate(df, file_type)
-            
+        if self.batch_size:
+            # Stream the files through every stage in bounded-size batches
+            hdfspath = self.run_batches(files, file_type, metrics)
+        else:
+            dfs = []
+            for path in files:
+                with metrics.stage('extract') as stage:
+                    df = self.extract(path, file_type)
+                    stage.add_rows_out(df.shape[0])
+                    stage.bytes_read += os.path.getsize(path)
+
+                self.logger.log('info', 'Extracted %s: \ncolumns => %s \nrows => %s', file_type, list(df.columns), df.shape[0])
+
+                with metrics.stage('validate') as stage:
+                    # Quarantine the rows failing the data-quality rules
+                    df = self.quality_checker.check(df, file_type, f'{path.split("/")[-1].split(".")[0]}')
+
+                    # Validate the DataFrame
+                    self.validator.validate(df, file_type)
+                    stage.add_rows_out(df.shape[0])
+                dfs.append(df)
+            df = dfs[0] if len(dfs) == 1 else pd.concat(dfs, ignore_index=True)
+        
             # Dynamically select the correct transformer based on file type
             transformer = self.transformers.get(file_type)
 
             # filter the date that is not in the state store
             column_name = self.states.get(file_type)
-            df = self.state_store.filter(df, file_type, column_name)
+            with metrics.stage('state_filter') as stage:
+                df = self.state_store.filter(df, file_type, column_name)
+                stage.add_rows_out(df.shape[0])
 
 
             # Transform the DataFrame
             if transformer:
-                df = transformer.transform(df)
-                self.logger.log('info', f"Transformed {file_type}: \ncolumns => {list(df.columns)} \nrows => {df.shape[0]}")
+                with metrics.stage('transform') as stage:
+                    df = self.parallel_transformer.transform(df, file_type, stage)
+                    stage.add_rows_out(df.shape[0])
+                self.logger.log('info', "Transformed %s: \ncolumns => %s \nrows => %s", file_type, list(df.columns), df.shape[0])
             else:
                 self.logger.log('error', f"Unsupported file type for transformation: {file_type}")
                 raise ValueError(f"Unsupported file type for transformation: {file_type}")
-            
-            # write the file to parquet
-            self.parquet_loader.load(df, f'{file.split("/")[-1].split(".")[0]}')
-
-            # Load the parquet to HDFS
-            self.hdfs_loader.load(hdfspath=f'/stage/{file_type}', 
-                                    local_path=f'/home/hadoop/tmp/{file.split("/")[-1].split(".")[0]}.parquet')
-            
+
+            # the partition columns are stored in the directory names, not in the file
+            hdfspath = self.get_partition_path(file_type, df)
+            df = df.drop(columns=PARTITION_COLUMNS)
+        
+            with metrics.stage('parquet_write') as stage:
+                if self.hdfs_loader.is_direct():
+                    # write the parquet straight to HDFS
+                    self.hdfs_loader.load_batches([df], hdfspath, name)
+                else:
+                    # write the file to parquet
+                    self.parquet_loader.load(df, name)
+                stage.add_rows_out(df.shape[0])
+                stage.bytes_written = self.get_output_size(hdfspath, name)
+
+        # the parquet is already on HDFS when written there directly
+        loaded = self.hdfs_loader.is_direct()
+        try:
+            if not loaded:
+                # Load the parquet to HDFS
+                with metrics.stage('hdfs_upload') as stage:
+                    local_path = f'/home/hadoop/tmp/{name}.parquet'
+                    stage.bytes_read = os.path.getsize(local_path) if os.path.exists(local_path) else 0
+                    self.hdfs_loader.load(hdfspath=hdfspath, local_path=local_path)
+                    stage.bytes_written = stage.bytes_read
+                loaded = True
+
             # Save the state after processing
-            self.state_store.flush()
+            with metrics.stage('state_flush'):
+                self.state_store.flush(file_type)
+
+        except Exception:
+            if loaded:
+                # the state is not saved, so the rows of the output would be loaded again by the retry
+                self.hdfs_loader.remove(hdfspath, name)
+            raise
+
+    def get_output_size(self, hdfspath, name) -> int:
+        """
+        Get the size of the parquet file written for name: on HDFS when written there directly, locally otherwise.
+        """
+        if self.hdfs_loader.is_direct():
+            return self.hdfs_loader.get_filesystem().get_file_info(f'{hdfspath}/{name}.parquet').size or 0
+        local_path = os.path.join(self.parquet_loader.output_dir, f'{name}.parquet')
+        return os.path.getsize(local_path) if os.path.exists(local_path) else 0
+
+    def get_extractor(self, file):
+        """
+        Dynamically select the correct extractor based on the file extension.
+        """
+        file_extension = file.split('.')[-1].lower()
+        extractor = self.extractors.get(file_extension)
+        if not extractor:
+            self.logger.log('error', f"Unsupported file type: {file_extension}")
+            raise ValueError(f"Unsupported file type: {file_extension}")
+        return extractor
+
+    def extract(self, file, file_type) -> pd.DataFrame:
+        """
+        Extract the whole file as a DataFrame.
+        """
+        extractor = self.get_extractor(file)
+        if isinstance(extractor, TXTExtractor):
+            # For TXT files, specify the delimiter
+            return extractor.extract(file, '|', **self.get_reader_options(file_type))
+        return extractor.extract(file, **self.get_reader_options(file_type))
+
+    def extract_batches(self, file, file_type):
+        """
+        Extract the file as a stream of DataFrames of at most batch_size rows.
+        """
+        extractor = self.get_extractor(file)
+        if isinstance(extractor, TXTExtractor):
+            # For TXT files, specify the delimiter
+            return extractor.extract_batches(file, '|', self.batch_size, **self.get_reader_options(file_type))
+        return extractor.extract_batches(file, self.batch_size, **self.get_reader_options(file_type))
 
-            # log the successful processing
-            self.logger.log('info', f"Pipeline completed successfully for file: {file_type} \n {'='*250}")
+    def run_batches(self, files, file_type, metrics) -> str:
+        """
+        Stream the files through validation, state filtering, transformation and the parquet writer
+        in batches of at most batch_size rows, so memory stays flat whatever the size of the files.
+        The batches of all the files are written to a single parquet file named after the first one.
+
+        :return: The HDFS partition directory of the output file.
+        """
+        file = files[0]
+        transformer = self.transformers.get(file_type)
+        if not transformer:
+            self.logger.log('error', f"Unsupported file type for transformation: {file_type}")
+            raise ValueError(f"Unsupported file type for transformation: {file_type}")
+
+        # get the extractors first so an unsupported file fails before anything is written
+        for path in files:
+            self.get_extractor(path)
+        batches = itertools.chain.from_iterable(self.extract_batches(path, file_type) for path in files)
+        batches = metrics.track('extract', batches)
+        metrics.get_stage('extract').bytes_read = sum(os.path.getsize(path) for path in files)
+
+        # Quarantine the rows failing the data-quality rules
+        batches = self.quality_checker.check_batches(batches, file_type, f'{file.split("/")[-1].split(".")[0]}')
 
+        batches = metrics.track('validate', self.validate_batches(batches, file_type))
 
-        except Exception as e:
-            self.logger.log('error', f"Pipeline failed for file: {file_type} with error: \n{e} \n {'='*250}")
+        # filter the date that is not in the state store
+        column_name = self.states.get(file_type)
+        batches = metrics.track('state_filter', self.state_store.filter_batches(batches, file_type, column_name))
 
-            # Move the failed file to a separate directory
-            shutil.move(file, f'./data/failed_files/{file.split("/")[-1]}')
+        batches = metrics.track('transform', self.parallel_transformer.transform_batches(
+            batches, file_type, metrics.get_stage('transform')))
 
-            # Send an email notification when the pipeline fails
-            threading.Thread(target=self.notifier.notify, args= (os.getenv('TO_EMAIL_1'), )).start()
-            
+        # the whole file goes to the partition of its first batch,
+        # the partition columns are stored in the directory names, not in the file
+        first = next(batches)
+        hdfspath = self.get_partition_path(file_type, first)
+        batches = (df.drop(columns=PARTITION_COLUMNS) for df in itertools.chain([first], batches))
+
+        # write the batches to a single parquet file, one row group per batch,
+        # straight to HDFS when a filesystem URI is configured
+        with metrics.stage('parquet_write', inclusive=True) as stage:
+            if self.hdfs_loader.is_direct():
+                rows = self.hdfs_loader.load_batches(batches, hdfspath, f'{file.split("/")[-1].split(".")[0]}')
+            else:
+                rows = self.parquet_loader.load_batches(batches, f'{file.split("/")[-1].split(".")[0]}')
+            stage.add_rows_out(rows)
+            stage.bytes_written = self.get_output_size(hdfspath, f'{file.split("/")[-1].split(".")[0]}')
+        self.logger.log('info', "Transformed %s in batches of %s: \nrows => %s", file_type, self.batch_size, rows)
+        return hdfspath
+
+    def get_partition_path(self, file_type, df) -> str:
+        """
+        Get the Hive partition directory (/stage/<table>/partition_date=<date>/partition_hour=<hour>)
+        of the output of a file, from the partition columns added by the transformers.
+        """
+        partition_date = df['partition_date'].iloc[0]
+        partition_hour = df['partition_hour'].iloc[0]
+        return f'/stage/{file_type}/partition_date={partition_date}/partition_hour={partition_hour}'
+
+    def get_reader_options(self, file_type) -> dict:
+        """
+        Get the extra options of the extractors: the column types compiled from the schema of the file type,
+        the numeric columns coerced by the quality checker being inferred.
+        """
+        return self.validator.get_reader_options(file_type, self.arrow,
+                                                 self.quality_checker.get_coerced_columns(file_type))
+
+    def validate_batches(self, batches, file_type):
+        """
+        Validate every batch against the schema of the file type while counting the extracted rows.
+        """
+        rows = 0
+        for df in batches:
+            if rows == 0:
+                self.logger.log('info', 'Extracting %s: \ncolumns => %s', file_type, list(df.columns))
+            self.validator.validate(df, file_type)
+            rows += df.shape[0]
+            yield df
+        self.logger.log('info', 'Extracted %s: \nrows => %s', file_type, rows)
@@ -0,0 +1,109 @@
+import os
+import math
+import numpy as np
+import pandas as pd
+
+
+class BloomFilter:
+    """
+    A probabilistic set of keys answering "definitely not present" or "possibly present",
+    sized for a capacity and a false-positive rate and stored as a packed bit array.
+
+    Bit positions are derived from two stable 64-bit hashes (double hashing), so a filter
+    saved by one process gives the same answers in another one.
+
+    Attributes:
+        capacity (int): Number of keys the filter is sized for.
+        error_rate (float): False-positive rate expected at capacity.
+        num_bits (int): Size of the bit array.
+        num_hashes (int): Number of bit positions per key.
+        count (int): Number of keys added.
+    """
+
+    HASH_KEY_1 = '0123456789123456'
+    HASH_KEY_2 = 'nexabank-bloom-2'
+
+    def __init__(self, capacity, error_rate):
+        """
+        Create an empty filter.
+
+        Args:
+            capacity (int): Number of keys the filter is sized for.
+            error_rate (float): False-positive rate expected at capacity (between 0 and 1).
+        """
+        if not 0 < error_rate < 1:
+            raise ValueError(f"Bloom filter error rate must be between 0 and 1, got {error_rate}")
+
+        self.capacity = max(1, int(capacity))
+        self.error_rate = error_rate
+        self.num_bits = max(8, int(math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2)))
+        self.num_hashes = max(1, int(round(self.num_bits / self.capacity * math.log(2))))
+        self.count = 0
+        self._bits = np.zeros((self.num_bits + 7) // 8, dtype=np.uint8)
+
+    def _positions(self, keys) -> np.ndarray:
+        """
+        Return the bit positions of every key, as an array of shape (len(keys), num_hashes).
+        """
+        keys = np.asarray(keys, dtype=object)
+        h1 = pd.util.hash_array(keys, hash_key=self.HASH_KEY_1)
+        h2 = pd.util.hash_array(keys, hash_key=self.HASH_KEY_2) | np.uint64(1)
+        steps = np.arange(self.num_hashes, dtype=np.uint64)
+        with np.errstate(over='ignore'):
+            positions = (h1[:, None] + steps[None, :] * h2[:, None]) % np.uint64(self.num_bits)
+        return positions.astype(np.int64)
+
+    def add(self, keys) -> None:
+        """
+        Add keys to the filter.
+
+        Args:
+            keys (array-like): The keys to add, as strings.
+        """
+        if len(keys) == 0:
+            return
+        positions = self._positions(keys)
+        np.bitwise_or.at(self._bits, positions >> 3, (1 << (positions & 7)).astype(np.uint8))
+        self.count += len(keys)
+
+    def might_contain(self, keys) -> np.ndarray:
+        """
+        Return a boolean array telling for every key whether it may be in the filter.
+        False means the key was definitely never added.
+
+        Args:
+            keys (array-like): The keys to look up, as strings.
+        """
+        if len(keys) == 0:
+            return np.zeros(0, dtype=bool)
+        positions = self._positions(keys)
+        return ((self._bits[positions >> 3] >> (positions & 7)) & 1).all(axis=1).astype(bool)
+
+    def save(self, path, fsync=False) -> None:
+        """
+        Save the filter to path, under a temporary name renamed once complete.
+        With fsync, the file is forced to disk before the rename.
+        """
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as file:
+            np.savez(file, bits=self._bits,
+                     sizes=np.array([self.capacity, self.num_bits, self.num_hashes, self.count], dtype=np.int64),
+                     error_rate=np.array([self.error_rate]))
+            if fsync:
+                file.flush()
+                os.fsync(file.fileno())
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path) -> 'BloomFilter':
+        """
+        Load a filter saved with save.
+        """
+        with np.load(path) as data:
+            capacity, num_bits, num_hashes, count = (int(value) for value in data['sizes'])
+            bloom = cls(capacity, float(data['error_rate'][0]))
+            bloom.num_bits = num_bits
+            bloom.num_hashes = num_hashes
+            bloom.count = count
+            bloom._bits = data['bits'].copy()
+        return bloom
@@ -0,0 +1,338 @@
+import os
+import json
+import time
+import glob
+import itertools
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from pipeline.state_store.bloom_filter import BloomFilter
+
+
+class KeyIndex:
+    """
+    A persistent set of processed keys (e.g. bill_id, customer_id, ticket_id), hash-sharded
+    into parquet part files so membership checks and flushes only cost the size of the batch.
+
+    Layout:
+        <directory>/_index.json                           column name and number of shards
+        <directory>/shard-<NNN>/part-<ns>-<seq>.parquet   append-only files of keys flushed together
+
+    Shards are loaded lazily on first use as sets, and only the max_loaded_shards most recently used
+    stay resident, so memory does not grow with the history; the keys of a batch are looked up
+    shard by shard so every shard is loaded at most once per batch. New keys are kept as pending
+    until commit, and committed keys are kept in memory until persist, which appends one part file
+    per touched shard; a shard holding more than max_parts files is compacted into a single file.
+    flush commits and persists at once.
+
+    With a bloom_error_rate, a Bloom filter persisted in <directory>/_bloom.npz rules out keys
+    that were definitely never added, so only possible duplicates are checked against the shards
+    and shards receiving only new keys are never loaded. The filter is saved before the part files
+    so it never misses a persisted key, and is rebuilt with twice the capacity once it is full.
+    Persisting keys with the filter disabled deletes the saved filter, which would miss them,
+    so it is rebuilt from the shards the next time the filter is enabled.
+
+    Attributes:
+        directory (str): Directory holding the shards of the index.
+        column_name (str): Name of the key column.
+        num_shards (int): Number of hash shards.
+        max_parts (int): Number of part files per shard that triggers a compaction.
+        max_loaded_shards (int): Number of shards kept in memory.
+        bloom (BloomFilter): The Bloom filter in front of the shards, or None.
+    """
+
+    METADATA_FILE = '_index.json'
+    BLOOM_FILE = '_bloom.npz'
+
+    def __init__(self, logger, directory, column_name, num_shards=64, max_parts=16, max_loaded_shards=16,
+                 bloom_error_rate=None, bloom_capacity=1000000):
+        """
+        Open the index stored in directory, creating it if it does not exist yet.
+        The number of shards of an existing index is read from its metadata.
+
+        Args:
+            logger: Logger instance for logging.
+            directory (str): Directory holding the shards of the index.
+            column_name (str): Name of the key column.
+            num_shards (int): Number of hash shards of a new index.
+            max_parts (int): Number of part files per shard that triggers a compaction.
+            max_loaded_shards (int): Number of shards kept in memory, the least recently used are evicted.
+            bloom_error_rate (float): False-positive rate of the Bloom filter, None disables it.
+            bloom_capacity (int): Number of keys a new Bloom filter is sized for.
+        """
+        self.logger = logger
+        self.directory = directory
+        self.column_name = column_name
+        self.max_parts = max_parts
+        self.max_loaded_shards = max_loaded_shards
+
+        metadata_path = os.path.join(directory, self.METADATA_FILE)
+        if os.path.exists(metadata_path):
+            with open(metadata_path, 'r') as file:
+                metadata = json.load(file)
+            self.num_shards = metadata['num_shards']
+        else:
+            self.num_shards = num_shards
+            os.makedirs(directory, exist_ok=True)
+            self._write_atomic(metadata_path, json.dumps({'column': column_name, 'num_shards': num_shards}))
+
+        self._shards = OrderedDict()  # shard number -> set of keys (committed and pending), least recently used first
+        self._parts = {}     # shard number -> number of part files on disk
+        self._pending = {}   # shard number -> keys added since the last commit
+        self._committed = {} # shard number -> keys committed but not written yet
+        self._sequence = itertools.count()  # keeps part names unique within the process
+
+        self.bloom = None
+        self.bloom_capacity = bloom_capacity
+        # a saved filter left by a run with the filter enabled, deleted once keys are persisted without it
+        self._stale_bloom = not bloom_error_rate and os.path.exists(os.path.join(directory, self.BLOOM_FILE))
+        if bloom_error_rate:
+            bloom_path = os.path.join(directory, self.BLOOM_FILE)
+            if os.path.exists(bloom_path):
+                self.bloom = BloomFilter.load(bloom_path)
+            elif glob.glob(os.path.join(directory, 'shard-*', 'part-*.parquet')):
+                self.rebuild_bloom(bloom_error_rate)
+            else:
+                self.bloom = BloomFilter(bloom_capacity, bloom_error_rate)
+
+    @staticmethod
+    def exists(directory) -> bool:
+        """
+        Check whether an index was created in directory.
+        """
+        return os.path.exists(os.path.join(directory, KeyIndex.METADATA_FILE))
+
+    def shard_of(self, keys) -> np.ndarray:
+        """
+        Return the shard number of every key, using a hash that is stable across processes.
+        """
+        keys = np.asarray(keys, dtype=object)
+        return (pd.util.hash_array(keys) % np.uint64(self.num_shards)).astype(np.int64)
+
+    def contains(self, keys) -> np.ndarray:
+        """
+        Return a boolean array telling for every key whether it is in the index.
+
+        Args:
+            keys (array-like): The keys to look up, as strings.
+        """
+        keys = np.asarray(keys, dtype=object)
+        result = np.zeros(len(keys), dtype=bool)
+
+        # Only the keys the Bloom filter cannot rule out are checked against the shards
+        positions = np.flatnonzero(self.bloom.might_contain(keys)) if self.bloom else np.arange(len(keys))
+        shards = self.shard_of(keys[positions])
+        # Grouped by shard, so every shard is loaded at most once
+        positions = positions[np.argsort(shards, kind='stable')]
+        for position, shard in zip(positions, np.sort(shards, kind='stable')):
+            result[position] = keys[position] in self._get_shard(shard)
+        return result
+
+    def add(self, keys) -> int:
+        """
+        Add keys to the index. They are persisted by the next flush.
+
+        Args:
+            keys (array-like): The keys to add, as strings.
+
+        Returns:
+            int: The number of keys that were not in the index.
+        """
+        keys = pd.unique(np.asarray(keys, dtype=object))
+        shards = self.shard_of(keys)
+        # Grouped by shard, so every shard is loaded at most once
+        order = np.argsort(shards, kind='stable')
+        keys, shards = keys[order], shards[order]
+        maybe_present = self.bloom.might_contain(keys) if self.bloom else np.ones(len(keys), dtype=bool)
+        new_keys = []
+        for key, shard, maybe in zip(keys, shards, maybe_present):
+            shard = int(shard)
+            if maybe:
+                shard_keys = self._get_shard(shard)
+                if key in shard_keys:
+                    continue
+                shard_keys.add(key)
+            elif shard in self._shards:
+                # Definitely new: only update the shard if it is already loaded
+                self._shards[shard].add(key)
+            self._pending.setdefault(shard, []).append(key)
+            new_keys.append(key)
+
+        if self.bloom:
+            self.bloom.add(new_keys)
+        return len(new_keys)
+
+    def discard_pending(self) -> None:
+        """
+        Forget the keys added since the last commit (e.g. when the file that added them failed).
+        The Bloom filter keeps them, which only costs a few more false positives.
+        """
+        for shard, keys in self._pending.items():
+            if shard in self._shards:
+                self._shards[shard].difference_update(keys)
+        self._pending = {}
+
+    def commit(self) -> list:
+        """
+        Mark the pending keys as committed: discard_pending no longer drops them
+        and the next persist writes them.
+
+        Returns:
+            list: The keys committed.
+        """
+        keys = []
+        for shard, shard_keys in self._pending.items():
+            self._committed.setdefault(shard, []).extend(shard_keys)
+            keys.extend(shard_keys)
+        self._pending = {}
+        return keys
+
+    def flush(self) -> int:
+        """
+        Commit the pending keys and persist them.
+
+        Returns:
+            int: The number of keys written.
+        """
+        self.commit()
+        return self.persist()
+
+    def persist(self, fsync=False) -> int:
+        """
+        Append the committed keys of every touched shard as a new part file, compacting shards
+        that hold too many parts.
+
+        Args:
+            fsync (bool): Force the written files to disk before returning.
+
+        Returns:
+            int: The number of keys written.
+        """
+        written = 0
+        committed, self._committed = self._committed, {}
+        if self.bloom and committed:
+            # Save the filter first: after a crash it may hold keys that were not written, never the opposite
+            self.bloom.save(os.path.join(self.directory, self.BLOOM_FILE), fsync)
+        elif self._stale_bloom and committed:
+            # Delete it first for the same reason: it would rule out the keys written now
+            os.remove(os.path.join(self.directory, self.BLOOM_FILE))
+            self._stale_bloom = False
+
+        for shard, keys in committed.items():
+            shard_dir = self._get_shard_dir(shard)
+            os.makedirs(shard_dir, exist_ok=True)
+            self._write_part(shard_dir, keys, fsync)
+            self._parts[shard] = self._parts.get(shard, 0) + 1
+            written += len(keys)
+
+            if self._parts[shard] > self.max_parts:
+                self.compact(shard, fsync)
+
+        if self.bloom and self.bloom.count > self.bloom.capacity:
+            self.rebuild_bloom(self.bloom.error_rate)
+        return written
+
+    def rebuild_bloom(self, error_rate) -> None:
+        """
+        Build the Bloom filter from all the keys of the index and save it.
+        It is sized for twice the number of keys, and at least for bloom_capacity.
+
+        Args:
+            error_rate (float): False-positive rate of the filter.
+        """
+        keys = []
+        for shard in range(self.num_shards):
+            # read without loading, so the resident shards are kept
+            keys.extend(self._shards[shard] if shard in self._shards else self._read_shard(shard))
+
+        bloom = BloomFilter(max(self.bloom_capacity, 2 * len(keys)), error_rate)
+        bloom.add(keys)
+        bloom.save(os.path.join(self.directory, self.BLOOM_FILE))
+        self.bloom = bloom
+        self.logger.log('info', f"Rebuilt Bloom filter of {self.directory} with {len(keys)} keys")
+
+    def compact(self, shard, fsync=False) -> None:
+        """
+        Merge all the part files of a shard into a single file.
+        """
+        shard_dir = self._get_shard_dir(shard)
+        parts = self._list_parts(shard_dir)
+        unwritten = set(self._pending.get(shard, [])) | set(self._committed.get(shard, []))
+        self._write_part(shard_dir, sorted(self._get_shard(shard) - unwritten), fsync)
+        for part in parts:
+            os.remove(part)
+        self._parts[shard] = 1
+        self.logger.log('info', f"Compacted {len(parts)} parts of {shard_dir}")
+
+    def __len__(self) -> int:
+        """
+        Return the number of keys of the loaded shards.
+        """
+        return sum(len(keys) for keys in self._shards.values())
+
+    def _get_shard(self, shard) -> set:
+        """
+        Return the keys of a shard, loading them from its part files if it is not resident.
+        Once more than max_loaded_shards are loaded, the least recently used is evicted.
+        """
+        shard = int(shard)
+        if shard in self._shards:
+            self._shards.move_to_end(shard)
+            return self._shards[shard]
+
+        keys = self._shards[shard] = self._read_shard(shard)
+        while len(self._shards) > self.max_loaded_shards:
+            self._shards.popitem(last=False)
+        return keys
+
+    def _read_shard(self, shard) -> set:
+        """
+        Read the keys of a shard from its part files, with its keys not written yet.
+        """
+        parts = self._list_parts(self._get_shard_dir(shard))
+        keys = set()
+        for part in parts:
+            keys.update(pq.read_table(part, columns=[self.column_name]).column(0).to_pylist())
+        # Keys added without loading the shard are not on disk yet
+        keys.update(self._pending.get(shard, []))
+        keys.update(self._committed.get(shard, []))
+        self._parts[shard] = len(parts)
+        return keys
+
+    def _get_shard_dir(self, shard) -> str:
+        """
+        Return the directory of a shard.
+        """
+        return os.path.join(self.directory, f"shard-{int(shard):03d}")
+
+    def _list_parts(self, shard_dir) -> list:
+        """
+        Return the part files of a shard directory.
+        """
+        return sorted(glob.glob(os.path.join(shard_dir, 'part-*.parquet')))
+
+    def _write_part(self, shard_dir, keys, fsync=False) -> None:
+        """
+        Write keys as a new part file of the shard, under a temporary name renamed once complete.
+        """
+        path = os.path.join(shard_dir, f"part-{time.time_ns()}-{next(self._sequence):06d}.parquet")
+        table = pa.table({self.column_name: pa.array(list(keys), type=pa.string())})
+        tmp_path = os.path.join(shard_dir, f".{os.path.basename(path)}.tmp")
+        with open(tmp_path, 'wb') as file:
+            pq.write_table(table, file)
+            if fsync:
+                file.flush()
+                os.fsync(file.fileno())
+        os.replace(tmp_path, path)
+
+    def _write_atomic(self, path, content) -> None:
+        """
+        Write a text file under a temporary name renamed once complete.
+        """
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as file:
+            file.write(content)
+        os.replace(tmp_path, path)
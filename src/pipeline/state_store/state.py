@@ -1,35 +1,72 @@
 import os
+import json
+import time
+import atexit
+import threading
 import pandas as pd
 
+from pipeline.state_store.key_index import KeyIndex
+
 class StateStore:
     """
     A class to manage loading, saving, updating, and filtering state information for 
     tables and columns using parquet files as persistent storage.
 
-    The state can be either a scalar string or a list of strings representing processed values,
-    which is used to filter new incoming data.
+    The state can be either a scalar string (a watermark stored in <table>.parquet) or a set of
+    processed values stored in a hash-sharded KeyIndex under <table>/, which is used to filter
+    new incoming data. Key indexes stay resident, so checking and saving them only costs the
+    size of the new data, not of the history. Legacy list state files are migrated to a key index
+    the first time they are loaded.
+
+    State is kept per table, so files of different tables can be filtered and flushed
+    concurrently by parallel workers. Loaded state stays resident in memory; a state that
+    was updated by a file that failed is rolled back to its last flushed value on the next load.
+
+    With a flush_interval, flushes are write-behind: flush only appends the new state of the
+    file to a per-table write-ahead log (<table>.wal, fsynced), and a background checkpoint
+    persists the state of every changed table once per interval (and at exit) with atomic
+    renames and fsync, then truncates its log. A log left by a crash is replayed when the
+    table is loaded, so no flushed state is lost.
 
     Attributes:
         directory (str): Directory path where state parquet files are stored.
         logger: Logger instance for logging info and warnings.
-        _state (str or list): Current loaded state (single string or list of strings).
-        _current_table (str): The currently loaded table name.
-        _current_column (str): The currently loaded column name.
+        num_shards (int): Number of shards of the key indexes created by the store.
+        bloom_error_rate (float): False-positive rate of the key index Bloom filters, None disables them.
+        flush_interval (float): Seconds between write-behind checkpoints, None flushes synchronously.
+        _states (dict): Loaded state per table name (single string or KeyIndex).
+        _columns (dict): Loaded column name per table name.
+        _committed (dict): Last flushed scalar state per table name.
     """
 
-    def __init__(self, logger, directory):
+    def __init__(self, logger, directory, num_shards=64, max_loaded_shards=16, bloom_error_rate=None,
+                 flush_interval=None):
         """
         Initialize the StateStore instance.
 
         Args:
             logger: Logger instance for logging.
             directory (str): Directory to save/load parquet state files.
+            num_shards (int): Number of shards of the key indexes created by the store.
+            max_loaded_shards (int): Number of shards of every key index kept in memory.
+            bloom_error_rate (float): False-positive rate of the key index Bloom filters, None disables them.
+            flush_interval (float): Seconds between write-behind checkpoints, None flushes synchronously.
         """
         self.directory = directory
         self.logger = logger
-        self._state = None           # current loaded state (list or scalar)
-        self._current_table = None
-        self._current_column = None
+        self.num_shards = num_shards
+        self.max_loaded_shards = max_loaded_shards
+        self.bloom_error_rate = bloom_error_rate
+        self.flush_interval = flush_interval
+        self._states = {}            # table name -> loaded state (KeyIndex or scalar)
+        self._columns = {}           # table name -> state column name
+        self._committed = {}         # table name -> last flushed scalar state
+        self._dirty = set()          # tables flushed to their log but not checkpointed yet
+        self._locks = {}             # table name -> lock shared by the worker and the checkpoint thread
+        self._checkpoint_pid = None  # process running the checkpoint thread (workers may be forked)
+
+        if flush_interval:
+            atexit.register(self.checkpoint)
 
     def _get_file_path(self, table_name) -> str:
         """
@@ -43,95 +80,302 @@ class StateStore:
         """
         filename = f"{table_name}.parquet"
         return os.path.join(self.directory, filename)
+
+    def _get_index_dir(self, table_name) -> str:
+        """
+        Generate the directory of the key index for the given table.
+
+        Args:
+            table_name (str): The table name.
+
+        Returns:
+            str: Directory holding the shards of the key index.
+        """
+        return os.path.join(self.directory, table_name)
+
+    def _get_wal_path(self, table_name) -> str:
+        """
+        Generate the path of the write-ahead log for the given table.
+
+        Args:
+            table_name (str): The table name.
+
+        Returns:
+            str: Full file path of the write-ahead log.
+        """
+        return os.path.join(self.directory, f"{table_name}.wal")
+
+    def _get_lock(self, table_name) -> threading.RLock:
+        """
+        Return the lock guarding the state of the given table.
+        """
+        return self._locks.setdefault(table_name, threading.RLock())
+
+    def _open_index(self, table_name, column_name) -> KeyIndex:
+        """
+        Open (or create) the key index of the given table.
+
+        Args:
+            table_name (str): The table name.
+            column_name (str): The column name of the state.
+
+        Returns:
+            KeyIndex: The key index of the table.
+        """
+        return KeyIndex(self.logger, self._get_index_dir(table_name), column_name,
+                        num_shards=self.num_shards, max_loaded_shards=self.max_loaded_shards,
+                        bloom_error_rate=self.bloom_error_rate)
     
     def load_state(self, table_name, column_name) -> None:
         """
-        Load the state from a parquet file for the specified table and column.
+        Load the state from a parquet file or key index for the specified table and column.
 
+        A state already loaded stays resident; only the values added since its last flush
+        (by a file that failed) are discarded.
+        A write-ahead log left by a crash is replayed and checkpointed.
         If the file does not exist or is empty, sets the state to None.
         If the specified column is missing, logs a warning and sets state to None.
+        A state file with several rows is migrated to a key index.
         Converts all loaded state values to strings.
 
         Args:
             table_name (str): The table name.
             column_name (str): The column name to load state for.
         """
+        with self._get_lock(table_name):
+            self._load_state(table_name, column_name)
+
+    def _load_state(self, table_name, column_name) -> None:
+        """
+        Load the state of the table, the caller holding the table lock.
+        """
+        state = self._states.get(table_name)
+        if self._columns.get(table_name) == column_name:
+            if isinstance(state, KeyIndex):
+                state.discard_pending()
+                return
+            if table_name in self._committed:
+                self._states[table_name] = self._committed[table_name]
+                return
+
         path = self._get_file_path(table_name)
-        if os.path.exists(path):
+        index_dir = self._get_index_dir(table_name)
+        state = None
+        if KeyIndex.exists(index_dir):
+            state = self._open_index(table_name, column_name)
+            self.logger.log('info', f"Loaded state for {table_name}.{column_name} from {index_dir}")
+        elif os.path.exists(path):
             df = pd.read_parquet(path)
             if df.empty or column_name not in df.columns:
                 self.logger.log('warning', f"State file {path} is empty or missing column '{column_name}'.")
-                self._state = None
             else:
                 if df.shape[0] > 1:
-                    self._state = df[column_name].astype(str).tolist()
+                    state = self._migrate(table_name, column_name, df[column_name].astype(str).unique())
                 else:
-                    self._state = str(df[column_name].iloc[0])
+                    state = str(df[column_name].iloc[0])
                 self.logger.log('info', f"Loaded state for {table_name}.{column_name} from {path}")
         else:
             self.logger.log('info', f"No existing state file for {table_name}.{column_name}, starting empty")
-            self._state = None
 
-        self._current_table = table_name
-        self._current_column = column_name
+        self._states[table_name] = state
+        self._columns[table_name] = column_name
+        if state is not None and not isinstance(state, KeyIndex):
+            self._committed[table_name] = state
+
+        if os.path.exists(self._get_wal_path(table_name)):
+            self._recover(table_name, column_name)
 
-    def flush(self) -> None:
+    def _recover(self, table_name, column_name) -> None:
         """
-        Save the current in-memory state to a parquet file for the current table and column.
+        Replay the write-ahead log of the table over its loaded state, persist the result
+        and remove the log. A truncated last record (crash while writing it) is ignored.
+        """
+        wal_path = self._get_wal_path(table_name)
+        records = []
+        with open(wal_path, 'r') as file:
+            for line in file:
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    break
 
-        If no current table or column is loaded, or state is None, logs a warning and does nothing.
-        Saves lists as multiple rows; scalar as a single-row dataframe.
+        for record in records:
+            if record.get('column') != column_name:
+                continue
+            if 'keys' in record:
+                self.update_or_add(table_name, record['keys'])
+                self._states[table_name].commit()
+            else:
+                self.update_or_add(table_name, record['value'])
+                self._committed[table_name] = self._states[table_name]
+
+        self._persist(table_name, fsync=True)
+        os.remove(wal_path)
+        self.logger.log('info', f"Recovered {len(records)} state records for {table_name} from {wal_path}")
+    def flush(self, table_name) -> None:
         """
-        if self._current_table is None or self._current_column is None:
-            self.logger.log('warning', "No current table/column loaded, nothing to save.")
+        Save the in-memory state of the table to its parquet file or key index.
+
+        If the table was never loaded, or its state is None, logs a warning and does nothing.
+        Key indexes only append the keys added since the last flush; scalar is saved as a single-row dataframe.
+        With a flush_interval, the new state is only appended to the write-ahead log of the table
+        and persisted by the next checkpoint.
+
+        Args:
+            table_name (str): The table name.
+        """
+        if table_name not in self._columns:
+            self.logger.log('warning', f"No state loaded for {table_name}, nothing to save.")
             return
 
-        if self._state is None:
-            self.logger.log('warning', f"No state to save for {self._current_table}.{self._current_column}")
+        with self._get_lock(table_name):
+            column_name = self._columns[table_name]
+            state = self._states.get(table_name)
+            if state is None:
+                self.logger.log('warning', f"No state to save for {table_name}.{column_name}")
+                return
+
+            if not self.flush_interval:
+                if isinstance(state, KeyIndex):
+                    state.commit()
+                else:
+                    self._committed[table_name] = state
+                self._persist(table_name)
+                return
+
+            if isinstance(state, KeyIndex):
+                keys = state.commit()
+                if not keys:
+                    return
+                record = {'column': column_name, 'keys': keys}
+            else:
+                self._committed[table_name] = state
+                record = {'column': column_name, 'value': state}
+
+            with open(self._get_wal_path(table_name), 'a') as file:
+                file.write(json.dumps(record, default=str) + '\n')
+                file.flush()
+                os.fsync(file.fileno())
+            self._dirty.add(table_name)
+            self.logger.log('info', f"Logged state for {table_name} to {self._get_wal_path(table_name)}")
+
+        if self._checkpoint_pid != os.getpid():
+            # Start the checkpoint thread in the process using the store (forked workers do not inherit it)
+            self._checkpoint_pid = os.getpid()
+            threading.Thread(target=self._run_checkpoints, daemon=True).start()
+
+    def checkpoint(self) -> None:
+        """
+        Persist the state of every table flushed since the last checkpoint, forcing it to disk,
+        and truncate the write-ahead logs.
+        """
+        for table_name in list(self._dirty):
+            with self._get_lock(table_name):
+                self._persist(table_name, fsync=True)
+                wal_path = self._get_wal_path(table_name)
+                if os.path.exists(wal_path):
+                    os.remove(wal_path)
+                self._dirty.discard(table_name)
+
+    def _run_checkpoints(self) -> None:
+        """
+        Run a checkpoint every flush_interval seconds.
+        """
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.checkpoint()
+            except Exception as e:
+                self.logger.log('error', f"State checkpoint failed: {e}")
+
+    def _persist(self, table_name, fsync=False) -> None:
+        """
+        Write the flushed state of the table to its key index or parquet file,
+        the caller holding the table lock.
+        """
+        state = self._states.get(table_name)
+        if isinstance(state, KeyIndex):
+            written = state.persist(fsync)
+            self.logger.log('info', f"Saved state for {table_name} to {state.directory}, new keys => {written}")
+            return
+        if table_name not in self._committed:
             return
 
-        path = self._get_file_path(self._current_table)
-        if isinstance(self._state, list):
-            df = pd.DataFrame({self._current_column: self._state})
-        else:
-            df = pd.DataFrame({self._current_column: [self._state]})
-        df.to_parquet(path, index=False)
-        self.logger.log('info', f"Saved state for {self._current_table} to {path}")
+        path = self._get_file_path(table_name)
+        tmp_path = f"{path}.tmp"
+        df = pd.DataFrame({self._columns[table_name]: [self._committed[table_name]]})
+        with open(tmp_path, 'wb') as file:
+            df.to_parquet(file, index=False)
+            if fsync:
+                file.flush()
+                os.fsync(file.fileno())
+        os.replace(tmp_path, path)
+        if fsync:
+            directory = os.open(self.directory, os.O_RDONLY)
+            try:
+                os.fsync(directory)
+            finally:
+                os.close(directory)
+        self.logger.log('info', f"Saved state for {table_name} to {path}")
 
-    def update_or_add(self, new_value) -> None:
+    def _migrate(self, table_name, column_name, values) -> KeyIndex:
         """
-        Update the in-memory state with new_value.
+        Build the key index of a table from the values of its legacy list state file,
+        and rename the legacy file so it is not loaded again.
+
+        Args:
+            table_name (str): The table name.
+            column_name (str): The column name of the state.
+            values (array-like): The processed values of the legacy state file.
 
-        - If current state is None, sets it to new_value.
-        - If state is a list, merges new_value(s) into the list (supports list or scalar).
+        Returns:
+            KeyIndex: The new key index.
+        """
+        index = self._open_index(table_name, column_name)
+        index.add(values)
+        index.flush()
+
+        path = self._get_file_path(table_name)
+        os.replace(path, f"{path}.migrated")
+        self.logger.log('info', f"Migrated state of {table_name}.{column_name} from {path} to {index.directory}")
+        return index
+
+    def update_or_add(self, table_name, new_value) -> None:
+        """
+        Update the in-memory state of the table with new_value.
+
+        - If current state is None, sets it to new_value (a new key index for a list).
+        - If state is a key index, adds new_value(s) to the index (supports list or scalar).
         - If state is a scalar string, updates it if new_value is lexicographically greater.
 
         Args:
+            table_name (str): The table name.
             new_value (str or list): New value(s) to add to the state.
         """
-        if self._state is None:
-            self._state = new_value
-            return
-
-        if isinstance(self._state, list):
-            combined = set(self._state)
+        state = self._states.get(table_name)
+        if state is None:
             if isinstance(new_value, list):
-                combined.update(new_value)
+                index = self._open_index(table_name, self._columns[table_name])
+                index.add(new_value)
+                self._states[table_name] = index
             else:
-                combined.add(new_value)
-            self._state = list(combined)  # Ensure unique values (no duplicates)
+                self._states[table_name] = new_value
+            return
+
+        if isinstance(state, KeyIndex):
+            state.add(new_value if isinstance(new_value, list) else [new_value])
         else:
             if isinstance(new_value, list):
-                self._state = max(new_value)
-            elif new_value > self._state:
-                self._state = new_value
+                self._states[table_name] = max(new_value)
+            elif new_value > state:
+                self._states[table_name] = new_value
 
     def filter(self, df, table_name, column_name) -> pd.DataFrame:
         """
         Filter the DataFrame based on the current state for the specified table and column.
 
         Logic:
-        - If state is a list of strings, exclude rows where column value is in that list.
+        - If state is a key index, exclude rows where column value is in the index.
         - If state is a scalar string, keep only rows where column value is lexicographically greater than the state.
 
         After filtering, update the in-memory state with new values found in the filtered DataFrame.
@@ -148,26 +392,16 @@ class StateStore:
             pd.DataFrame: The filtered DataFrame.
         """
         self.load_state(table_name, column_name)
+        state = self._states[table_name]
 
-        if self._state is None:
+        if state is None:
             self.logger.log('warning', f"No state loaded for {table_name}.{column_name}, returning unfiltered DataFrame")
             return df
 
-        if isinstance(self._state, list):
-            # Exclude rows where the column value is in the state list
-            filtered_df = df.loc[~df[column_name].isin(self._state)]
-            self.logger.log('info', f"Filtered {table_name}.{column_name} (list state), remaining rows => {filtered_df.shape[0]}")
-            new_vals = filtered_df[column_name].unique().tolist()
-            if new_vals:
-                self.update_or_add(new_vals)
-        else:
-            val = self._state
-            # Exclude rows where the column value is less than or equal to the state
-            filtered_df = df.loc[df[column_name] > val]
-            self.logger.log('info', f"Filtered {table_name}.{column_name} (scalar state), remaining rows => {filtered_df.shape[0]}")
-            if not filtered_df.empty:
-                max_new = filtered_df[column_name].max()  # Get the max value in the filtered rows
-                self.update_or_add(max_new)
+        with self._get_lock(table_name):
+            filtered_df = self._filter_state(df, table_name, column_name, state)
+        state_type = 'list' if isinstance(state, KeyIndex) else 'scalar'
+        self.logger.log('info', f"Filtered {table_name}.{column_name} ({state_type} state), remaining rows => {filtered_df.shape[0]}")
 
         # If filtering results in an empty DataFrame, raise an error
         if filtered_df.empty:
@@ -175,3 +409,71 @@ class StateStore:
             raise ValueError(f"No data left after filtering on {table_name}.{column_name}")
 
         return filtered_df
+
+    def filter_batches(self, batches, table_name, column_name):
+        """
+        Filter a stream of DataFrames (the batches of one file) based on the state for the specified table and column.
+
+        The state is loaded once and every batch is filtered against the scalar state as it was before the file,
+        so a scalar state raised by one batch does not drop the rows of the following batches.
+        The in-memory state is updated with the new values of every batch. Empty batches are skipped.
+
+        Raises:
+            ValueError: If filtering results in no rows for the whole file.
+
+        Args:
+            batches (iterable): The DataFrames to filter.
+            table_name (str): The table name.
+            column_name (str): The column name to filter on.
+
+        Yields:
+            pd.DataFrame: The filtered, non-empty batches.
+        """
+        self.load_state(table_name, column_name)
+        state = self._states[table_name]
+
+        if state is None:
+            self.logger.log('warning', f"No state loaded for {table_name}.{column_name}, returning unfiltered batches")
+
+        rows = 0
+        for df in batches:
+            if state is not None:
+                with self._get_lock(table_name):
+                    df = self._filter_state(df, table_name, column_name, state)
+            if not df.empty:
+                rows += df.shape[0]
+                yield df
+
+        self.logger.log('info', f"Filtered {table_name}.{column_name} (batches), remaining rows => {rows}")
+
+        if rows == 0:
+            self.logger.log('warning', f"Filtering on {table_name}.{column_name} resulted in empty DataFrame")
+            raise ValueError(f"No data left after filtering on {table_name}.{column_name}")
+
+    def _filter_state(self, df, table_name, column_name, state) -> pd.DataFrame:
+        """
+        Filter the DataFrame against the given state and add the new values to the in-memory state.
+
+        Args:
+            df (pd.DataFrame): The DataFrame to filter.
+            table_name (str): The table name.
+            column_name (str): The column name to filter on.
+            state (str or KeyIndex): The state to filter against.
+
+        Returns:
+            pd.DataFrame: The filtered DataFrame.
+        """
+        if isinstance(state, KeyIndex):
+            # Exclude rows where the column value is in the key index
+            filtered_df = df.loc[~state.contains(df[column_name].astype(str).values)]
+            new_vals = filtered_df[column_name].astype(str).unique().tolist()
+            if new_vals:
+                self.update_or_add(table_name, new_vals)
+        else:
+            # Exclude rows where the column value is less than or equal to the state
+            filtered_df = df.loc[df[column_name] > state]
+            if not filtered_df.empty:
+                max_new = filtered_df[column_name].max()  # Get the max value in the filtered rows
+                self.update_or_add(table_name, max_new)
+
+        return filtered_df
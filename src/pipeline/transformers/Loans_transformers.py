@@ -3,38 +3,33 @@ from .transformer import Transformer
 from pipeline.encryptors.encryptor import Encryptor
 
 class LoanTransformers(Transformer):
-    def __init__(self, logger, english_path: str):
+    def __init__(self, logger, english_path: str, plan):
+        """
+        Transform the loan data: age (days since the utilization date), total_cost = amount_utilized * 0.20 + 1000
+        and the encrypted loan_reason.
+
+        :param plan: TransformPlan of the loans table.
+        """
         self.logger = logger
         self.Encryptor = Encryptor(english_path)
+        self.plan = plan
         self.file = 'loan_data'
 
-    def transform(self, df) -> pd.DataFrame:
-        """
-        Transform the loan data.
-        """
-        try:
-            df = self.calculate_age(df, 'utilization_date')
-            df = self.calculate_total_cost(df)
-            df = self.encrypt_loan_reason(df)
-            df = self.add_quality(df)
-            df = self.conver_to_date(df, ['utilization_date', 'partition_date'])
-            
-            return df
-        except Exception as e:
-            self.logger.log('error', f'Error during transformation: {self.file}')
-            raise Exception(f"{self.file} Transformation Failed")
-    
-    def calculate_total_cost(self, df: pd.DataFrame) -> pd.DataFrame:
-        """
-        Calculate the 'total_cost' column based on the 'amount_utilized'
-        """
-        df['total_cost'] = df['amount_utilized'] * 0.20 + 1000
-        return df
-    
-    def encrypt_loan_reason(self, df: pd.DataFrame) -> pd.DataFrame:
+    def transform(self, df, encryption_key: int = None) -> pd.DataFrame:
+        """
+        Transform the loan data, encrypting the loan reasons with encryption_key (a random one when None).
+        """
+        return super().transform(df, encryption_key=encryption_key)
+
+    def get_file_arguments(self) -> dict:
+        """
+        Encrypt every batch or chunk of a file with the same key.
+        """
+        return {'encryption_key': self.Encryptor.generate_random_key()}
+
+    def encrypt_loan_reason(self, df: pd.DataFrame, encryption_key: int = None) -> pd.DataFrame:
         """
         Encrypt the 'loan_reason' column using the Encryptor's encrypt method.
         """
-        df = self.Encryptor.encrypt(df, 'loan_reason') 
+        df = self.Encryptor.encrypt(df, 'loan_reason', encryption_key) 
         return df
-
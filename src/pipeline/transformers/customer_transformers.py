@@ -1,50 +1,14 @@
-import pandas as pd
 from .transformer import Transformer
 
 
 class CustomerTransformers(Transformer):
-    def __init__(self, logger):
-        self.logger = logger
-        self.file = 'customer_data'
-
-    def transform(self, df) -> pd.DataFrame:
-        """
-        Transform the customer data.
-        """
-        try:
-            df = self.add_tenure(df)
-            df = self.categorize_customer_segment(df)
-            df = self.add_quality(df)
-            df = self.conver_to_date(df, ['account_open_date', 'partition_date'])
-            
-            return df
-        except Exception as e:
-            self.logger.log('error', f'Error during transformation: {self.file}')
-            raise Exception(f"{self.file} Transformation Failed")
-
-    def add_tenure(self, df: pd.DataFrame) -> pd.DataFrame:
-        """
-        Add a new column 'tenure' which is the difference in years between the current date
-        and the account open date.
+    def __init__(self, logger, plan):
         """
-        df['account_open_date'] = pd.to_datetime(df['account_open_date'])
-        df['tenure'] = (pd.to_datetime('today').year - df['account_open_date'].dt.year)
-        return df
+        Transform the customer data: tenure (years since the account open date) and customer_segment,
+        'Loyal' (tenure > 5), 'Newcomer' (tenure < 1) or 'Normal'.
 
-    def categorize_customer_segment(self, df: pd.DataFrame) -> pd.DataFrame:
+        :param plan: TransformPlan of the customer_profiles table.
         """
-        Categorize customers into 'Loyal', 'Newcomer', or 'Normal' based on their tenure.
-        """
-        df['customer_segment'] = df['tenure'].apply(self.categorize_customer)
-        return df
-
-    def categorize_customer(self, tenure: int) -> str:
-        """
-        Classify customers based on their tenure.
-        """
-        if tenure > 5:
-            return 'Loyal'
-        elif tenure < 1:
-            return 'Newcomer'
-        else:
-            return 'Normal'
+        self.logger = logger
+        self.plan = plan
+        self.file = 'customer_data'
@@ -1,39 +1,14 @@
-import pandas as pd
 from .transformer import Transformer
 
 
 class MoneyTransformers(Transformer):
-    def __init__(self, logger):
-        self.logger = logger
-        self.file = 'money_data'
-
-    def transform(self, df) -> pd.DataFrame:
+    def __init__(self, logger, plan):
         """
-        Apply transformations to the transaction data.
-        """
-        try:
-            df = self.add_cost_column(df)
-            df = self.add_total_amount_column(df)
-            df = self.add_quality(df)
-            df = self.conver_to_date(df, ['transaction_date', 'partition_date'])
-
-            return df
-        except Exception as e:
-            self.logger.log('error', f'Error during transformation: {self.file}')
-            raise Exception(f"{self.file} Transformation Failed")
+        Transform the transaction data: cost (50 cents + 0.1% of the transaction amount)
+        and total_amount = transaction_amount + cost.
 
-    def add_cost_column(self, df: pd.DataFrame) -> pd.DataFrame:
-        """
-        Add a new float column 'cost' representing the cost of the transaction.
-        The cost is 50 cents + 0.1% of the transaction amount.
+        :param plan: TransformPlan of the transactions table.
         """
-        df['cost'] = 0.50 + (df['transaction_amount'] * 0.001)
-        return df
-
-    def add_total_amount_column(self, df: pd.DataFrame) -> pd.DataFrame:
-        """
-        Add a new float column 'total_amount', calculated as: 
-        total_amount = transaction_amount + cost
-        """
-        df['total_amount'] = df['transaction_amount'] + df['cost']
-        return df
+        self.logger = logger
+        self.plan = plan
+        self.file = 'money_data'
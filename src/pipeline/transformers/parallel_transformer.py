@@ -0,0 +1,271 @@
+import os
+import glob
+import time
+import uuid
+import tempfile
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+import pyarrow as pa
+
+# Transformers of the pool processes, inherited from the pipeline when they are forked
+TRANSFORMERS = {}
+
+# Directory of the chunks exchanged with the pool: the shared memory of Linux, or the temporary directory
+CHUNK_DIR = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+
+
+def get_chunk_pattern(owner: int) -> str:
+    """
+    Glob pattern of the chunk files of the pool owned by the process owner.
+    """
+    return os.path.join(CHUNK_DIR, f'etl-chunk-{owner}-*.arrow')
+
+
+def write_chunk(df: pd.DataFrame, owner: int) -> str:
+    """
+    Write a DataFrame as an Arrow IPC file in the chunk directory and return its path.
+
+    :param owner: pid of the process owning the pool, in the name of the file so its leftovers can be deleted.
+    """
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    path = get_chunk_pattern(owner).replace('*', uuid.uuid4().hex)
+    with pa.OSFile(path, 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    return path
+
+
+def read_chunk(path: str, dtypes: dict) -> pd.DataFrame:
+    """
+    Read a chunk written by write_chunk with the dtypes of the DataFrame written and delete its file.
+    The file is memory-mapped, so the Arrow-backed columns keep pointing to the shared pages instead of being copied.
+    """
+    try:
+        table = pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+    finally:
+        os.remove(path)  # the pages stay mapped until the columns are released
+
+    arrow_types = {dtype.pyarrow_dtype: dtype for dtype in dtypes.values() if isinstance(dtype, pd.ArrowDtype)}
+    df = table.to_pandas(types_mapper=arrow_types.get)
+    mismatched = {name: dtype for name, dtype in dtypes.items() if df[name].dtype != dtype}
+    return df.astype(mismatched) if mismatched else df
+
+
+def transform_chunk(file_type: str, path: str, dtypes: dict, arguments: dict) -> tuple:
+    """
+    Transform a chunk in a pool process.
+
+    :return: (path, dtypes) of the transformed chunk and the CPU seconds the process spent on it.
+    """
+    cpu = time.process_time()
+    df = TRANSFORMERS[file_type].transform(read_chunk(path, dtypes), **arguments)
+    # the pool processes are the children of the process owning the pool
+    return write_chunk(df, os.getppid()), df.dtypes.to_dict(), time.process_time() - cpu
+
+
+def init_worker(transformers: dict) -> None:
+    """
+    Initializer of the pool processes.
+    """
+    TRANSFORMERS.update(transformers)
+
+
+class ParallelTransformer:
+    def __init__(self, logger, transformers: dict, workers: int, min_rows: int = 100000):
+        """
+        Transforms the large DataFrames on several cores: the rows are split into one chunk per worker,
+        the chunks are transformed by a pool of forked processes and put back together in order.
+        The chunks go to and from the pool as Arrow IPC files in shared memory instead of being pickled.
+        The arguments shared by a file (e.g. the encryption key of the loans) are drawn once
+        by the transformer and passed to every chunk.
+
+        The pool is forked by start() when the pipeline is created, before the threads of the pipeline
+        (notifier sender, state checkpoints, file monitor workers) start, so no process inherits a lock
+        held by one of them. The listener threads of the Logger are already running: the locks they take
+        are reset in the forked processes, LISTENERS_LOCK by the logger module and the handler locks by logging.
+        The CPU time of the pool processes is added to the worker_cpu_seconds of the transform stage,
+        the cpu_seconds of a stage being the CPU time of the thread running it.
+
+        Arrow-backed DataFrames (arrow mode) cross the pool at little cost, while the object columns
+        of the pandas mode are converted to and from Arrow, which costs about as much as a light transform.
+
+        :param logger: Logger instance to log messages.
+        :param transformers: Transformers of the tables (see Pipeline.transformers).
+        :param workers: Number of pool processes.
+        :param min_rows: Smallest DataFrame split across the pool, the smaller ones are transformed in process.
+        """
+        self.logger = logger
+        self.transformers = transformers
+        self.workers = workers
+        self.min_rows = min_rows
+
+        self.executor = None       # pool of the transform processes
+        self._executor_pid = None  # process owning the pool (the pipeline may run in forked workers)
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        """
+        Fork the pool processes now, when it can be used.
+        """
+        if self.is_available():
+            # a fork pool launches all its processes on the first task
+            self.get_executor().submit(os.getpid).result()
+
+    def get_executor(self) -> ProcessPoolExecutor:
+        """
+        Return the pool of the current process, starting it on first use when start() was not called
+        (e.g. in a process forked from the pipeline).
+        """
+        with self._lock:
+            if self._executor_pid != os.getpid():
+                # Fork so the processes inherit the transformers and the dictionary of the encryptor
+                self.executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                    mp_context=multiprocessing.get_context('fork'),
+                                                    initializer=init_worker, initargs=(self.transformers,))
+                self._executor_pid = os.getpid()
+            return self.executor
+
+    def shutdown(self) -> None:
+        """
+        Stop the pool of the current process, cancelling the chunks not started yet,
+        then delete the chunk files left by the cancelled chunks and the results never read.
+        """
+        with self._lock:
+            if self._executor_pid != os.getpid():
+                return  # no pool, or the pool of the parent of a forked process
+            executor, self.executor, self._executor_pid = self.executor, None, None
+        executor.shutdown(wait=True, cancel_futures=True)
+        for path in glob.glob(get_chunk_pattern(os.getpid())):
+            os.remove(path)
+
+    def submit(self, file_type: str, df: pd.DataFrame, arguments: dict):
+        """
+        Write the chunk to shared memory and submit its transformation to the pool.
+        """
+        path = write_chunk(df, os.getpid())
+        try:
+            return self.get_executor().submit(transform_chunk, file_type, path, df.dtypes.to_dict(), arguments)
+        except Exception:
+            os.remove(path)
+            raise
+
+    def transform(self, df: pd.DataFrame, file_type: str, stage=None) -> pd.DataFrame:
+        """
+        Transform the DataFrame with the transformer of the table, in chunks across the pool when it is large enough.
+
+        :param stage: StageMetrics of the transform, receiving the CPU time of the pool processes.
+        """
+        transformer = self.transformers[file_type]
+        arguments = transformer.get_file_arguments()
+        if df.shape[0] < self.min_rows or not self.is_available():
+            return transformer.transform(df, **arguments)
+
+        bounds = [df.shape[0] * index // self.workers for index in range(self.workers + 1)]
+        futures = []
+        try:
+            for start, end in zip(bounds, bounds[1:]):
+                futures.append(self.submit(file_type, df.iloc[start:end], arguments))
+        except Exception as e:
+            # e.g. a column of mixed types that Arrow cannot hold
+            self.discard(futures)
+            self.logger.log('warning', "Parallel transform failed for %s, transforming in process: %s", file_type, e)
+            return transformer.transform(df, **arguments)
+
+        chunks = self.collect(futures, stage)
+        self.logger.log('info', "Transformed %s rows of %s in %s chunks", df.shape[0], file_type, len(chunks))
+        result = pd.concat(chunks, ignore_index=True)
+        result.index = df.index
+        return result
+
+    def transform_batches(self, batches, file_type: str, stage=None):
+        """
+        Transform a stream of DataFrames (the batches of one file) across the pool, one batch per chunk,
+        keeping up to one batch per worker in flight and yielding the results in order.
+
+        :param stage: StageMetrics of the transform, receiving the CPU time of the pool processes.
+        """
+        transformer = self.transformers[file_type]
+        if not self.is_available():
+            yield from transformer.transform_batches(batches)
+            return
+
+        arguments = transformer.get_file_arguments()
+        futures = deque()  # (future, index of the batch)
+        try:
+            for df in batches:
+                future = None
+                if df.shape[0] >= self.min_rows:
+                    try:
+                        future = self.submit(file_type, df, arguments)
+                    except Exception as e:
+                        self.logger.log('warning', "Parallel transform failed for a batch of %s, transforming it "
+                                                   "in process: %s", file_type, e)
+                if future is None:
+                    # the small batches are transformed in process, after the batches before them
+                    while futures:
+                        yield self.get_result(*futures.popleft(), stage)
+                    yield transformer.transform(df, **arguments)
+                    continue
+
+                futures.append((future, df.index))
+                if len(futures) >= self.workers:
+                    yield self.get_result(*futures.popleft(), stage)
+            while futures:
+                yield self.get_result(*futures.popleft(), stage)
+        finally:
+            self.discard([future for future, _ in futures])
+
+    def is_available(self) -> bool:
+        """
+        Check whether the pool can be used: more than one worker, outside a daemonic process
+        (e.g. the process workers of the file monitor) that cannot start child processes.
+        """
+        return self.workers > 1 and not multiprocessing.current_process().daemon
+
+    @staticmethod
+    def read_result(future, stage=None) -> pd.DataFrame:
+        """
+        Read the transformed chunk of a future and add the CPU time of its process to the stage.
+        """
+        path, dtypes, cpu_seconds = future.result()
+        if stage is not None:
+            stage.worker_cpu_seconds += cpu_seconds
+        return read_chunk(path, dtypes)
+
+    def get_result(self, future, index, stage=None) -> pd.DataFrame:
+        """
+        Read the transformed chunk of a future, with the index of the original rows.
+        """
+        df = self.read_result(future, stage)
+        df.index = index
+        return df
+
+    def collect(self, futures, stage=None) -> list:
+        """
+        Read the transformed chunks in order, waiting for all of them so their files are deleted
+        even when one failed, and raise the first failure.
+        """
+        chunks, error = [], None
+        for future in futures:
+            try:
+                chunks.append(self.read_result(future, stage))
+            except Exception as e:
+                error = error or e
+        if error:
+            raise error
+        return chunks
+
+    @staticmethod
+    def discard(futures) -> None:
+        """
+        Wait for the chunks that will not be read and delete their files.
+        """
+        for future in futures:
+            try:
+                os.remove(future.result()[0])
+            except Exception:
+                pass
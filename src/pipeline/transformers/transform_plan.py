@@ -0,0 +1,172 @@
+import re
+import json
+import numpy as np
+import pandas as pd
+
+try:
+    import numexpr
+except ImportError:  # the expressions are then evaluated with pandas operations
+    numexpr = None
+
+# Operations of the steps that are not expressions
+OPERATIONS = {'datetime', 'days_between', 'days_since', 'years_since', 'select', 'method'}
+
+
+class TransformPlan:
+    def __init__(self, table: str, steps: list, dates: list):
+        """
+        Compiled plan of the derived columns of a table.
+
+        Steps, evaluated in order, each one setting `column`:
+            expr    numeric or boolean expression of the columns (+ - * / ** == != < <= > >= & | ~),
+                    e.g. "amount_due - amount_paid"
+            op      datetime      parse `source` (default: the column itself) as datetimes, with an optional `format`
+                    days_between  days from args[1] to args[0]
+                    days_since    days from `source` to now
+                    years_since   calendar years from `source` to now
+                    select        first value of `cases` ([[condition, value], ...]) whose condition holds, else `default`
+                    method        call the transformer method `method`(df, **kwargs), which sets the column
+        A step with "keep": false is an intermediate column: it is inlined in the expressions using it or kept
+        aside for the other steps using it, never added to the DataFrame, and not computed at all when nothing uses it.
+
+        The expressions are compiled once. On numeric NumPy columns numexpr evaluates every expression,
+        intermediate columns inlined, in a single pass without temporaries; Arrow-backed columns and
+        installs without numexpr use the pandas operations.
+
+        :param table: Name of the table.
+        :param steps: Steps of the plan, as in the plans file.
+        :param dates: Columns converted to dates after the plan, like Transformer.conver_to_date.
+        """
+        self.table = table
+        self.dates = dates
+        self.steps = self.compile(steps)
+
+    @classmethod
+    def load(cls, plans_file: str) -> dict:
+        """
+        Load and compile the plans of every table from a JSON file.
+
+        :return: Dict of table -> TransformPlan.
+        """
+        with open(plans_file, 'r') as file:
+            plans = json.load(file)
+        return {table: cls(table, plan['steps'], plan.get('dates', [])) for table, plan in plans.items()}
+
+    def compile_expression(self, expr: str, column: str) -> tuple:
+        """
+        Compile an expression.
+
+        :return: (expression, code object, names of the columns read).
+        """
+        try:
+            code = compile(expr, f'<{self.table}.{column}>', 'eval')
+        except SyntaxError as e:
+            raise ValueError(f"{self.table}: invalid expression of {column}: {expr}") from e
+        return expr, code, code.co_names
+
+    def get_inputs(self, step: dict) -> set:
+        """
+        Columns read by a step.
+        """
+        if 'expr' in step:
+            expressions = [step['expr']]
+        elif step['op'] == 'select':
+            expressions = [condition for condition, _ in step['cases']]
+        else:
+            return set(step.get('args', [step.get('source', step['column'])]))
+        return {name for expr in expressions for name in self.compile_expression(expr, step['column'])[2]}
+
+    def compile(self, steps: list) -> list:
+        """
+        Check the steps, prune the unused intermediate columns, inline the intermediate expressions
+        read by expressions only and compile the expressions.
+
+        :return: The steps to evaluate, in order.
+        """
+        for step in steps:
+            if 'expr' not in step and step.get('op') not in OPERATIONS:
+                raise ValueError(f"{self.table}: unknown operation {step.get('op')} of {step['column']}")
+
+        inputs = [self.get_inputs(step) for step in steps]
+        readers = {step['column']: [i for i in range(index + 1, len(steps)) if step['column'] in inputs[i]]
+                   for index, step in enumerate(steps)}
+
+        compiled, inlined = [], {}
+        for index, step in enumerate(steps):
+            keep = step.get('keep', True)
+            if not keep and not readers[step['column']] and step.get('op') != 'method':
+                continue  # dead column
+
+            if 'expr' in step:
+                expr = step['expr']
+                for name, replacement in inlined.items():
+                    expr = re.sub(rf'\b{name}\b', f'({replacement})', expr)
+                if not keep and all('expr' in steps[i] for i in readers[step['column']]):
+                    inlined[step['column']] = expr
+                    continue
+                step = {**step, 'expr': self.compile_expression(expr, step['column'])}
+            else:
+                if any(name in inlined for name in inputs[index]):
+                    raise ValueError(f"{self.table}: {step['column']} reads an inlined column")
+                if step['op'] == 'select':
+                    step = {**step, 'cases': [(self.compile_expression(condition, step['column']), value)
+                                              for condition, value in step['cases']]}
+            compiled.append(step)
+        return compiled
+
+    @staticmethod
+    def evaluate_expression(expression: tuple, get):
+        """
+        Evaluate a compiled expression on the columns returned by get(name).
+        """
+        expr, code, names = expression
+        columns = {name: get(name) for name in names}
+        if numexpr is not None and all(isinstance(values.dtype, np.dtype) and values.dtype.kind in 'biuf'
+                                       for values in columns.values()):
+            return numexpr.evaluate(expr, local_dict={name: values.to_numpy() for name, values in columns.items()})
+        return eval(code, {'__builtins__': {}}, columns)
+
+    def evaluate(self, df: pd.DataFrame, transformer, **kwargs) -> pd.DataFrame:
+        """
+        Add the columns of the plan to the DataFrame.
+
+        :param transformer: Transformer of the table, whose methods are called by the method steps.
+        :param kwargs: Arguments of the method steps (e.g. encryption_key).
+        """
+        now = pd.Timestamp.now()
+        scratch = {}  # values of the intermediate columns
+
+        def get(column):
+            return scratch[column] if column in scratch else df[column]
+
+        for step in self.steps:
+            op = 'expr' if 'expr' in step else step['op']
+            if op == 'method':
+                df = getattr(transformer, step['method'])(df, **kwargs)
+                continue
+
+            if op == 'expr':
+                values = self.evaluate_expression(step['expr'], get)
+            elif op == 'datetime':
+                source = get(step.get('source', step['column']))
+                values = (pd.to_datetime(source, format=step['format']) if 'format' in step
+                          else transformer.to_datetime(source))
+            elif op == 'days_between':
+                end, start = step['args']
+                values = (get(end) - get(start)).dt.days
+            elif op == 'days_since':
+                values = (now - get(step['source'])).dt.days
+            elif op == 'years_since':
+                values = now.year - get(step['source']).dt.year
+            else:
+                # a missing value does not meet the condition
+                conditions = [np.asarray(pd.Series(self.evaluate_expression(condition, get)).fillna(False), dtype=bool)
+                              for condition, _ in step['cases']]
+                choices = [value for _, value in step['cases']]
+                values = np.select(conditions, choices, default=step['default']).astype(object)
+
+            if step.get('keep', True):
+                df[step['column']] = values
+            else:
+                scratch[step['column']] = pd.Series(values, index=df.index)
+        return df
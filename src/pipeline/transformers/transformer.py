@@ -1,10 +1,31 @@
 import pandas as pd
+import pyarrow as pa
 from datetime import datetime
 
+# Type of the date columns, written to parquet as DATE
+DATE32 = pd.ArrowDtype(pa.date32())
+
 class Transformer():
     def __init__(self):
         pass
-        
+
+    def transform(self, df, **kwargs) -> pd.DataFrame:
+        """
+        Transform the data: add the derived columns of the plan of the table (see TransformPlan)
+        and the quality columns, then convert the date columns.
+
+        :param kwargs: Arguments of the transformer methods called by the plan.
+        """
+        try:
+            df = self.plan.evaluate(df, self, **kwargs)
+            df = self.add_quality(df)
+            df = self.conver_to_date(df, self.plan.dates)
+
+            return df
+        except Exception as e:
+            self.logger.log('error', f'Error during transformation: {self.file}')
+            raise Exception(f"{self.file} Transformation Failed")
+
     def add_quality(self, df) -> pd.DataFrame:
         """
         add_quality function to add quality column to the dataframe
@@ -14,21 +35,55 @@ class Transformer():
         df['partition_date'] = datetime.now().strftime('%Y-%m-%d')  # Format as YYYY-MM-DD
 
         df['partition_hour'] = datetime.now().hour  
+
+        if self.is_arrow(df):
+            # Keep the added columns Arrow-backed like the rest of the frame
+            df = df.astype({'processing_time': pd.ArrowDtype(pa.string()),
+                            'partition_date': pd.ArrowDtype(pa.string()),
+                            'partition_hour': pd.ArrowDtype(pa.int64())})
     
         return df
     
     def conver_to_date(self, df, columns) -> pd.DataFrame:
         """
-        convert_to_datetime function to convert columns to datetime
+        convert_to_date function to convert columns to Arrow date32, written to parquet as DATE
+        without a round-trip through Python datetime.date objects
         """
         for column in columns:
-            # df[column] =  df[column].astype(str)
-            df[column] = pd.to_datetime(df[column], format='%Y-%m-%d', errors='coerce').dt.date
+            if df[column].dtype != DATE32:
+                # the time of day of datetimes is truncated
+                df[column] = self.to_datetime(df[column]).astype(DATE32)
         return df
+
+    @staticmethod
+    def to_datetime(values) -> pd.Series:
+        """
+        Return the values as a datetime64 Series, parsing ISO dates and datetimes only when they are not
+        parsed already (by the readers or a previous step); invalid values become NaT.
+        """
+        if isinstance(values.dtype, pd.ArrowDtype) and pa.types.is_timestamp(values.dtype.pyarrow_dtype):
+            return values.astype('datetime64[ns]')
+        if pd.api.types.is_datetime64_any_dtype(values.dtype):
+            return values
+        return pd.to_datetime(values, format='ISO8601', errors='coerce')
+
+    @staticmethod
+    def is_arrow(df) -> bool:
+        """
+        Check whether the DataFrame is Arrow-backed (read in arrow mode).
+        """
+        return any(isinstance(dtype, pd.ArrowDtype) for dtype in df.dtypes)
     
-    def calculate_age(self, df: pd.DataFrame, date_column: str ) -> pd.DataFrame:
+    def get_file_arguments(self) -> dict:
+        """
+        Arguments of transform() shared by every batch or chunk of a file, e.g. the encryption key of the loans.
+        """
+        return {}
+
+    def transform_batches(self, batches):
         """
-        Calculate the age (days since specific date).
+        Transform a stream of DataFrames (the batches of one file) one batch at a time.
         """
-        df['age'] = (pd.to_datetime('today') - pd.to_datetime(df[date_column])).dt.days
-        return df
\ No newline at end of file
+        arguments = self.get_file_arguments()
+        for df in batches:
+            yield self.transform(df, **arguments)
@@ -0,0 +1,242 @@
+import os
+import json
+import operator
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from pipeline.validators.schema_validator import ARROW_TYPES
+
+# Operators allowed in the comparison rules
+COMPARISONS = {
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    '==': operator.eq,
+    '!=': operator.ne
+}
+
+class QualityChecker:
+    def __init__(self, logger, rules_file: str, schemas: dict, quarantine_dir: str):
+        """
+        Initialize the QualityChecker by reading the row-level rules from a JSON file.
+
+        Rules of a table:
+            not_null     columns that must have a value
+            patterns     column -> regular expression the whole value must match
+            ranges       column -> [min, max], inclusive, null for no bound
+            values       column -> list of allowed values
+            comparisons  list of [column, operator, column], e.g. ["amount_paid", "<=", "amount_due"]
+
+        :param logger: Logger instance to log messages.
+        :param rules_file: JSON file holding the rules of every table.
+        :param schemas: Schemas of the tables (see SchemaValidator), used to coerce the mistyped columns.
+        :param quarantine_dir: Directory of the quarantine parquet files, one sub-directory per table.
+        """
+        with open(rules_file, 'r') as file:
+            self.rules = json.load(file)
+        self.logger = logger
+        self.schemas = schemas
+        self.quarantine_dir = quarantine_dir
+
+    def get_coerced_columns(self, file: str) -> list:
+        """
+        Numeric and datetime columns of the schema coerced by check, when the table has rules: the readers do not
+        force their type (see SchemaValidator.get_reader_options), so a value like "abc" or "12,5" only fails its row.
+        """
+        if not self.rules.get(file):
+            return []
+        return [column for column, dtype in (self.schemas.get(file) or {}).items()
+                if dtype in ('int', 'float', 'datetime')]
+
+    def check(self, df: pd.DataFrame, file: str, file_name: str) -> pd.DataFrame:
+        """
+        Check the rows of the DataFrame against the rules of the table and return the passing rows.
+        The failing rows are written to the quarantine of the table with their reason codes.
+        """
+        df, rejected = self.split(df, file)
+        if not rejected.empty:
+            self.quarantine(rejected, file, file_name)
+        return df
+
+    def check_batches(self, batches, file: str, file_name: str):
+        """
+        Check a stream of DataFrames (the batches of one file) and yield the passing rows of every batch.
+        The failing rows of all the batches are written to a single quarantine file at the end.
+        """
+        rejected_batches = []
+        for df in batches:
+            df, rejected = self.split(df, file)
+            if not rejected.empty:
+                rejected_batches.append(rejected)
+            if not df.empty:
+                yield df
+        if rejected_batches:
+            self.quarantine(pd.concat(rejected_batches, ignore_index=True), file, file_name)
+
+    def split(self, df: pd.DataFrame, file: str) -> tuple:
+        """
+        Split the DataFrame into the rows passing every rule and the failing ones.
+        Numeric and datetime columns left mistyped by the reader (e.g. integers with missing values read as
+        floats, or a stray string) are coerced, the values that cannot be converted failing the row
+        (as well as the fractional values of the integer columns).
+
+        :return: (passing rows, failing rows with their original values and a quality_reason column)
+        """
+        rules = self.rules.get(file)
+        if not rules:
+            return df, df.iloc[0:0]
+
+        original = df
+        df = df.copy()
+        checks = []  # (reason code, boolean mask of the failing rows)
+
+        # Coerce the mistyped columns of the schema
+        for column, dtype in (self.schemas.get(file) or {}).items():
+            if column not in df.columns:
+                continue
+            if dtype in ('int', 'float'):
+                coerced, mistyped = self.coerce_numeric(df[column], dtype)
+                if mistyped is None:
+                    df[column] = coerced
+                    continue
+            elif dtype == 'datetime' and not pd.api.types.is_datetime64_any_dtype(df[column].dtype):
+                coerced, mistyped = self.coerce_datetime(df[column])
+            else:
+                continue
+            checks.append((f'type:{column}', mistyped))
+            df[column] = coerced
+
+        for column in rules.get('not_null', []):
+            if column in df.columns:
+                checks.append((f'null:{column}', df[column].isna()))
+
+        for column, pattern in rules.get('patterns', {}).items():
+            if column in df.columns:
+                values = df[column]
+                text = values if pd.api.types.is_string_dtype(values.dtype) else values.astype(str)
+                matches = text.str.fullmatch(pattern, na=False).astype(bool)
+                checks.append((f'pattern:{column}', values.notna() & ~matches))
+
+        for column, (low, high) in rules.get('ranges', {}).items():
+            if column in df.columns:
+                values = df[column]
+                failing = pd.Series(False, index=df.index)
+                if low is not None:
+                    failing |= (values < low).fillna(False).astype(bool)
+                if high is not None:
+                    failing |= (values > high).fillna(False).astype(bool)
+                checks.append((f'range:{column}', failing))
+
+        for column, allowed in rules.get('values', {}).items():
+            if column in df.columns:
+                checks.append((f'value:{column}', df[column].notna() & ~df[column].isin(allowed)))
+
+        for left, op, right in rules.get('comparisons', []):
+            if left in df.columns and right in df.columns:
+                # a missing value does not fail the comparison (NaN compares False)
+                passing = (COMPARISONS[op](df[left], df[right]).fillna(True).astype(bool)
+                           | df[left].isna() | df[right].isna())
+                checks.append((f'compare:{left}{op}{right}', ~passing))
+
+        failing = np.zeros(len(df), dtype=bool)
+        for _, mask in checks:
+            failing |= mask.to_numpy(dtype=bool)
+
+        if not failing.any():
+            return self.restore_integers(df, file), original.iloc[0:0]
+
+        # Reason codes of the failing rows, separated by ';'
+        reasons = pd.Series('', index=df.index[failing])
+        for code, mask in checks:
+            mask = mask.to_numpy(dtype=bool)[failing]
+            if mask.any():
+                reasons[mask] += code + ';'
+
+        rejected = original.loc[failing].copy()
+        rejected['quality_reason'] = reasons.str.rstrip(';')
+        return self.restore_integers(df.loc[~failing].copy(), file), rejected
+
+    @staticmethod
+    def coerce_numeric(values: pd.Series, dtype: str) -> tuple:
+        """
+        Coerce a column whose type was inferred by the reader to the numeric type of the schema
+        ('int' or 'float'), keeping Arrow-backed columns Arrow-backed.
+
+        :return: (coerced values, mask of the values that cannot be converted or None when every value converts)
+        """
+        arrow = isinstance(values.dtype, pd.ArrowDtype)
+        is_typed = pd.api.types.is_float_dtype if dtype == 'float' else pd.api.types.is_integer_dtype
+        if is_typed(values.dtype):
+            return values, None
+        if dtype == 'float' and pd.api.types.is_numeric_dtype(values.dtype):
+            # a float column of round values inferred as integers
+            return values.astype(pd.ArrowDtype(ARROW_TYPES['float']) if arrow else 'float64'), None
+
+        missing = values.isna()
+        if pd.api.types.is_numeric_dtype(values.dtype):
+            numbers = values.astype('float64')  # integers with missing values read as floats
+        else:
+            numbers = pd.to_numeric(values.astype(object), errors='coerce').astype('float64')
+            missing |= (values == '').fillna(False).astype(bool)  # empty fields of the Arrow strings
+        mistyped = ~missing & numbers.isna()
+        if dtype == 'int':
+            mistyped |= (numbers != numbers.round()) & numbers.notna()
+        numbers = numbers.mask(mistyped)
+
+        if arrow:
+            return numbers.astype(pd.ArrowDtype(ARROW_TYPES[dtype])), mistyped
+        return numbers, mistyped  # the integers are restored by restore_integers once the failing rows are removed
+
+    @staticmethod
+    def coerce_datetime(values: pd.Series) -> tuple:
+        """
+        Coerce a column of datetime strings to datetimes. Arrow strings are cast by Arrow,
+        the slower pandas parsing only running when a value is invalid.
+
+        :return: (coerced values, mask of the values that cannot be parsed)
+        """
+        if not isinstance(values.dtype, pd.ArrowDtype):
+            coerced = pd.to_datetime(values, errors='coerce')
+            return coerced, values.notna() & coerced.isna()
+
+        arrow_dtype = pd.ArrowDtype(ARROW_TYPES['datetime'])
+        try:
+            return values.astype(arrow_dtype), pd.Series(False, index=values.index)
+        except (pa.ArrowInvalid, ValueError):
+            coerced = pd.to_datetime(values.astype(object), errors='coerce').astype(arrow_dtype)
+            missing = values.isna() | (values == '').fillna(False).astype(bool)  # empty fields of the Arrow strings
+            return coerced, ~missing & coerced.isna()
+
+    def restore_integers(self, df: pd.DataFrame, file: str) -> pd.DataFrame:
+        """
+        Cast back to int64 the integer columns of the schema read as floats because of missing values,
+        once the rows holding them are removed.
+        """
+        for column, dtype in (self.schemas.get(file) or {}).items():
+            if dtype == 'int' and column in df.columns and pd.api.types.is_float_dtype(df[column].dtype):
+                values = df[column]
+                if values.notna().all() and (values == values.round()).all():
+                    df[column] = values.astype('int64')
+        return df
+
+    def quarantine(self, rejected: pd.DataFrame, file: str, file_name: str) -> None:
+        """
+        Write the failing rows to <quarantine_dir>/<table>/<file_name>.parquet.
+        Mixed-type columns are written as strings so the original values are kept.
+        """
+        directory = os.path.join(self.quarantine_dir, file)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{file_name}.parquet")
+
+        rejected = rejected.copy()
+        for column in rejected.columns:
+            if rejected[column].dtype == 'object':
+                values = rejected[column]
+                rejected[column] = values.where(values.isna(), values.astype(str))
+
+        rejected.to_parquet(path, index=False)
+
+        reasons = rejected['quality_reason'].str.split(';').explode().value_counts().to_dict()
+        self.logger.log('warning', f"Quarantined {rejected.shape[0]} rows of {file} to {path}: {reasons}")
@@ -1,6 +1,24 @@
 import pandas as pd
+import pyarrow as pa
 import json
 
+# pyarrow types the readers use for the schema types in arrow mode
+ARROW_TYPES = {
+    'str': pa.string(),
+    'int': pa.int64(),
+    'float': pa.float64(),
+    'datetime': pa.timestamp('ns')
+}
+
+# dtypes the pandas readers use for the schema types, integers are inferred (and checked) so a missing
+# value is reported instead of failing the read, datetimes are given to parse_dates.
+# The numeric columns coerced by the QualityChecker are always inferred, so a stray value is quarantined
+# with its row instead of failing the read of the whole file
+PANDAS_DTYPES = {
+    'str': 'object',
+    'float': 'float64'
+}
+
 class SchemaValidator:
     def __init__(self, logger, schema_file: str):
         """
@@ -11,6 +29,7 @@ class SchemaValidator:
         self.logger = logger
         self.file = None
         self.df = None
+        self.reader_options = {}  # (file, arrow) -> compiled reader options
 
     def get_schema(self, file: str) -> dict:
         """
@@ -18,10 +37,40 @@ class SchemaValidator:
         """
         return self.schemas.get(file)
 
+    def get_reader_options(self, file: str, arrow: bool = False, inferred: list = ()) -> dict:
+        """
+        Compile the schema of a given file into the options of the extractors, so every column is read
+        with its type and parsed exactly once (e.g. no dates inferred from ISO date strings, no integers
+        from round floats, datetimes parsed by the reader), and validation only checks the dtypes.
+
+        :param arrow: Compile for the Arrow readers (column_types) instead of the pandas ones (dtype, parse_dates).
+        :param inferred: Columns coerced after the read by the QualityChecker (see get_coerced_columns): a numeric
+                         column has its type inferred by the reader, a datetime column is parsed by the pandas
+                         readers (which leave a bad value unparsed) and read as strings by the Arrow readers.
+        """
+        key = (file, arrow, tuple(inferred))
+        if key not in self.reader_options:
+            schema = self.get_schema(file) or {}
+            if arrow:
+                column_types = {}
+                for column, dtype in schema.items():
+                    if column in inferred:
+                        if dtype == 'datetime':
+                            column_types[column] = pa.string()
+                    elif dtype in ARROW_TYPES:
+                        column_types[column] = ARROW_TYPES[dtype]
+                options = {'column_types': column_types}
+            else:
+                options = {'dtype': {column: PANDAS_DTYPES[dtype] for column, dtype in schema.items()
+                                     if dtype in PANDAS_DTYPES and column not in inferred},
+                           'parse_dates': [column for column, dtype in schema.items() if dtype == 'datetime']}
+            self.reader_options[key] = options
+        return self.reader_options[key]
+
     def validate(self, df: pd.DataFrame, file: str) -> None:
         """
-        Validate the schema of the DataFrame.
-        If the schema is not valid, an error is logged and an exception is raised.
+        Validate the schema of the DataFrame by checking the dtypes of its columns.
+        Every error is collected, then logged and raised at once in a single exception.
         """
         schema = self.get_schema(file)
 
@@ -34,37 +83,38 @@ class SchemaValidator:
         self.df = df
 
         # Validate columns and their types
+        errors = []
         for column, dtype in schema.items():
             if column not in df.columns:
-                error_message = f"Missing column: {column} in {self.file}"
-                self.logger.log('error', error_message)
-                raise ValueError(error_message)
+                errors.append(f"Missing column: {column} in {file}")
+                continue
 
             # Get the actual dtype of the column
             actual_dtype = df[column].dtype
 
-            if dtype == 'str' and actual_dtype != 'object':
-                error_message = f"Column {column} is expected to be a string, but found {actual_dtype} in {self.file}."
-                self.logger.log('error', error_message)
-                raise ValueError(error_message)
+            if dtype == 'str' and actual_dtype != 'object' and not self.is_arrow_string(actual_dtype):
+                errors.append(f"Column {column} is expected to be a string, but found {actual_dtype} in {file}.")
 
-            elif dtype == 'datetime':
-                if not pd.api.types.is_datetime64_any_dtype(actual_dtype):
-                    try:
-                        df[column] = pd.to_datetime(df[column], errors='raise')
-                    except Exception as e:
-                        error_message = f"Error converting column {column} to datetime: {e} in {self.file}"
-                        self.logger.log('error', error_message)
-                        raise ValueError(error_message)
+            elif dtype == 'datetime' and not pd.api.types.is_datetime64_any_dtype(actual_dtype):
+                errors.append(f"Column {column} is expected to be a datetime, but found {actual_dtype} in {file}.")
 
             elif dtype == 'int' and not pd.api.types.is_integer_dtype(actual_dtype):
-                error_message = f"Column {column} is expected to be an integer, but found {actual_dtype} in {self.file}."
-                self.logger.log('error', error_message)
-                raise ValueError(error_message)
+                errors.append(f"Column {column} is expected to be an integer, but found {actual_dtype} in {file}.")
 
             elif dtype == 'float' and not pd.api.types.is_float_dtype(actual_dtype):
-                error_message = f"Column {column} is expected to be a float, but found {actual_dtype} in {self.file}."
+                errors.append(f"Column {column} is expected to be a float, but found {actual_dtype} in {file}.")
+
+        if errors:
+            for error_message in errors:
                 self.logger.log('error', error_message)
-                raise ValueError(error_message)
+            raise ValueError('\n'.join(errors))
 
-        self.logger.log('info', f"{self.file} schema validation passed.")
+        self.logger.log('info', f"{file} schema validation passed.")
+
+    @staticmethod
+    def is_arrow_string(dtype) -> bool:
+        """
+        Check whether a dtype is an Arrow-backed string type.
+        """
+        return isinstance(dtype, pd.ArrowDtype) and (pa.types.is_string(dtype.pyarrow_dtype)
+                                                     or pa.types.is_large_string(dtype.pyarrow_dtype))
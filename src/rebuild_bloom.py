@@ -0,0 +1,48 @@
+import os
+import json
+import argparse
+
+import pandas as pd
+
+from pipeline.logger.logger import Logger
+from pipeline.state_store.key_index import KeyIndex
+from pipeline.state_store.state import StateStore
+
+def main():
+    """
+    Rebuild the Bloom filters of the state key indexes. Legacy list state files
+    (<table>.parquet with several rows) are migrated to a key index first.
+
+    Usage: python src/rebuild_bloom.py --state-dir /home/hadoop/state --error-rate 0.01
+    """
+    parser = argparse.ArgumentParser(description="Rebuild the Bloom filters of the state key indexes.")
+    parser.add_argument('--state-dir', default='/home/hadoop/state', help="Directory of the state files.")
+    parser.add_argument('--error-rate', type=float, default=0.01, help="False-positive rate of the filters.")
+    parser.add_argument('--table', action='append', help="Table to rebuild (default: every table).")
+    args = parser.parse_args()
+
+    logger = Logger('./logs/etl.log')
+    state_store = StateStore(logger, args.state_dir, bloom_error_rate=args.error_rate)
+
+    for entry in sorted(os.listdir(args.state_dir)):
+        path = os.path.join(args.state_dir, entry)
+        table_name = entry[:-len('.parquet')] if entry.endswith('.parquet') else entry
+        if args.table and table_name not in args.table:
+            continue
+
+        if KeyIndex.exists(path):
+            with open(os.path.join(path, KeyIndex.METADATA_FILE), 'r') as file:
+                column_name = json.load(file)['column']
+            KeyIndex(logger, path, column_name).rebuild_bloom(args.error_rate)
+        elif entry.endswith('.parquet'):
+            df = pd.read_parquet(path)
+            if df.shape[0] <= 1 or len(df.columns) != 1:
+                continue  # scalar state, nothing to index
+            # Migrating builds the key index and its Bloom filter
+            state_store.load_state(table_name, df.columns[0])
+        else:
+            continue
+        print(f"Rebuilt Bloom filter of {table_name}")
+
+if __name__ == "__main__":
+    main()
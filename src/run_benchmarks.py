@@ -0,0 +1,61 @@
+import os
+import sys
+import argparse
+import warnings
+
+from pipeline.logger.logger import Logger
+from benchmarks.runner import Benchmark, compare, load_baseline, save_baseline
+
+STAGES = ['extract', 'quality', 'validate', 'state_filter', 'plan', 'transform', 'parquet_write', 'hdfs_write', 'end_to_end']
+
+def main():
+    """
+    Benchmark every stage of the pipeline in isolation and end to end on generated tables of each --rows size,
+    print the throughput and memory of every stage and compare it with the stored baseline.
+    Exits with status 1 when a stage is slower than the baseline by more than --tolerance.
+
+    Usage: python src/run_benchmarks.py --rows 1000 100000 10000000 --save-baseline
+    """
+    warnings.filterwarnings("ignore")
+
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline stages on generated data.")
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000, 100000], help="Rows per table.")
+    parser.add_argument('--seed', type=int, default=42, help="Seed of the generated data.")
+    parser.add_argument('--repeat', type=int, default=3, help="Timed runs of every measure, the best one is kept.")
+    parser.add_argument('--stage', action='append', choices=STAGES, help="Stage to run (default: every stage).")
+    parser.add_argument('--batch-size', type=int, help="Stream the files in batches of this many rows end to end.")
+    parser.add_argument('--arrow', action='store_true', help="Run the pipeline in arrow mode.")
+    parser.add_argument('--transform-workers', type=int, help="Transform the large DataFrames across this many processes.")
+    parser.add_argument('--no-memory', action='store_true', help="Skip the tracemalloc runs.")
+    parser.add_argument('--work-dir', default='./benchmark_data', help="Directory of the generated data and outputs.")
+    parser.add_argument('--baseline', default='./benchmarks/baseline.json', help="Baseline of the throughputs.")
+    parser.add_argument('--save-baseline', action='store_true', help="Store the results as the new baseline.")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="Throughput loss allowed before a regression.")
+    args = parser.parse_args()
+
+    logger = Logger(os.path.join('./logs', 'benchmark.log'))
+    benchmark = Benchmark(logger, args.work_dir, repeat=args.repeat, batch_size=args.batch_size,
+                          arrow=args.arrow, memory=not args.no_memory, transform_workers=args.transform_workers)
+    results = benchmark.run(args.rows, seed=args.seed, stages=args.stage)
+    regressions = compare(results, load_baseline(args.baseline), args.tolerance)
+
+    print(f"{'stage':<14}{'table':<26}{'rows':>10}{'seconds':>10}{'rows/s':>14}{'MB/s':>9}{'alloc MB':>10}{'vs base':>9}")
+    for result in results:
+        mb_per_second = f"{result['mb_per_second']:.1f}" if result['mb_per_second'] else '-'
+        alloc = f"{result['peak_alloc_bytes'] / 1024 / 1024:.1f}" if result['peak_alloc_bytes'] is not None else '-'
+        change = f"{result['baseline_change']:+.0%}" if 'baseline_change' in result else '-'
+        print(f"{result['stage']:<14}{result['table']:<26}{result['rows']:>10}{result['seconds']:>10.4f}"
+              f"{result['rows_per_second']:>14.0f}{mb_per_second:>9}{alloc:>10}{change:>9}")
+
+    if args.save_baseline:
+        save_baseline(results, args.baseline)
+        print(f"Baseline saved to {args.baseline}")
+
+    if regressions:
+        print("Regressions:")
+        for regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
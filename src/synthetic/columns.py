@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+
+# Format of the incoming file of every table, as produced by the bank systems
+TABLE_FORMATS = {
+    'customer_profiles': 'csv',
+    'support_tickets': 'csv',
+    'credit_cards_billing': 'csv',
+    'transactions': 'json',
+    'loans': 'json'
+}
+
+# Width of the numeric part of the identifiers (CUST000001, TICKET000001, BILL0000001)
+ID_WIDTHS = {'customer': 6, 'ticket': 6, 'bill': 7}
+
+# Values of the categorical columns, drawn uniformly
+CITIES = ['Cairo', 'Alexandria', 'Riyadh', 'Jeddah', 'Dubai', 'Abu Dhabi', 'Casablanca', 'Doha', 'Beirut', 'Sfax']
+COMPLAINT_CATEGORIES = ['Unauthorized Transaction', 'Delayed Refund', 'Card Not Working',
+                        'Loan Application Rejected', 'Account Locked', 'Incorrect Charges', 'Mobile App Issues',
+                        'Poor Customer Service', 'ATM Withdrawal Failed', 'KYC Verification Delay']
+GENDERS = ['Male', 'Female']
+CUSTOMER_TIERS = ['Gold', 'Platinum', 'Silver']
+PRODUCT_TYPES = ["CreditCard", "Savings", "PremiumAccount"]
+LOAN_TYPES = ["Personal Loan", "Auto Loan", "Home Loan", "Credit Card Loan", "Education Loan", "Business Loan",
+              "Medical Loan", "Travel Loan", "Top-Up Loan", "Loan Against Deposit"]
+
+# Late days of the bills, weighted towards payments on time
+PAYMENT_DELAYS = np.array([0, 0, 0, 1, 2, 5, 7])
+
+
+def format_ids(prefix: str, width: int, numbers) -> pd.Series:
+    """
+    Identifiers prefix + number zero-padded to width, wrapping around past the width
+    (e.g. CUST999999 is followed by CUST000000) so they always match their pattern.
+    """
+    return prefix + pd.Series(np.asarray(numbers) % 10 ** width).astype(str).str.zfill(width)
+
+
+def make_ids(prefix: str, width: int, start: int, count: int) -> pd.Series:
+    """
+    count consecutive identifiers (see format_ids), numbered from start + 1.
+    """
+    return format_ids(prefix, width, np.arange(start + 1, start + count + 1))
+
+
+def choose(rng, values, count) -> np.ndarray:
+    """
+    Draw count values with replacement.
+    """
+    return np.asarray(values, dtype=object)[rng.integers(0, len(values), count)]
+
+
+def customer_refs(rng, customers: int, count) -> pd.Series:
+    """
+    Draw count identifiers among the first customers customers, so every reference points to a customer.
+    """
+    return format_ids('CUST', ID_WIDTHS['customer'], rng.integers(1, customers + 1, count))
+
+
+def dates_before(rng, today, low_days: int, high_days: int, count) -> np.ndarray:
+    """
+    ISO dates between high_days and low_days days before today (a numpy datetime64[D]).
+    """
+    days = rng.integers(low_days, high_days + 1, count).astype('timedelta64[D]')
+    return np.datetime_as_string(today - days, unit='D')
+
+
+def datetimes_before(rng, today, days: int, count) -> pd.Series:
+    """
+    'YYYY-MM-DD HH:MM:SS' datetimes at a random second of the last days days (today included).
+    """
+    seconds = rng.integers(0, (days + 1) * 86400, count).astype('timedelta64[s]')
+    start = (today - np.timedelta64(days, 'D')).astype('datetime64[s]')
+    return pd.Series(np.datetime_as_string(start + seconds, unit='s')).str.replace('T', ' ', regex=False)
@@ -0,0 +1,145 @@
+import numpy as np
+import pandas as pd
+
+from synthetic.columns import (ID_WIDTHS, CITIES, COMPLAINT_CATEGORIES, GENDERS, CUSTOMER_TIERS, PRODUCT_TYPES,
+                               LOAN_TYPES, PAYMENT_DELAYS, format_ids, make_ids, choose, customer_refs,
+                               dates_before, datetimes_before)
+
+# Pools of the names and loan reasons, combined at random when no pool is given (e.g. without Faker)
+FIRST_NAMES = ['James', 'Mary', 'Ahmed', 'Fatima', 'Omar', 'Layla', 'John', 'Sara', 'Youssef', 'Nour',
+               'David', 'Hana', 'Karim', 'Mona', 'Ali', 'Salma', 'Michael', 'Amira', 'Hassan', 'Emma']
+LAST_NAMES = ['Smith', 'Hassan', 'Ibrahim', 'Johnson', 'Mahmoud', 'Brown', 'Saleh', 'Williams', 'Farouk',
+              'Jones', 'Nasser', 'Miller', 'Khalil', 'Davis', 'Mansour', 'Garcia', 'Haddad', 'Wilson']
+REASON_WORDS = ['need', 'money', 'for', 'new', 'car', 'house', 'school', 'travel', 'family', 'business',
+                'medical', 'bills', 'repair', 'wedding', 'the', 'my', 'to', 'buy', 'pay', 'home']
+
+
+def make_names(rng, count) -> pd.Series:
+    """
+    count names made of a first and a last name drawn at random.
+    """
+    return pd.Series(choose(rng, FIRST_NAMES, count)) + ' ' + pd.Series(choose(rng, LAST_NAMES, count))
+
+
+def make_sentences(rng, count) -> pd.Series:
+    """
+    count sentences of 4 to 8 words drawn at random.
+    """
+    words = pd.DataFrame(choose(rng, REASON_WORDS, count * 8).reshape(count, 8))
+    lengths = rng.integers(4, 9, count)
+    sentences = words[0].str.capitalize()
+    for column in range(1, 8):
+        sentences = sentences.where(lengths <= column, sentences + ' ' + words[column])
+    return sentences + '.'
+
+
+def generate_customer_profiles(rng, settings) -> pd.DataFrame:
+    count = settings['customers']
+    names = settings.get('names')
+    return pd.DataFrame({
+        'customer_id': make_ids('CUST', ID_WIDTHS['customer'], 0, count),
+        'name': choose(rng, names, count) if names else make_names(rng, count),
+        'gender': choose(rng, GENDERS, count),
+        'age': rng.integers(18, 81, count),
+        'city': choose(rng, CITIES, count),
+        'account_open_date': dates_before(rng, settings['today'], 365, 3650, count),
+        'product_type': choose(rng, PRODUCT_TYPES, count),
+        'customer_tier': choose(rng, CUSTOMER_TIERS, count)
+    })
+
+
+def generate_support_tickets(rng, settings) -> pd.DataFrame:
+    count = settings['tickets']
+    if count <= settings['customers']:
+        # One ticket per sampled customer, like random.sample
+        numbers = rng.choice(settings['customers'], count, replace=False) + 1
+        customer_ids = format_ids('CUST', ID_WIDTHS['customer'], numbers)
+    else:
+        customer_ids = customer_refs(rng, settings['customers'], count)
+    return pd.DataFrame({
+        'ticket_id': make_ids('TICKET', ID_WIDTHS['ticket'], settings['id_offset'], count),
+        'customer_id': customer_ids,
+        'complaint_category': choose(rng, COMPLAINT_CATEGORIES, count),
+        'complaint_date': dates_before(rng, settings['today'], 0, 365, count),
+        'severity': rng.integers(0, 11, count)
+    })
+
+
+def generate_credit_cards_billing(rng, settings) -> pd.DataFrame:
+    # One bill per customer and month, customer by customer
+    customers, months = settings['customers'], settings['months']
+    count = customers * months
+    customer_numbers = np.repeat(np.arange(1, customers + 1), months)
+    bill_months = np.datetime64(settings['billing_start'], 'M') + np.tile(np.arange(months), customers)
+
+    amount_due = np.round(rng.uniform(10, 300, count), 2)
+    payment_delay_days = PAYMENT_DELAYS[rng.integers(0, len(PAYMENT_DELAYS), count)]
+    partial = np.round(amount_due * rng.uniform(0.8, 1.0, count), 2)
+    amount_paid = np.where(payment_delay_days <= 5, amount_due, partial)
+    payment_date = bill_months.astype('datetime64[D]') + payment_delay_days.astype('timedelta64[D]')
+
+    return pd.DataFrame({
+        'bill_id': make_ids('BILL', ID_WIDTHS['bill'], settings['id_offset'], count),
+        'customer_id': format_ids('CUST', ID_WIDTHS['customer'], customer_numbers),
+        'month': np.datetime_as_string(bill_months, unit='M'),
+        'amount_due': amount_due,
+        'amount_paid': amount_paid,
+        'payment_date': np.datetime_as_string(payment_date, unit='D')
+    })
+
+
+def generate_transactions(rng, settings) -> pd.DataFrame:
+    count = settings['transactions']
+    return pd.DataFrame({
+        'sender': customer_refs(rng, settings['customers'], count),
+        'receiver': customer_refs(rng, settings['customers'], count),
+        'transaction_amount': rng.integers(1, 101, count),
+        'transaction_date': datetimes_before(rng, settings['today'], 365, count)
+    })
+
+
+def generate_loans(rng, settings) -> pd.DataFrame:
+    count = settings['loans']
+    loan_reasons = settings.get('loan_reasons')
+    return pd.DataFrame({
+        'customer_id': customer_refs(rng, settings['customers'], count),
+        'loan_type': choose(rng, LOAN_TYPES, count),
+        'amount_utilized': rng.integers(10, 1001, count) * 1000,
+        'utilization_date': datetimes_before(rng, settings['today'], 365, count),
+        'loan_reason': choose(rng, loan_reasons, count) if loan_reasons else make_sentences(rng, count)
+    })
+
+
+GENERATORS = {
+    'customer_profiles': generate_customer_profiles,
+    'support_tickets': generate_support_tickets,
+    'credit_cards_billing': generate_credit_cards_billing,
+    'transactions': generate_transactions,
+    'loans': generate_loans
+}
+
+
+def table_seeds(seed) -> dict:
+    """
+    Independent random streams per table, so the data of a seed does not depend on the tables generated
+    nor on the process generating each one.
+
+    :param seed: Seed of the data.
+    :return: Mapping of table name to the seed of its random generator.
+    """
+    return dict(zip(GENERATORS, np.random.SeedSequence(seed).spawn(len(GENERATORS))))
+
+
+def generate_table(table: str, seed, settings: dict) -> pd.DataFrame:
+    """
+    Generate one table of the bank. Every reference to a customer points to one of the customer profiles.
+
+    :param table: Name of the table (customer_profiles, support_tickets, credit_cards_billing, transactions, loans).
+    :param seed: Seed of the random generator of the table (see table_seeds).
+    :param settings: Sizes and dates of the data: customers, tickets, months (bills per customer), transactions,
+                     loans, billing_start (first billing month, 'YYYY-MM'), id_offset (tickets and bills are
+                     numbered after it) and today (numpy datetime64[D] the dates are drawn before); optionally
+                     names and loan_reasons, the pools of the names and loan reasons (combined at random otherwise).
+    :return: The table as a DataFrame.
+    """
+    return GENERATORS[table](np.random.default_rng(seed), settings)